@@ -0,0 +1,160 @@
+"""общее для бенчмарков: замер, перцентили, ASGI-запрос без сети и вывод результатов
+
+результат каждого бенчмарка - одна строка json в stdout (и в --output, если
+указан), сравнение двух прогонов - benchmarks.compare
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max в миллисекундах по замерам в секундах"""
+
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(last, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "max": at(1.0)}
+
+
+def measure_sync(fn: Callable[[], Any], iterations: int) -> Dict[str, Any]:
+    """ops/s и перцентили одного вызова для синхронной функции"""
+
+    for _ in range(min(1000, iterations // 10)):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    return {
+        "iterations": iterations,
+        "ops": round(iterations / elapsed, 1),
+        "latency_ms": percentiles(samples),
+    }
+
+
+async def measure_async(
+    fn: Callable[[], Awaitable[Any]],
+    iterations: int,
+    concurrency: int = 1,
+) -> Dict[str, Any]:
+    """то же для корутины, concurrency вызовов одновременно"""
+
+    for _ in range(min(200, iterations // 10)):
+        await fn()
+
+    samples: List[float] = []
+
+    async def timed():
+        call_started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - call_started)
+
+    rounds = max(1, iterations // concurrency)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(timed() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "iterations": rounds * concurrency,
+        "concurrency": concurrency,
+        "ops": round(rounds * concurrency / elapsed, 1),
+        "latency_ms": percentiles(samples),
+    }
+
+
+async def asgi_request(
+    app,
+    method: str,
+    path: str,
+    body: Optional[Any] = None,
+    headers: Optional[Dict[str, str]] = None,
+    query_string: str = "",
+) -> tuple[int, bytes]:
+    """один запрос напрямую через ASGI, без сети"""
+
+    raw_body = orjson.dumps(body) if body is not None else b""
+    raw_headers = [(b"host", b"bench"), (b"content-type", b"application/json")]
+    raw_headers += [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    status_code = 0
+    chunks: List[bytes] = []
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": raw_body, "more_body": False}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status_code, b"".join(chunks)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def add_output_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--output",
+        help="дописать результаты в файл (json lines) для benchmarks.compare",
+    )
+
+
+def emit(result: Dict[str, Any], output: Optional[str] = None):
+    """напечатать результат строкой json и дописать в output"""
+
+    result = {
+        **result,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    line = json.dumps(result, ensure_ascii=False)
+    print(line)
+    if output:
+        with open(output, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
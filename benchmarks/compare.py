@@ -0,0 +1,70 @@
+"""сравнение двух прогонов бенчмарков (файлы из --output)
+
+по каждому бенчмарку берётся последний результат в файле. регрессия -
+падение ops или рост p50/p95/p99 больше порога. код выхода 1, если она есть.
+
+запуск: poetry run python -m benchmarks.compare base.jsonl new.jsonl [--threshold 10]
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict
+
+LATENCIES = ("p50", "p95", "p99")
+
+
+def load(path: str) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                results[f"{result['benchmark']}:{result['name']}"] = result
+    return results
+
+
+def change(base: float, new: float) -> float:
+    """изменение в процентах"""
+
+    return round((new - base) / base * 100, 1) if base else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="допустимое ухудшение, %%")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    regressed = False
+    for key in sorted(base.keys() & new.keys()):
+        old_result, new_result = base[key], new[key]
+        changes = {"ops": change(old_result["ops"], new_result["ops"])}
+        for name in LATENCIES:
+            changes[name] = change(
+                old_result["latency_ms"][name], new_result["latency_ms"][name]
+            )
+        # ops лучше больше, задержки - меньше
+        worse = changes["ops"] < -args.threshold or any(
+            changes[name] > args.threshold for name in LATENCIES
+        )
+        regressed |= worse
+        print(json.dumps({
+            "benchmark": key,
+            "base": old_result.get("commit"),
+            "new": new_result.get("commit"),
+            "change_pct": changes,
+            "regression": worse,
+        }))
+
+    for key in sorted(base.keys() ^ new.keys()):
+        print(json.dumps({"benchmark": key, "missing_in": "new" if key in base else "base"}))
+
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
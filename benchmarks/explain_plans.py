@@ -0,0 +1,262 @@
+"""проверка планов запросов списка инцидентов: каждая выборка должна идти по своему индексу
+
+в транзакции заводит помесячные партиции на год назад, заливает
+синтетические инциденты (COPY), делает ANALYZE,
+снимает EXPLAIN с запросов IncidentRepository.list_query и откатывает всё назад,
+так что базу можно брать любую с применёнными миграциями.
+каждый запрос проверяется дважды: с подставленными параметрами и generic-планом
+(plan_cache_mode = force_generic_plan), который asyncpg получает на prepared
+statement после нескольких выполнений.
+код выхода 1, если хоть один план разошёлся с ожидаемым.
+
+запуск: poetry run python -m benchmarks.explain_plans [--rows 200000]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from src.core.database import engine
+from src.domain.models import IncidentSource, IncidentStatus
+from src.services.incident_partitions import add_months, month_start, partition_name
+from src.services.incident_repository import IncidentRepository
+
+# примерно как в проде: почти всё уже закрыто, активных единицы процентов
+STATUS_WEIGHTS = {
+    IncidentStatus.CLOSED: 55,
+    IncidentStatus.RESOLVED: 25,
+    IncidentStatus.CANCELLED: 10,
+    IncidentStatus.OPEN: 6,
+    IncidentStatus.IN_PROGRESS: 4,
+}
+WORDS = (
+    "сервер", "недоступен", "ошибка", "оплаты", "таймаут", "базы", "диск",
+    "переполнен", "задержка", "доставки", "партнёр", "api", "сбой", "очереди",
+)
+LIMIT = 50
+
+MONTHS = 13
+NOW = datetime.utcnow()
+
+# (имя, фильтры list_query, индекс, который должен быть в плане,
+#  допустима ли сортировка, сколько партиций можно читать - None без ограничения)
+CASES = (
+    ("all", {}, "ix_incidents_created_at_id", False, None),
+    ("status", {"status": IncidentStatus.CLOSED}, "ix_incidents_status_created_at", False, None),
+    ("source", {"source": IncidentSource.PARTNER}, "ix_incidents_source_created_at", False, None),
+    (
+        "status_source_open",
+        {"status": IncidentStatus.OPEN, "source": IncidentSource.MONITORING},
+        "ix_incidents_open_source_created_at",
+        False,
+        None,
+    ),
+    (
+        "status_source_in_progress",
+        {"status": IncidentStatus.IN_PROGRESS, "source": IncidentSource.OPERATOR},
+        "ix_incidents_in_progress_source_created_at",
+        False,
+        None,
+    ),
+    (
+        "status_cursor",
+        {
+            "status": IncidentStatus.RESOLVED,
+            "after": (NOW - timedelta(days=200), uuid.UUID(int=0)),
+        },
+        "ix_incidents_status_created_at",
+        False,
+        None,
+    ),
+    (
+        "time_range",
+        {"created_from": NOW - timedelta(days=20), "created_to": NOW},
+        "ix_incidents_created_at_id",
+        False,
+        2,
+    ),
+    ("search", {"q": "сбой оплаты"}, "ix_incidents_description_fts", True, None),
+)
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN поверх любого select с его же параметрами"""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+async def create_partitions(connection):
+    """партиции за весь период сида, default-партиции нет и без них вставка упадёт"""
+
+    current = month_start(NOW)
+    for offset in range(-MONTHS, 1):
+        month = add_months(current, offset)
+        await connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF incidents "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        ))
+
+
+async def parent_indexes(connection) -> dict[str, str]:
+    """индекс партиции -> индекс на incidents, из которого он создан"""
+
+    result = await connection.execute(text(
+        "SELECT c.relname, p.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relkind = 'I'"
+    ))
+    return dict(result.all())
+
+
+def seed_rows(count: int) -> list[dict]:
+    statuses = random.choices(
+        [status.value for status in STATUS_WEIGHTS],
+        weights=list(STATUS_WEIGHTS.values()),
+        k=count,
+    )
+    rows = []
+    for status in statuses:
+        created_at = NOW - timedelta(seconds=random.randint(0, 365 * 24 * 3600))
+        rows.append({
+            "id": uuid.uuid4(),
+            "description": " ".join(random.sample(WORDS, 4)),
+            "status": status,
+            "source": random.choice(list(IncidentSource)).value,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return rows
+
+
+def _sql_literal(value) -> str:
+    """значение параметра для EXECUTE, на generic-план оно не влияет"""
+
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+async def explain(connection, statement, generic: bool = False) -> dict:
+    """корневой узел плана запроса
+
+    generic - план без значений параметров, как у prepared statement
+    после перехода на generic-план
+    """
+
+    if not generic:
+        raw = await connection.scalar(Explain(statement))
+    else:
+        compiled = statement.compile(dialect=connection.dialect)
+        args = ", ".join(
+            _sql_literal(compiled.params[name]) for name in compiled.positiontup
+        )
+        await connection.exec_driver_sql(f"PREPARE explain_plan AS {compiled}")
+        try:
+            await connection.exec_driver_sql(
+                "SET LOCAL plan_cache_mode = force_generic_plan"
+            )
+            raw = await connection.scalar(
+                text(f"EXPLAIN (FORMAT JSON) EXECUTE explain_plan({args})")
+            )
+        finally:
+            await connection.exec_driver_sql("DEALLOCATE explain_plan")
+            await connection.exec_driver_sql("SET LOCAL plan_cache_mode = auto")
+    return (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+
+async def seed(connection, rows: int) -> IncidentRepository:
+    """партиции и синтетические инциденты, вызывать внутри транзакции"""
+
+    repository = IncidentRepository(AsyncSession(bind=connection))
+    await create_partitions(connection)
+    await repository._copy_rows(seed_rows(rows))
+    await connection.execute(text("ANALYZE incidents"))
+    return repository
+
+
+async def check_plans(
+    connection, repository: IncidentRepository, generic: bool = False
+) -> dict[str, dict]:
+    """план каждого случая из CASES и подошёл ли он"""
+
+    parents = await parent_indexes(connection)
+    plans = {}
+    for name, filters, index, sort_allowed, max_partitions in CASES:
+        plan = await explain(
+            connection, repository.list_query(limit=LIMIT + 1, **filters), generic
+        )
+        nodes = list(plan_nodes(plan))
+        # в плане индексы партиций, сравниваем по родительским
+        indexes = sorted({
+            parents.get(n["Index Name"], n["Index Name"])
+            for n in nodes if "Index Name" in n
+        })
+        partitions = sorted({n["Relation Name"] for n in nodes if "Relation Name" in n})
+        has_sort = any(n["Node Type"] == "Sort" for n in nodes)
+        plans[name] = {
+            "expected": index,
+            "indexes": indexes,
+            "partitions": len(partitions),
+            "sort": has_sort,
+            "ok": index in indexes
+            and (sort_allowed or not has_sort)
+            and (max_partitions is None or len(partitions) <= max_partitions),
+        }
+    return plans
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        try:
+            repository = await seed(connection, args.rows)
+            plans = await check_plans(connection, repository)
+            generic_plans = await check_plans(connection, repository, generic=True)
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+    ok = all(plan["ok"] for plan in [*plans.values(), *generic_plans.values()])
+    print(json.dumps({
+        "benchmark": "explain_plans",
+        "rows": args.rows,
+        "plans": plans,
+        "generic_plans": generic_plans,
+        "ok": ok,
+    }, ensure_ascii=False))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""in-process замена redis для бенчмарков без поднятого redis
+
+реализует только то, что зовут CacheClient и RateLimiter. lua не исполняется:
+снятие лока удаляет ключ без проверки токена, лимитер всегда пропускает.
+DownRedis - зависший redis: каждая операция ждёт таймаут и падает
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self._redis = redis
+        self._calls: List[tuple[str, tuple]] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._calls.clear()
+
+    def __getattr__(self, name: str):
+        def queue(*args):
+            self._calls.append((name, args))
+            return self
+
+        return queue
+
+    async def execute(self) -> List[Any]:
+        return [await getattr(self._redis, name)(*args) for name, args in self._calls]
+
+
+class FakeRedis:
+    """словарь с TTL вместо redis"""
+
+    def __init__(self):
+        self._data: Dict[str, tuple[Optional[float], Any]] = {}
+
+    def _get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._get(key)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self._get(key) for key in keys]
+
+    async def setex(self, key: str, ttl: int, value: Any) -> bool:
+        self._data[key] = (time.monotonic() + ttl, self._encode(value))
+        return True
+
+    async def set(self, key: str, value: Any, nx: bool = False, px: int | None = None):
+        if nx and self._get(key) is not None:
+            return None
+        expires_at = time.monotonic() + px / 1000 if px else None
+        self._data[key] = (expires_at, self._encode(value))
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key: str) -> int:
+        value = int(self._get(key) or 0) + 1
+        self._data[key] = (None, self._encode(value))
+        return value
+
+    async def publish(self, channel: str, message: Any) -> int:
+        return 0
+
+    async def eval(self, script: str, numkeys: int, *args) -> int:
+        return await self.delete(*args[:numkeys])
+
+    def register_script(self, script: str):
+        async def run(keys=None, args=None):
+            return 0
+
+        return run
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    async def close(self, close_connection_pool: bool | None = None):
+        self._data.clear()
+
+
+class DownRedis:
+    """любая команда - ожидание delay и TimeoutError, как у зависшего redis"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def _fail(self, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        raise RedisTimeoutError("Timeout reading from socket")
+
+    def __getattr__(self, name: str):
+        return self._fail
+
+    def register_script(self, script: str):
+        return self._fail
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    async def close(self, close_connection_pool: bool | None = None):
+        pass
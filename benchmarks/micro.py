@@ -0,0 +1,141 @@
+"""микробенчмарки горячих мест без бд: валидация ответа, кодеки кэша,
+rate limit middleware, сериализация страницы списка
+
+redis заменён FakeRedis, поэтому меряется только наш код и orjson.
+
+запуск: poetry run python -m benchmarks.micro [--iterations 20000] [--only cache_get] [--output results.jsonl]
+"""
+
+import argparse
+import asyncio
+import uuid
+from datetime import datetime
+
+from benchmarks.common import (
+    add_output_argument,
+    asgi_request,
+    emit,
+    measure_async,
+    measure_sync,
+)
+from benchmarks.fakes import FakeRedis
+from src.domain.models import Incident, IncidentSource, IncidentStatus
+from src.domain.schemas import IncidentItemResponse, IncidentListResponse
+from src.infrastructure.cache import CacheClient
+from src.infrastructure.rate_limiter import RateLimiter
+from src.infrastructure.security_middleware import RateLimitMiddleware
+
+PAGE_SIZE = 100
+# лимит заведомо не достигается, меряем только накладные расходы
+UNLIMITED = 10**9
+
+
+def incident_row() -> dict:
+    now = datetime.utcnow()
+    return {
+        "id": uuid.uuid4(),
+        "description": "Сервер оплаты недоступен, таймаут ответа партнёра",
+        "status": IncidentStatus.OPEN,
+        "source": IncidentSource.MONITORING,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def bench_model_validate_orm(iterations: int) -> dict:
+    incident = Incident(**incident_row())
+    return measure_sync(lambda: IncidentItemResponse.model_validate(incident), iterations)
+
+
+def bench_model_validate_row(iterations: int) -> dict:
+    # строки, которые возвращают UPDATE/INSERT ... RETURNING
+    row = incident_row()
+    return measure_sync(lambda: IncidentItemResponse.model_validate(row), iterations)
+
+
+def bench_list_serialization(iterations: int) -> dict:
+    # как в IncidentService.get_incidents_json
+    incidents = [Incident(**incident_row()) for _ in range(PAGE_SIZE)]
+
+    def serialize():
+        return IncidentListResponse(
+            incidents=[IncidentItemResponse.model_validate(inc) for inc in incidents],
+            total=PAGE_SIZE,
+            next_cursor=None,
+        ).model_dump_json().encode()
+
+    return measure_sync(serialize, iterations // PAGE_SIZE or 1)
+
+
+def fake_cache() -> CacheClient:
+    cache = CacheClient()
+    cache.local = None
+    cache.client = FakeRedis()
+    return cache
+
+
+async def bench_cache_set(iterations: int) -> dict:
+    cache = fake_cache()
+    page = {"ids": [str(uuid.uuid4()) for _ in range(PAGE_SIZE)], "total": PAGE_SIZE}
+    return await measure_async(lambda: cache.set("bench:set", page), iterations)
+
+
+async def bench_cache_get(iterations: int) -> dict:
+    cache = fake_cache()
+    await cache.set(
+        "bench:get",
+        {"ids": [str(uuid.uuid4()) for _ in range(PAGE_SIZE)], "total": PAGE_SIZE},
+    )
+    return await measure_async(lambda: cache.get("bench:get"), iterations)
+
+
+async def bench_cache_get_raw(iterations: int) -> dict:
+    cache = fake_cache()
+    raw = IncidentItemResponse.model_validate(incident_row()).model_dump_json().encode()
+    await cache.set_raw("bench:raw", raw)
+    return await measure_async(lambda: cache.get_raw("bench:raw"), iterations)
+
+
+async def bench_rate_limit_middleware(iterations: int) -> dict:
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    # без redis лимитер считает локально
+    middleware = RateLimitMiddleware(
+        endpoint,
+        requests_per_minute=UNLIMITED,
+        limiter=RateLimiter(prefix="bench"),
+    )
+    return await measure_async(
+        lambda: asgi_request(middleware, "GET", "/incidents/"), iterations
+    )
+
+
+BENCHMARKS = {
+    "model_validate_orm": bench_model_validate_orm,
+    "model_validate_row": bench_model_validate_row,
+    "list_serialization": bench_list_serialization,
+    "cache_set": bench_cache_set,
+    "cache_get": bench_cache_get,
+    "cache_get_raw": bench_cache_get_raw,
+    "rate_limit_middleware": bench_rate_limit_middleware,
+}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--only", choices=list(BENCHMARKS), action="append")
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    for name in args.only or BENCHMARKS:
+        result = BENCHMARKS[name](args.iterations)
+        if asyncio.iscoroutine(result):
+            result = await result
+        emit({"benchmark": "micro", "name": name, **result}, args.output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+"""RPS стека middleware на GET /incidents/{id}: BaseHTTPMiddleware (как было) и чистый ASGI
+
+эндпоинт отдаёт готовый инцидент без бд и redis, поэтому разница
+между прогонами - это стоимость самих middleware.
+
+запуск: poetry run python -m benchmarks.middleware [--requests 20000] [--concurrency 1] [--output results.jsonl]
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from benchmarks.common import add_output_argument, asgi_request, emit, measure_async
+from src.domain.schemas import IncidentItemResponse
+from src.infrastructure.error_middleware import ErrorHandlingMiddleware
+from src.infrastructure.rate_limiter import RateLimiter
+from src.infrastructure.security_middleware import (
+    RateLimitMiddleware,
+    SecurityHeadersMiddleware,
+)
+
+INCIDENT_ID = uuid.uuid4()
+INCIDENT = IncidentItemResponse(
+    id=INCIDENT_ID,
+    description="benchmark incident",
+    status="open",
+    source="monitoring",
+    created_at=datetime.utcnow(),
+    updated_at=datetime.utcnow(),
+)
+# лимит заведомо не достигается, меряем только накладные расходы
+UNLIMITED = 10**9
+
+
+class LegacyErrorHandlingMiddleware(BaseHTTPMiddleware):
+    """ErrorHandlingMiddleware до перехода на ASGI"""
+
+    async def dispatch(self, request: Request, call_next):
+        try:
+            return await call_next(request)
+        except Exception:
+            return JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content={"detail": "Internal server error"}
+            )
+
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    """SecurityHeadersMiddleware до перехода на ASGI"""
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+
+        return response
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    """RateLimitMiddleware на deque до перехода на ASGI"""
+
+    def __init__(self, app, requests_per_minute: int = 60):
+        super().__init__(app)
+        self.requests_per_minute = requests_per_minute
+        self.requests = defaultdict(deque)
+
+    async def dispatch(self, request: Request, call_next):
+        client_ip = request.client.host
+        now = time.time()
+
+        minute_ago = now - 60
+        while self.requests[client_ip] and self.requests[client_ip][0] < minute_ago:
+            self.requests[client_ip].popleft()
+
+        if len(self.requests[client_ip]) >= self.requests_per_minute:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded"
+            )
+
+        self.requests[client_ip].append(now)
+        return await call_next(request)
+
+
+def build_app(legacy: bool) -> FastAPI:
+    """приложение с тем же порядком middleware, что и в src.main"""
+
+    app = FastAPI()
+
+    @app.get("/incidents/{incident_id}", response_model=IncidentItemResponse)
+    async def get_incident(incident_id: uuid.UUID) -> IncidentItemResponse:
+        return INCIDENT
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    if legacy:
+        app.add_middleware(LegacyErrorHandlingMiddleware)
+        app.add_middleware(LegacySecurityHeadersMiddleware)
+        app.add_middleware(LegacyRateLimitMiddleware, requests_per_minute=UNLIMITED)
+    else:
+        app.add_middleware(ErrorHandlingMiddleware)
+        app.add_middleware(SecurityHeadersMiddleware)
+        app.add_middleware(
+            RateLimitMiddleware,
+            requests_per_minute=UNLIMITED,
+            limiter=RateLimiter(prefix="bench"),
+        )
+    return app
+
+
+async def call(app: FastAPI, path: str):
+    status_code, _ = await asgi_request(app, "GET", path, headers={"x-access-key": "key"})
+    assert status_code == 200, status_code
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    path = f"/incidents/{INCIDENT_ID}"
+    results = {}
+    for name, legacy in (("base_http_middleware", True), ("pure_asgi", False)):
+        app = build_app(legacy)
+        results[name] = await measure_async(
+            lambda: call(app, path), args.requests, args.concurrency
+        )
+
+    speedup = round(results["pure_asgi"]["ops"] / results["base_http_middleware"]["ops"], 2)
+    for name, result in results.items():
+        emit(
+            {"benchmark": "middleware_get_incident", "name": name, **result, "speedup": speedup},
+            args.output,
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,229 @@
+"""нагрузочные сценарии на приложении src.main через ASGI, без сети
+
+create_storm      - поток POST /incidents/
+hot_reads         - GET /incidents/{id} по небольшому горячему набору id
+deep_pagination   - проход глубоко по списку через offset и через cursor
+cache_outage      - hot_reads без redis и с зависшим redis (DownRedis): при
+                    разомкнутом breaker задержки должны быть как без redis
+
+нужен postgres из DATABASE_URL с применёнными миграциями. redis - настоящий
+из REDIS_URL или FakeRedis (--fake-redis). lifespan не запускается: релей
+outbox, партиции и телеграм в замер не попадают. rate limit отключён.
+созданные инциденты (описание с префиксом bench:) в конце удаляются, если не --keep.
+
+запуск: poetry run python -m benchmarks.scenarios [--only hot_reads] [--requests 2000]
+        [--concurrency 20] [--fake-redis] [--output results.jsonl]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Dict, List
+
+import orjson
+from sqlalchemy import text
+
+from benchmarks.common import (
+    add_output_argument,
+    asgi_request,
+    emit,
+    measure_async,
+    percentiles,
+)
+from benchmarks.fakes import DownRedis, FakeRedis
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal, engine
+from src.domain.models import IncidentSource
+from src.infrastructure.cache import cache_client
+from src.services.incident_repository import IncidentRepository
+
+PREFIX = "bench:"
+HOT_SET_SIZE = 20
+PAGE_SIZE = 100
+UNLIMITED = 10**9
+
+
+class Client:
+    """запросы к приложению с ключом доступа и подсчётом ошибок"""
+
+    def __init__(self, app):
+        self.app = app
+        self.headers = {"x-access-key": settings.x_access_key}
+        self.errors = 0
+
+    async def request(self, method: str, path: str, **kwargs) -> tuple[int, bytes]:
+        status_code, body = await asgi_request(
+            self.app, method, path, headers=self.headers, **kwargs
+        )
+        if status_code >= 400:
+            self.errors += 1
+        return status_code, body
+
+    async def create(self) -> str:
+        _, body = await self.request(
+            "POST",
+            "/incidents/",
+            body={
+                "description": f"{PREFIX} {random.random()}",
+                "source": random.choice(list(IncidentSource)).value,
+            },
+        )
+        return orjson.loads(body)["id"]
+
+
+async def create_storm(client: Client, args) -> Dict[str, Any]:
+    return await measure_async(client.create, args.requests, args.concurrency)
+
+
+async def hot_reads(client: Client, args) -> Dict[str, Any]:
+    ids = [await client.create() for _ in range(HOT_SET_SIZE)]
+    return await measure_async(
+        lambda: client.request("GET", f"/incidents/{random.choice(ids)}"),
+        args.requests,
+        args.concurrency,
+    )
+
+
+async def deep_pagination(client: Client, args) -> List[Dict[str, Any]]:
+    async with AsyncSessionLocal() as session:
+        await IncidentRepository(session).bulk_create(
+            [(f"{PREFIX} page", IncidentSource.MONITORING, None)] * args.pagination_rows
+        )
+        await session.commit()
+
+    pages = args.pagination_rows // PAGE_SIZE
+    results = []
+
+    # offset: каждая следующая страница дороже предыдущей
+    samples = []
+    started = time.perf_counter()
+    for page in range(pages):
+        page_started = time.perf_counter()
+        await client.request(
+            "GET",
+            "/incidents/",
+            query_string=f"limit={PAGE_SIZE}&offset={page * PAGE_SIZE}&count=none",
+        )
+        samples.append(time.perf_counter() - page_started)
+    elapsed = time.perf_counter() - started
+    results.append({
+        "name": "deep_pagination_offset",
+        "iterations": pages,
+        "ops": round(pages / elapsed, 1),
+        "latency_ms": percentiles(samples),
+    })
+
+    # cursor: та же глубина по next_cursor
+    samples = []
+    cursor = None
+    started = time.perf_counter()
+    for _ in range(pages):
+        query_string = f"limit={PAGE_SIZE}&count=none"
+        if cursor:
+            query_string += f"&cursor={cursor}"
+        page_started = time.perf_counter()
+        _, body = await client.request("GET", "/incidents/", query_string=query_string)
+        samples.append(time.perf_counter() - page_started)
+        cursor = orjson.loads(body).get("next_cursor")
+        if not cursor:
+            break
+    elapsed = time.perf_counter() - started
+    results.append({
+        "name": "deep_pagination_cursor",
+        "iterations": len(samples),
+        "ops": round(len(samples) / elapsed, 1),
+        "latency_ms": percentiles(samples),
+    })
+    return results
+
+
+async def cache_outage(client: Client, args) -> List[Dict[str, Any]]:
+    ids = [await client.create() for _ in range(HOT_SET_SIZE)]
+    redis_client = cache_client.client
+    results = []
+    try:
+        for name, outage_client in (
+            ("cache_outage_db_only", None),
+            ("cache_outage_redis_down", DownRedis(settings.redis_socket_timeout)),
+        ):
+            cache_client.client = outage_client
+            cache_client.breaker.close()
+            result = await measure_async(
+                lambda: client.request("GET", f"/incidents/{random.choice(ids)}"),
+                args.requests,
+                args.concurrency,
+            )
+            results.append({"name": name, **result, "circuit_trips": cache_client.breaker.trips})
+    finally:
+        # фоновая проверка замкнёт breaker, когда настоящий redis ответит
+        cache_client.client = redis_client
+    return results
+
+
+SCENARIOS = {
+    "create_storm": create_storm,
+    "hot_reads": hot_reads,
+    "deep_pagination": deep_pagination,
+    "cache_outage": cache_outage,
+}
+
+
+async def cleanup():
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            text("DELETE FROM incident_events WHERE payload->>'description' LIKE :prefix"),
+            {"prefix": f"{PREFIX}%"},
+        )
+        await session.execute(
+            text("DELETE FROM incidents WHERE description LIKE :prefix"),
+            {"prefix": f"{PREFIX}%"},
+        )
+        await session.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", choices=list(SCENARIOS), action="append")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--pagination-rows", type=int, default=50000)
+    parser.add_argument("--fake-redis", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="не удалять созданные инциденты")
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    # middleware читает лимиты при импорте приложения
+    settings.rate_limit_per_minute = UNLIMITED
+    settings.rate_limit_key_per_minute = UNLIMITED
+    from src.main import app
+
+    if args.fake_redis:
+        cache_client.client = FakeRedis()
+    else:
+        await cache_client.initialize()
+
+    client = Client(app)
+    try:
+        for name in args.only or SCENARIOS:
+            client.errors = 0
+            result = await SCENARIOS[name](client, args)
+            for item in result if isinstance(result, list) else [{"name": name, **result}]:
+                emit(
+                    {
+                        "benchmark": "scenario",
+                        **item,
+                        "errors": client.errors,
+                        "fake_redis": args.fake_redis,
+                    },
+                    args.output,
+                )
+    finally:
+        if not args.keep:
+            await cleanup()
+        await cache_client.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
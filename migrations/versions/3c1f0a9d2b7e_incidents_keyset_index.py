@@ -0,0 +1,39 @@
+"""incidents keyset pagination index
+
+Revision ID: 3c1f0a9d2b7e
+Revises: 8aae124e1488
+Create Date: 2026-10-18 10:02:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f0a9d2b7e'
+down_revision: Union[str, Sequence[str], None] = '8aae124e1488'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY нельзя внутри транзакции, на большой таблице не блокируем запись
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_incidents_created_at_id',
+            'incidents',
+            ['created_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_incidents_created_at_id',
+            table_name='incidents',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,72 @@
+"""incident counters for estimated totals
+
+Revision ID: 5b7e2d41c9a0
+Revises: 3c1f0a9d2b7e
+Create Date: 2026-10-18 10:41:07.532918
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2d41c9a0'
+down_revision: Union[str, Sequence[str], None] = '3c1f0a9d2b7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('incident_counters',
+    sa.Column('status', sa.String(length=255), nullable=False),
+    sa.Column('source', sa.String(length=255), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.PrimaryKeyConstraint('status', 'source')
+    )
+
+    # счётчики ведёт триггер, чтобы их не обходили ни bulk insert, ни прямые UPDATE
+    op.execute("""
+        CREATE FUNCTION incident_counters_track() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE incident_counters SET count = count - 1
+                WHERE status = OLD.status AND source = OLD.source;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO incident_counters (status, source, count)
+                VALUES (NEW.status, NEW.source, 1)
+                ON CONFLICT (status, source)
+                DO UPDATE SET count = incident_counters.count + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER incidents_counters_insert_delete
+        AFTER INSERT OR DELETE ON incidents
+        FOR EACH ROW EXECUTE FUNCTION incident_counters_track()
+    """)
+    op.execute("""
+        CREATE TRIGGER incidents_counters_update
+        AFTER UPDATE OF status, source ON incidents
+        FOR EACH ROW
+        WHEN (OLD.status IS DISTINCT FROM NEW.status
+              OR OLD.source IS DISTINCT FROM NEW.source)
+        EXECUTE FUNCTION incident_counters_track()
+    """)
+
+    op.execute("""
+        INSERT INTO incident_counters (status, source, count)
+        SELECT status, source, count(*) FROM incidents GROUP BY status, source
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS incidents_counters_update ON incidents")
+    op.execute("DROP TRIGGER IF EXISTS incidents_counters_insert_delete ON incidents")
+    op.execute("DROP FUNCTION IF EXISTS incident_counters_track()")
+    op.drop_table('incident_counters')
@@ -0,0 +1,154 @@
+"""incidents range partitioning by created_at
+
+Revision ID: a6d2e8c41f93
+Revises: e4b9d07a3f18
+Create Date: 2026-10-18 17:12:36.271904
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2e8c41f93'
+down_revision: Union[str, Sequence[str], None] = 'e4b9d07a3f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# столько же месяцев вперёд держит IncidentPartitionManager по умолчанию
+PARTITIONS_AHEAD = 3
+# settings.incidents_archive_schema
+ARCHIVE_SCHEMA = 'incidents_archive'
+ACTIVE_STATUSES = ('open', 'in_progress')
+
+COUNTERS_TRIGGERS = (
+    """
+    CREATE TRIGGER incidents_counters_insert_delete
+    AFTER INSERT OR DELETE ON incidents
+    FOR EACH ROW EXECUTE FUNCTION incident_counters_track()
+    """,
+    """
+    CREATE TRIGGER incidents_counters_update
+    AFTER UPDATE OF status, source ON incidents
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status
+          OR OLD.source IS DISTINCT FROM NEW.source)
+    EXECUTE FUNCTION incident_counters_track()
+    """,
+)
+COLUMNS = 'description, status, source, id, created_at, updated_at'
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _create_table(name: str, *args, **kw) -> None:
+    op.create_table(name,
+    sa.Column('description', sa.Text(), nullable=True, comment='Описание инцидента'),
+    sa.Column('status', postgresql.ENUM(name='incident_status', create_type=False), nullable=False),
+    sa.Column('source', postgresql.ENUM(name='incident_source', create_type=False), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    *args,
+    **kw
+    )
+
+
+def _create_indexes() -> None:
+    op.create_index('ix_incidents_created_at_id', 'incidents', ['created_at', 'id'], unique=False)
+    op.create_index('ix_incidents_status_created_at', 'incidents', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('ix_incidents_source_created_at', 'incidents', ['source', 'created_at', 'id'], unique=False)
+    for status in ACTIVE_STATUSES:
+        op.create_index(
+            f'ix_incidents_{status}_source_created_at',
+            'incidents',
+            ['source', 'created_at', 'id'],
+            unique=False,
+            postgresql_where=sa.text(f"status = '{status}'"),
+        )
+    op.create_index(
+        'ix_incidents_description_fts',
+        'incidents',
+        [sa.text("to_tsvector('russian', coalesce(description, ''))")],
+        unique=False,
+        postgresql_using='gin',
+    )
+    op.create_index(
+        'ix_incidents_description_trgm',
+        'incidents',
+        ['description'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'description': 'gin_trgm_ops'},
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # переливка всей таблицы в одной транзакции - нужно окно обслуживания,
+    # запись в incidents на это время блокируется
+    op.rename_table('incidents', 'incidents_unpartitioned')
+    op.execute(
+        "ALTER TABLE incidents_unpartitioned "
+        "RENAME CONSTRAINT incidents_pkey TO incidents_unpartitioned_pkey"
+    )
+
+    # ключ партиционирования обязан входить в первичный ключ
+    _create_table(
+        'incidents',
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+    # страховка на случай, если будущая партиция не успела появиться
+    op.execute("CREATE TABLE incidents_default PARTITION OF incidents DEFAULT")
+
+    oldest = op.get_bind().scalar(sa.text("SELECT min(created_at) FROM incidents_unpartitioned"))
+    month = _month_start(oldest or datetime.utcnow())
+    last = _add_months(_month_start(datetime.utcnow()), PARTITIONS_AHEAD)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE incidents_p{month:%Y%m} PARTITION OF incidents "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+        )
+        month = _add_months(month, 1)
+
+    # триггеров на новой таблице ещё нет, счётчики уже посчитаны по этим строкам
+    op.execute(f"INSERT INTO incidents ({COLUMNS}) SELECT {COLUMNS} FROM incidents_unpartitioned")
+    op.drop_table('incidents_unpartitioned')
+
+    # индексы на родителе создаются и на всех партициях
+    _create_indexes()
+    for trigger in COUNTERS_TRIGGERS:
+        op.execute(trigger)
+
+    # сюда IncidentPartitionManager переносит отцепленные старые партиции
+    op.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # схема incidents_archive не удаляется: в ней могут лежать архивные данные
+    op.rename_table('incidents', 'incidents_partitioned')
+    op.execute(
+        "ALTER TABLE incidents_partitioned "
+        "RENAME CONSTRAINT incidents_pkey TO incidents_partitioned_pkey"
+    )
+
+    _create_table('incidents', sa.PrimaryKeyConstraint('id'))
+    op.execute(f"INSERT INTO incidents ({COLUMNS}) SELECT {COLUMNS} FROM incidents_partitioned")
+    # вместе с партициями
+    op.drop_table('incidents_partitioned')
+
+    _create_indexes()
+    for trigger in COUNTERS_TRIGGERS:
+        op.execute(trigger)
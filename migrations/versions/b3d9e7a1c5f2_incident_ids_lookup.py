@@ -0,0 +1,95 @@
+"""incident ids lookup across partitions, drop default partition
+
+Revision ID: b3d9e7a1c5f2
+Revises: f7c3a9e2d4b1
+Create Date: 2026-10-19 14:36:08.527114
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3d9e7a1c5f2'
+down_revision: Union[str, Sequence[str], None] = 'f7c3a9e2d4b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = 'description, status, source, id, created_at, updated_at'
+
+# id -> created_at для всех партиций, пачка строк одного запроса - одним INSERT
+IDS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION incident_ids_track() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO incident_ids (id, created_at)
+            SELECT id, created_at FROM new_rows;
+        ELSE
+            DELETE FROM incident_ids i USING old_rows o WHERE i.id = o.id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+IDS_TRIGGERS = (
+    """
+    CREATE TRIGGER incidents_ids_insert
+    AFTER INSERT ON incidents
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION incident_ids_track()
+    """,
+    """
+    CREATE TRIGGER incidents_ids_delete
+    AFTER DELETE ON incidents
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION incident_ids_track()
+    """,
+)
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # с default-партицией postgres не умеет DETACH PARTITION ... CONCURRENTLY,
+    # а без неё архивация не берёт ACCESS EXCLUSIVE на incidents.
+    # строки из неё переезжают в помесячные партиции
+    op.execute("ALTER TABLE incidents DETACH PARTITION incidents_default")
+    months = op.get_bind().scalars(sa.text(
+        "SELECT DISTINCT date_trunc('month', created_at) FROM incidents_default"
+    )).all()
+    for month in months:
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS incidents_p{month:%Y%m} PARTITION OF incidents "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+        )
+    # строки уже посчитаны в incident_counters
+    op.execute("ALTER TABLE incidents DISABLE TRIGGER incidents_counters_insert")
+    op.execute(f"INSERT INTO incidents ({COLUMNS}) SELECT {COLUMNS} FROM incidents_default")
+    op.execute("ALTER TABLE incidents ENABLE TRIGGER incidents_counters_insert")
+    op.drop_table('incidents_default')
+
+    op.create_table('incident_ids',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO incident_ids (id, created_at) SELECT id, created_at FROM incidents")
+    op.execute(IDS_FUNCTION)
+    for trigger in IDS_TRIGGERS:
+        op.execute(trigger)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER incidents_ids_insert ON incidents")
+    op.execute("DROP TRIGGER incidents_ids_delete ON incidents")
+    op.execute("DROP FUNCTION incident_ids_track()")
+    op.drop_table('incident_ids')
+
+    op.execute("CREATE TABLE incidents_default PARTITION OF incidents DEFAULT")
@@ -0,0 +1,71 @@
+"""incidents description full-text and trigram search
+
+Revision ID: c2a8f4e61d57
+Revises: 9d4c6a1e7f35
+Create Date: 2026-10-18 15:41:07.503219
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2a8f4e61d57'
+down_revision: Union[str, Sequence[str], None] = '9d4c6a1e7f35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # CONCURRENTLY нельзя внутри транзакции, на большой таблице не блокируем запись
+    with op.get_context().autocommit_block():
+        # выражение должно совпадать с запросом в репозитории, иначе индекс не возьмётся
+        op.create_index(
+            'ix_incidents_description_fts',
+            'incidents',
+            [sa.text("to_tsvector('russian', coalesce(description, ''))")],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_incidents_description_trgm',
+            'incidents',
+            ['description'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'description': 'gin_trgm_ops'},
+            postgresql_concurrently=True,
+        )
+        # b-tree по длинному тексту не помогает ни поиску, ни сортировке
+        op.drop_index(
+            'ix_incidents_description',
+            table_name='incidents',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_incidents_description',
+            'incidents',
+            ['description'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_incidents_description_trgm',
+            table_name='incidents',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_incidents_description_fts',
+            table_name='incidents',
+            postgresql_concurrently=True,
+        )
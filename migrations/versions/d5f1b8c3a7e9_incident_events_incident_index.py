@@ -0,0 +1,39 @@
+"""incident events index by incident for ordered outbox claims
+
+Revision ID: d5f1b8c3a7e9
+Revises: b3d9e7a1c5f2
+Create Date: 2026-10-20 09:41:17.302518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f1b8c3a7e9'
+down_revision: Union[str, Sequence[str], None] = 'b3d9e7a1c5f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # релей проверяет, нет ли более раннего события того же инцидента вне пачки
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_incident_events_incident_id_id',
+            'incident_events',
+            ['incident_id', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_incident_events_incident_id_id',
+            table_name='incident_events',
+            postgresql_concurrently=True,
+        )
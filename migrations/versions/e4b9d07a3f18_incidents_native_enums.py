@@ -0,0 +1,135 @@
+"""incidents native enums and composite indexes
+
+Revision ID: e4b9d07a3f18
+Revises: c2a8f4e61d57
+Create Date: 2026-10-18 16:27:53.840116
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b9d07a3f18'
+down_revision: Union[str, Sequence[str], None] = 'c2a8f4e61d57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATUSES = ('open', 'in_progress', 'resolved', 'closed', 'cancelled')
+SOURCES = ('operator', 'monitoring', 'partner', 'unknown')
+ACTIVE_STATUSES = ('open', 'in_progress')
+
+# status/source в счётчиках остаются строками, enum с varchar сам не сравнивается
+COUNTERS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION incident_counters_track() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE incident_counters SET count = count - 1
+            WHERE status = OLD.status::text AND source = OLD.source::text;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO incident_counters (status, source, count)
+            VALUES (NEW.status::text, NEW.source::text, 1)
+            ON CONFLICT (status, source)
+            DO UPDATE SET count = incident_counters.count + 1;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+COUNTERS_UPDATE_TRIGGER = """
+    CREATE TRIGGER incidents_counters_update
+    AFTER UPDATE OF status, source ON incidents
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status
+          OR OLD.source IS DISTINCT FROM NEW.source)
+    EXECUTE FUNCTION incident_counters_track()
+"""
+
+OLD_INDEXES = (
+    ('ix_incidents_status', ['status']),
+    ('ix_incidents_source', ['source']),
+    # префикс ix_incidents_created_at_id
+    ('ix_incidents_created_at', ['created_at']),
+    # по updated_at нет ни фильтров, ни сортировок
+    ('ix_incidents_updated_at', ['updated_at']),
+)
+
+
+def _create_new_indexes() -> None:
+    op.create_index(
+        'ix_incidents_status_created_at',
+        'incidents',
+        ['status', 'created_at', 'id'],
+        unique=False,
+        postgresql_concurrently=True,
+    )
+    op.create_index(
+        'ix_incidents_source_created_at',
+        'incidents',
+        ['source', 'created_at', 'id'],
+        unique=False,
+        postgresql_concurrently=True,
+    )
+    for status in ACTIVE_STATUSES:
+        op.create_index(
+            f'ix_incidents_{status}_source_created_at',
+            'incidents',
+            ['source', 'created_at', 'id'],
+            unique=False,
+            postgresql_where=sa.text(f"status = '{status}'"),
+            postgresql_concurrently=True,
+        )
+
+
+def _drop_new_indexes() -> None:
+    for name in (
+        'ix_incidents_status_created_at',
+        'ix_incidents_source_created_at',
+        *(f'ix_incidents_{status}_source_created_at' for status in ACTIVE_STATUSES),
+    ):
+        op.drop_index(name, table_name='incidents', postgresql_concurrently=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    sa.Enum(*STATUSES, name='incident_status').create(op.get_bind())
+    sa.Enum(*SOURCES, name='incident_source').create(op.get_bind())
+
+    # тип колонки нельзя поменять, пока на неё ссылается WHEN триггера
+    op.execute("DROP TRIGGER incidents_counters_update ON incidents")
+    for name, _ in OLD_INDEXES:
+        op.drop_index(name, table_name='incidents')
+
+    # перезапись таблицы под ACCESS EXCLUSIVE, обе колонки за один проход
+    op.execute("""
+        ALTER TABLE incidents
+            ALTER COLUMN status TYPE incident_status USING status::incident_status,
+            ALTER COLUMN source TYPE incident_source USING source::incident_source
+    """)
+    op.execute(COUNTERS_FUNCTION)
+    op.execute(COUNTERS_UPDATE_TRIGGER)
+
+    # CONCURRENTLY нельзя внутри транзакции, на большой таблице не блокируем запись
+    with op.get_context().autocommit_block():
+        _create_new_indexes()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        _drop_new_indexes()
+
+    op.execute("DROP TRIGGER incidents_counters_update ON incidents")
+    op.execute("""
+        ALTER TABLE incidents
+            ALTER COLUMN status TYPE VARCHAR(255) USING status::text,
+            ALTER COLUMN source TYPE VARCHAR(255) USING source::text
+    """)
+    op.execute(COUNTERS_UPDATE_TRIGGER)
+    for name, columns in OLD_INDEXES:
+        op.create_index(name, 'incidents', columns, unique=False)
+
+    sa.Enum(name='incident_source').drop(op.get_bind())
+    sa.Enum(name='incident_status').drop(op.get_bind())
@@ -0,0 +1,155 @@
+"""incident counters striped and maintained per statement
+
+Revision ID: f7c3a9e2d4b1
+Revises: a6d2e8c41f93
+Create Date: 2026-10-19 10:12:44.918203
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7c3a9e2d4b1'
+down_revision: Union[str, Sequence[str], None] = 'a6d2e8c41f93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# совпадает с COUNTER_STRIPES в src/domain/models.py
+STRIPES = 16
+
+# одна строка на (status, source, stripe): параллельные транзакции пишут в
+# разные полосы (по pid бэкенда), а пачка строк одного запроса сворачивается
+# в одно изменение на группу через transition-таблицы
+COUNTERS_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION incident_counters_track() RETURNS trigger AS $$
+    DECLARE
+        current_stripe smallint := pg_backend_pid() % {STRIPES};
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO incident_counters AS c (status, source, stripe, count)
+            SELECT status::text, source::text, current_stripe, count(*)
+            FROM new_rows GROUP BY 1, 2 ORDER BY 1, 2
+            ON CONFLICT (status, source, stripe)
+            DO UPDATE SET count = c.count + EXCLUDED.count;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO incident_counters AS c (status, source, stripe, count)
+            SELECT status::text, source::text, current_stripe, -count(*)
+            FROM old_rows GROUP BY 1, 2 ORDER BY 1, 2
+            ON CONFLICT (status, source, stripe)
+            DO UPDATE SET count = c.count + EXCLUDED.count;
+        ELSE
+            INSERT INTO incident_counters AS c (status, source, stripe, count)
+            SELECT status, source, current_stripe, sum(delta)
+            FROM (
+                SELECT status::text AS status, source::text AS source, 1 AS delta
+                FROM new_rows
+                UNION ALL
+                SELECT status::text, source::text, -1 FROM old_rows
+            ) d
+            GROUP BY 1, 2 HAVING sum(delta) <> 0 ORDER BY 1, 2
+            ON CONFLICT (status, source, stripe)
+            DO UPDATE SET count = c.count + EXCLUDED.count;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+# transition-таблицы нельзя совмещать ни с несколькими событиями, ни со списком колонок
+COUNTERS_TRIGGERS = (
+    """
+    CREATE TRIGGER incidents_counters_insert
+    AFTER INSERT ON incidents
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION incident_counters_track()
+    """,
+    """
+    CREATE TRIGGER incidents_counters_update
+    AFTER UPDATE ON incidents
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION incident_counters_track()
+    """,
+    """
+    CREATE TRIGGER incidents_counters_delete
+    AFTER DELETE ON incidents
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION incident_counters_track()
+    """,
+)
+
+# построчная версия из e4b9d07a3f18
+ROW_COUNTERS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION incident_counters_track() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE incident_counters SET count = count - 1
+            WHERE status = OLD.status::text AND source = OLD.source::text;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO incident_counters (status, source, count)
+            VALUES (NEW.status::text, NEW.source::text, 1)
+            ON CONFLICT (status, source)
+            DO UPDATE SET count = incident_counters.count + 1;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+ROW_COUNTERS_TRIGGERS = (
+    """
+    CREATE TRIGGER incidents_counters_insert_delete
+    AFTER INSERT OR DELETE ON incidents
+    FOR EACH ROW EXECUTE FUNCTION incident_counters_track()
+    """,
+    """
+    CREATE TRIGGER incidents_counters_update
+    AFTER UPDATE OF status, source ON incidents
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status
+          OR OLD.source IS DISTINCT FROM NEW.source)
+    EXECUTE FUNCTION incident_counters_track()
+    """,
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("DROP TRIGGER incidents_counters_insert_delete ON incidents")
+    op.execute("DROP TRIGGER incidents_counters_update ON incidents")
+
+    op.add_column(
+        'incident_counters',
+        sa.Column('stripe', sa.SmallInteger(), nullable=False, server_default='0'),
+    )
+    op.drop_constraint('incident_counters_pkey', 'incident_counters', type_='primary')
+    op.create_primary_key(
+        'incident_counters_pkey', 'incident_counters', ['status', 'source', 'stripe']
+    )
+
+    op.execute(COUNTERS_FUNCTION)
+    for trigger in COUNTERS_TRIGGERS:
+        op.execute(trigger)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER incidents_counters_insert ON incidents")
+    op.execute("DROP TRIGGER incidents_counters_update ON incidents")
+    op.execute("DROP TRIGGER incidents_counters_delete ON incidents")
+
+    # полосы сворачиваются в одну строку на (status, source)
+    op.execute("""
+        INSERT INTO incident_counters AS c (status, source, stripe, count)
+        SELECT status, source, 0, sum(count)
+        FROM incident_counters GROUP BY status, source
+        ON CONFLICT (status, source, stripe) DO UPDATE SET count = EXCLUDED.count
+    """)
+    op.execute("DELETE FROM incident_counters WHERE stripe <> 0")
+    op.drop_constraint('incident_counters_pkey', 'incident_counters', type_='primary')
+    op.create_primary_key('incident_counters_pkey', 'incident_counters', ['status', 'source'])
+    op.drop_column('incident_counters', 'stripe')
+
+    op.execute(ROW_COUNTERS_FUNCTION)
+    for trigger in ROW_COUNTERS_TRIGGERS:
+        op.execute(trigger)
@@ -1,7 +1,7 @@
-from fastapi import Depends, HTTPException, Header, status
+from fastapi import Depends, Header, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.core.database import get_db
+from src.core.database import get_db, get_read_db
 from src.infrastructure.security import verify_x_access_key as verify_key
 from src.services.incident_service import IncidentService
 
@@ -27,3 +27,11 @@ async def get_incident_service(
     """Di зависимость для сервиса инцидентов"""
 
     return IncidentService(db)
+
+
+async def get_read_incident_service(
+    db: AsyncSession = Depends(get_read_db)
+) -> IncidentService:
+    """Di зависимость для сервиса инцидентов на read-only эндпоинтах (чтение с реплик)"""
+
+    return IncidentService(db)
@@ -1,18 +1,31 @@
+from datetime import datetime
+from typing import Any, List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status
+from fastapi import status as http_status
 
-from src.api.dependencies import get_incident_service, verify_x_access_key
+from src.api.dependencies import (
+    get_incident_service,
+    get_read_incident_service,
+    verify_x_access_key,
+)
+from src.core.config import settings
 from src.domain.models import IncidentSource, IncidentStatus
 from src.domain.schemas import (
+    CountMode,
+    IncidentBatchResponse,
+    IncidentBulkStatusResponse,
+    IncidentBulkStatusUpdate,
     IncidentCreate,
     IncidentItemResponse,
-    IncidentStatusUpdate,
     IncidentListResponse,
+    IncidentStatusUpdate,
     ResponseIdDTO,
     ResponseMsgDTO,
 )
-from src.services.incident_service import IncidentService
+from src.services.incident_service import IncidentService, IncidentStatusConflictError
+from src.services.pagination import InvalidCursorError
 
 router = APIRouter()
 
@@ -36,6 +49,28 @@ async def create_incident(
     return response
 
 
+@router.post(
+    "/batch",
+    response_model=IncidentBatchResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Создать инциденты пачкой",
+)
+async def create_incidents_batch(
+    # элементы не типизируем: невалидный элемент - ошибка в errors, а не 422 на всю пачку
+    items: List[Any] = Body(
+        ...,
+        min_length=1,
+        max_length=settings.incidents_batch_max_size,
+        description="Список инцидентов в формате IncidentCreate",
+    ),
+    service: IncidentService = Depends(get_incident_service),
+    _: str = Depends(verify_x_access_key),
+) -> IncidentBatchResponse:
+    """пакетное создание инцидентов, id возвращаются в порядке запроса"""
+
+    return await service.create_incidents_batch(items)
+
+
 @router.get(
     "/",
     response_model=IncidentListResponse,
@@ -51,17 +86,56 @@ async def get_incidents(
     ),
     limit: int = Query(100, ge=1, le=1000, description="Лимит записей"),
     offset: int = Query(0, ge=0, description="Смещение для пагинации"),
-    service: IncidentService = Depends(get_incident_service),
+    cursor: str | None = Query(
+        None,
+        description="Курсор из next_cursor предыдущей страницы (вместо offset)",
+    ),
+    count: CountMode = Query(
+        CountMode.EXACT,
+        description="Подсчёт total: exact - точно (с коротким кэшем), "
+        "estimate - по счётчикам, none - не считать",
+    ),
+    q: str | None = Query(
+        None,
+        min_length=1,
+        max_length=200,
+        description="Поиск по описанию: слова (полнотекстово) или подстрока, "
+        "выдача по релевантности, пагинация только через offset",
+    ),
+    created_from: datetime | None = Query(
+        None, description="Созданные не раньше (включительно), ISO 8601"
+    ),
+    created_to: datetime | None = Query(
+        None, description="Созданные раньше (не включительно), ISO 8601"
+    ),
+    service: IncidentService = Depends(get_read_incident_service),
     _: str = Depends(verify_x_access_key),
-) -> IncidentListResponse:
-    """список инцидентов"""
-
-    return await service.get_incidents(
-        status=status,
-        source=source,
-        limit=limit,
-        offset=offset
-    )
+) -> Response:
+    """список инцидентов
+
+    отдаём готовые байты из сервиса (или кэша) мимо повторной сериализации FastAPI
+    """
+
+    try:
+        raw = await service.get_incidents_json(
+            status=status,
+            source=source,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            count=count,
+            q=q,
+            created_from=created_from,
+            created_to=created_to,
+        )
+    except InvalidCursorError:
+        raise HTTPException(
+            # status здесь перекрыт query-параметром
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return Response(content=raw, media_type="application/json")
+
 
 @router.get(
     "/{incident_id}",
@@ -71,18 +145,19 @@ async def get_incidents(
 )
 async def get_incident(
     incident_id: UUID,
-    service: IncidentService = Depends(get_incident_service),
+    service: IncidentService = Depends(get_read_incident_service),
     _: str = Depends(verify_x_access_key),
-) -> IncidentItemResponse:
+) -> Response:
     """Получить инцидент по ID."""
 
-    incident = await service.get_incident(incident_id)
+    incident = await service.get_incident_json(incident_id)
     if not incident:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Incident not found"
         )
-    return incident
+    # при попадании в кэш это байты прямо из redis
+    return Response(content=incident, media_type="application/json")
 
 
 @router.patch(
@@ -99,13 +174,41 @@ async def update_incident_status(
 ) -> ResponseMsgDTO:
     """Обновить статус инцидента по ID."""
 
-    updated = await service.update_incident_status(
-        incident_id=incident_id,
-        new_status=update_data.status
-    )
+    try:
+        updated = await service.update_incident_status(
+            incident_id=incident_id,
+            new_status=update_data.status,
+            expected_status=update_data.expected_status,
+        )
+    except IncidentStatusConflictError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Incident status does not match expected_status"
+        )
     if not updated:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Incident not found"
         )
     return ResponseMsgDTO(message="Incident status updated")
+
+
+@router.patch(
+    "/status",
+    response_model=IncidentBulkStatusResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Обновить статус пачке инцидентов",
+)
+async def update_incidents_status(
+    update_data: IncidentBulkStatusUpdate,
+    service: IncidentService = Depends(get_incident_service),
+    _: str = Depends(verify_x_access_key),
+) -> IncidentBulkStatusResponse:
+    """Обновить статус пачке инцидентов одним UPDATE."""
+
+    updated = await service.update_incidents_status(
+        incident_ids=update_data.ids,
+        new_status=update_data.status,
+        expected_status=update_data.expected_status,
+    )
+    return IncidentBulkStatusResponse(updated=updated)
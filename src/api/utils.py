@@ -1,3 +1,88 @@
-from fastapi import APIRouter
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.api.dependencies import verify_x_access_key
+from src.core.config import settings
+from src.core.database import get_db, get_pool_stats
+from src.domain.schemas import (
+    CacheStatsResponse,
+    DbPoolStatsResponse,
+    OutboxStatsResponse,
+    SlowQueriesResponse,
+)
+from src.infrastructure.cache import cache_client
+from src.infrastructure.profiling import slow_query_log
+from src.services.outbox_relay import outbox_relay
+from src.services.outbox_repository import OutboxRepository
 
 router = APIRouter()
+
+
+@router.get(
+    "/outbox",
+    response_model=OutboxStatsResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Состояние outbox событий",
+)
+async def get_outbox_stats(
+    db: AsyncSession = Depends(get_db),
+    _: str = Depends(verify_x_access_key),
+) -> OutboxStatsResponse:
+    """отставание и пропускная способность outbox relay"""
+
+    pending, oldest = await OutboxRepository(db).get_stats()
+    lag = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    return OutboxStatsResponse(
+        pending=pending,
+        lag_seconds=lag,
+        relay_published_total=outbox_relay.published_total,
+        relay_throughput=outbox_relay.throughput,
+    )
+
+
+@router.get(
+    "/cache",
+    response_model=CacheStatsResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Статистика кэша",
+)
+async def get_cache_stats(
+    _: str = Depends(verify_x_access_key),
+) -> CacheStatsResponse:
+    """попадания и промахи по уровням кэша в этом воркере"""
+
+    return CacheStatsResponse(**cache_client.stats())
+
+
+@router.get(
+    "/db-pool",
+    response_model=DbPoolStatsResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Статистика пула соединений",
+)
+async def get_db_pool_stats(
+    _: str = Depends(verify_x_access_key),
+) -> DbPoolStatsResponse:
+    """занятость пула и время ожидания соединения в этом воркере"""
+
+    return DbPoolStatsResponse(**get_pool_stats())
+
+
+@router.get(
+    "/slow-queries",
+    response_model=SlowQueriesResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Медленные SQL запросы",
+)
+async def get_slow_queries(
+    _: str = Depends(verify_x_access_key),
+) -> SlowQueriesResponse:
+    """последние медленные запросы этого воркера с планами"""
+
+    return SlowQueriesResponse(
+        threshold_ms=settings.slow_query_threshold_ms,
+        total=slow_query_log.total,
+        queries=slow_query_log.recent(),
+    )
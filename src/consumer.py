@@ -1,12 +1,28 @@
 import asyncio
+import logging
 
+from src.core.config import settings
+from src.core.log_config import setup_logging
 from src.services.kafka_service import kafka_consumer
 from src.services.telegram_service import telegram_service
 
+logger = logging.getLogger(__name__)
+
 
 async def main():
     """чтение из топика инцидентов"""
-    pass
+
+    setup_logging()
+    if not settings.kafka_bootstrap_servers:
+        logger.error("KAFKA_BOOTSTRAP_SERVERS is not set, nothing to consume")
+        raise SystemExit(1)
+    await telegram_service.initialize()
+    await kafka_consumer.initialize()
+    try:
+        await kafka_consumer.consume_incidents()
+    finally:
+        await kafka_consumer.close()
+        await telegram_service.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -1,25 +1,324 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import event, exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
 
 from src.core.config import settings
+from src.infrastructure import metrics, profiling
+from src.infrastructure.profiling import slow_query_log
 
 
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(settings.asyncpg_uri, echo=False)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+class PoolMetrics:
+    """метрики ожидания соединения из пула"""
+
+    # границы бакетов гистограммы времени ожидания, сек
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+        self.wait_buckets = [0] * (len(self.BUCKETS) + 1)  # последний - +Inf
+        self.wait_sum = 0.0
+        self.wait_count = 0
+        self.timeouts = 0
+
+    def observe_wait(self, seconds: float):
+        self.wait_buckets[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.wait_sum += seconds
+        self.wait_count += 1
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """пул, который меряет, сколько запрос ждал соединение
 
+    таймаутом считается только TimeoutError пула, ошибки подключения и отмена
+    запроса - нет. установка нового соединения в ожидание не входит
+    """
 
-async def get_db():
-    """Dependency для сессии бд и транзакций"""
-    async with AsyncSessionLocal() as session:
+    def _do_get(self):
+        started = time.perf_counter()
+        started_at = time.time()
         try:
-            yield session
-            await session.commit()
-        except Exception:
-            await session.rollback()
+            record = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            metrics.DB_POOL_TIMEOUTS.inc()
+            self._observe_wait(time.perf_counter() - started)
             raise
-        finally:
-            await session.close()
+
+        # у открытого сейчас соединения starttime - момент начала подключения
+        if record.starttime >= started_at:
+            self._observe_wait(record.starttime - started_at)
+        else:
+            self._observe_wait(time.perf_counter() - started)
+        return record
+
+    @staticmethod
+    def _observe_wait(waited: float):
+        pool_metrics.observe_wait(waited)
+        metrics.DB_POOL_WAIT.observe(waited)
+
+
+def _connect_args() -> Dict[str, Any]:
+    if settings.db_pgbouncer:
+        # pgbouncer в transaction-режиме отдаёт разные серверные соединения,
+        # именованные prepared statements между ними не живут
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return {"prepared_statement_cache_size": settings.db_statement_cache_size}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _instrument_queries(async_engine: AsyncEngine):
+    """время и число SQL запросов (в том числе в разрезе HTTP запроса), медленные - в журнал"""
+
+    slow_threshold = settings.slow_query_threshold_ms / 1000
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        metrics.observe_query(elapsed)
+        profiling.add("db", elapsed)
+        if slow_threshold and elapsed >= slow_threshold:
+            slow_query_log.record(async_engine, statement, parameters, elapsed, executemany)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(async_engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    async_engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args=_connect_args(),
+    )
+    _instrument_queries(async_engine)
+    event.listen(
+        async_engine.sync_engine.pool, "checkout",
+        lambda *args: metrics.DB_POOL_CHECKED_OUT.inc(),
+    )
+    event.listen(
+        async_engine.sync_engine.pool, "checkin",
+        lambda *args: metrics.DB_POOL_CHECKED_OUT.dec(),
+    )
+    return async_engine
+
+
+engine = _create_engine(settings.asyncpg_uri)
+
+logger = logging.getLogger(__name__)
+
+# отставание реплики в секундах; на реплике без новых записей считаем его нулевым
+_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaRouter:
+    """выбор реплики для чтения
+
+    реплики с отставанием больше db_replica_max_lag (или недоступные)
+    исключаются до следующей проверки, если подходящих нет - читаем с primary
+    """
+
+    def __init__(self, urls: List[str]):
+        self.engines = [_create_engine(settings.to_asyncpg_uri(url)) for url in urls]
+        # те же пулы, но без BEGIN/COMMIT - для read-only сессий
+        self._read_engines = {
+            id(replica): replica.execution_options(isolation_level="AUTOCOMMIT")
+            for replica in self.engines
+        }
+        # до первой проверки отставание неизвестно, читаем с primary
+        self.lags: List[Optional[float]] = [None] * len(self.engines)
+        self._round_robin = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def choose(self) -> Optional[AsyncEngine]:
+        """реплика (в autocommit) для read-only сессии или None"""
+
+        healthy = [
+            engine
+            for engine, lag in zip(self.engines, self.lags)
+            if lag is not None and lag <= settings.db_replica_max_lag
+        ]
+        if not healthy:
+            return None
+        if settings.db_replica_balancing == "least_connections":
+            replica = min(healthy, key=lambda e: e.sync_engine.pool.checkedout())
+        else:
+            replica = healthy[next(self._round_robin) % len(healthy)]
+        return self._read_engines[id(replica)]
+
+    async def check_lags(self):
+        for i, replica in enumerate(self.engines):
+            try:
+                async with replica.connect() as connection:
+                    self.lags[i] = float(await connection.scalar(_REPLICA_LAG_SQL))
+            except Exception as e:
+                logger.warning("Replica %s lag check failed: %s", i, e)
+                self.lags[i] = None
+
+    async def _check_loop(self):
+        while True:
+            await self.check_lags()
+            await asyncio.sleep(settings.db_replica_lag_check_interval)
+
+    def start(self):
+        if self.engines:
+            self._task = asyncio.create_task(self._check_loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.engines:
+            await replica.dispose()
+
+
+replica_router = ReplicaRouter(settings.database_replica_urls)
+
+# autocommit в asyncpg-адаптере - флаг на клиенте: ни BEGIN, ни COMMIT не уходят в бд
+_read_only_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+_READ_ONLY = "read_only"
+_READ_BIND = "read_bind"
+_FROM_REPLICA = "from_replica"
+_WROTE = "wrote"
+
+
+class RoutingSession(Session):
+    """сессия, которая отправляет чтения на реплику
+
+    на реплику идут только сессии, явно помеченные для чтения (get_read_db),
+    и только пока в них ничего не писали - чтение после записи остаётся на primary.
+    чтения таких сессий идут в autocommit, без BEGIN/COMMIT вокруг
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        writes = (
+            self._flushing
+            or isinstance(clause, UpdateBase)
+            or getattr(clause, "_for_update_arg", None) is not None
+        )
+        if writes:
+            self.info[_WROTE] = True
+        elif self.info.get(_READ_ONLY) and not self.info.get(_WROTE):
+            if _READ_BIND not in self.info:
+                # реплика закрепляется за сессией на весь запрос
+                replica = replica_router.choose()
+                self.info[_FROM_REPLICA] = replica is not None
+                self.info[_READ_BIND] = (replica or _read_only_engine).sync_engine
+            return self.info[_READ_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+def used_replica(session: AsyncSession) -> bool:
+    """читала ли сессия с реплики (данные могут отставать на db_replica_max_lag)"""
+
+    return session.info.get(_FROM_REPLICA, False)
+
+
+AsyncSessionLocal = sessionmaker(
+    engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
+)
+
+_AFTER_COMMIT = "after_commit"
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """текущее состояние пула и гистограмма ожидания соединения"""
+
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checked_in": pool.checkedin(),
+        "wait_timeouts": pool_metrics.timeouts,
+        "wait_count": pool_metrics.wait_count,
+        "wait_sum_seconds": pool_metrics.wait_sum,
+        "wait_buckets": {
+            str(bound): count
+            for bound, count in zip(
+                list(PoolMetrics.BUCKETS) + ["+Inf"],
+                # гистограмма кумулятивная, как в prometheus
+                [sum(pool_metrics.wait_buckets[: i + 1])
+                 for i in range(len(pool_metrics.wait_buckets))],
+            )
+        },
+    }
+
+
+def on_commit(session: AsyncSession, callback: Callable[[], Awaitable[None]]):
+    """выполнить callback после успешного коммита сессии в get_db
+
+    нужно для инвалидации кэша: до коммита параллельный запрос может
+    снова положить в кэш ещё старые данные
+    """
+
+    session.info.setdefault(_AFTER_COMMIT, []).append(callback)
+
+
+def _session_dependency(read_only: bool):
+    async def dependency():
+        """Dependency для сессии бд и транзакций
+
+        соединение берётся из пула только при первом запросе к бд, так что
+        попадание в кэш пул не трогает, а без запросов не будет и COMMIT
+        """
+        async with AsyncSessionLocal() as session:
+            if read_only:
+                session.info[_READ_ONLY] = True
+            try:
+                yield session
+                if session.in_transaction():
+                    await session.commit()
+                for callback in session.info.pop(_AFTER_COMMIT, []):
+                    await callback()
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                await session.close()
+
+    return dependency
+
+
+get_db = _session_dependency(read_only=False)
+# для read-only эндпоинтов: чтения в autocommit, с реплики, если она настроена и не отстаёт
+get_read_db = _session_dependency(read_only=True)
@@ -0,0 +1,192 @@
+"""структурные логи в json через очередь
+
+в event loop остаётся только подстановка аргументов в сообщение и
+put_nowait в очередь, форматирование и запись в stdout делает отдельный
+поток QueueListener. повторяющиеся предупреждения и ошибки (ошибки кэша
+при упавшем redis) пропускаются пачкой burst на окно, остальные
+считаются и сообщаются полем suppressed у следующего пропущенного
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import orjson
+
+from src.core.config import settings
+
+# id запроса для всех записей, сделанных при его обработке
+correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+
+# поля LogRecord, которые не являются extra
+_RECORD_FIELDS = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", (), None)).keys()
+) | {"message", "asctime", "correlation_id", "suppressed", "color_message"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+
+class DedupFilter(logging.Filter):
+    """не больше burst одинаковых записей от WARNING и выше за window секунд
+
+    одинаковые - тот же логгер, уровень и шаблон сообщения (до подстановки
+    аргументов), поэтому логируем через %s, а не f-строкой. INFO и ниже не
+    трогаем: у access-лога uvicorn один шаблон на все запросы
+    """
+
+    max_keys = 1000
+
+    def __init__(self, window: float, burst: int):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        # ключ -> [начало окна, записей в окне, подавлено]
+        self._seen: Dict[Tuple[str, int, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.window <= 0 or record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        # логируют и из потоков (to_thread, драйверы), не только из loop
+        with self._lock:
+            state = self._seen.get(key)
+            if state is None:
+                if len(self._seen) >= self.max_keys:
+                    self._prune(now)
+                self._seen[key] = [now, 1, 0]
+                return True
+            if now - state[0] >= self.window:
+                suppressed = state[2]
+                state[:] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            state[1] += 1
+            if state[1] <= self.burst:
+                return True
+            state[2] += 1
+            return False
+
+    def _prune(self, now: float):
+        for key in [k for k, state in self._seen.items() if now - state[0] >= self.window]:
+            del self._seen[key]
+        # все ключи свежие - сбрасываем целиком, лишь бы не расти
+        if len(self._seen) >= self.max_keys:
+            self._seen.clear()
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """кладёт запись в очередь без форматирования, при полной очереди - отбрасывает"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # аргументы подставляем сразу: объекты могут поменяться до записи потоком
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        record.correlation_id = correlation_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """одна запись - одна строка json"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "correlation_id", None)
+        if request_id:
+            entry["correlation_id"] = request_id
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_FIELDS:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    """читаемый вывод для локальной разработки"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not getattr(record, "correlation_id", None):
+            record.correlation_id = "-"
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", None)
+        return f"{text} (suppressed {suppressed})" if suppressed else text
+
+
+def setup_logging():
+    """перевести корневой логгер (и uvicorn) на очередь, повторный вызов ничего не делает"""
+
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if settings.log_json else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    handler = AsyncQueueHandler(log_queue)
+    handler.addFilter(DedupFilter(settings.log_dedup_window, settings.log_dedup_burst))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+
+    # uvicorn настраивает свои логгеры раньше импорта приложения
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, stream)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """дописать очередь и остановить поток записи"""
+
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
@@ -1,8 +1,20 @@
 import enum
 import uuid
 from datetime import datetime
-
-from sqlalchemy import Text, String, UUID
+from typing import Any, Dict
+
+from sqlalchemy import (
+    UUID,
+    BigInteger,
+    Enum,
+    Identity,
+    Index,
+    SmallInteger,
+    String,
+    Text,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from src.core.database import Base
@@ -16,11 +28,13 @@ class BaseModel(Base):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
+    # отдельных индексов нет: created_at ведёт составные индексы моделей,
+    # по updated_at никто не фильтрует и не сортирует
     created_at: Mapped[datetime] = mapped_column(
-        default=datetime.utcnow, nullable=False, index=True
+        default=datetime.utcnow, nullable=False
     )
     updated_at: Mapped[datetime] = mapped_column(
-        default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True
+        default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
 
 
@@ -43,28 +57,131 @@ class IncidentSource(str, enum.Enum):
     UNKNOWN = "unknown"
 
 
+def _enum_values(enum_class: type[enum.Enum]) -> list[str]:
+    """в бд храним значения енама ("open"), а не имена ("OPEN")"""
+
+    return [member.value for member in enum_class]
+
+
+# статусы, по которым идёт основная работа, под них частичные индексы
+ACTIVE_STATUSES = (IncidentStatus.OPEN, IncidentStatus.IN_PROGRESS)
+
+
+# конфигурация полнотекстового поиска по описанию (латиница в ней стеммится как english)
+SEARCH_CONFIG = "russian"
+
+
 class Incident(BaseModel):
     """модель инцидента"""
 
     __tablename__ = "incidents"
+    __table_args__ = (
+        # все выборки списка - ORDER BY created_at DESC, id DESC (+ keyset по ним)
+        Index("ix_incidents_created_at_id", "created_at", "id"),
+        Index("ix_incidents_status_created_at", "status", "created_at", "id"),
+        Index("ix_incidents_source_created_at", "source", "created_at", "id"),
+        # status + source для активных статусов без фильтрации по индексу
+        *(
+            Index(
+                f"ix_incidents_{status.value}_source_created_at",
+                "source",
+                "created_at",
+                "id",
+                postgresql_where=text(f"status = '{status.value}'"),
+            )
+            for status in ACTIVE_STATUSES
+        ),
+        # полнотекстовый поиск, запрос должен строить ровно это выражение
+        Index(
+            "ix_incidents_description_fts",
+            text(f"to_tsvector('{SEARCH_CONFIG}', coalesce(description, ''))"),
+            postgresql_using="gin",
+        ),
+        # поиск подстроки через ILIKE
+        Index(
+            "ix_incidents_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
+    # партиции помесячно по created_at (IncidentPartitionManager),
+    # ключ партиционирования обязан входить в первичный ключ
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        primary_key=True, default=datetime.utcnow
+    )
     description: Mapped[str] = mapped_column(
         Text,
         nullable=True,
-        index=True,
         comment="Описание инцидента"
     )
-    # TODO: Enum(IncidentStatus), использовать Enum, просто лень с БД возиться сейчас)
-    status: Mapped[str] = mapped_column(
-        String(255),
-        default=IncidentStatus.OPEN.value,
+    status: Mapped[IncidentStatus] = mapped_column(
+        Enum(IncidentStatus, name="incident_status", values_callable=_enum_values),
+        default=IncidentStatus.OPEN,
         nullable=False,
-        index=True,
     )
-    # TODO: аналогично Enum(IncidentSource)
-    source: Mapped[str] = mapped_column(
-        String(255),
+    source: Mapped[IncidentSource] = mapped_column(
+        Enum(IncidentSource, name="incident_source", values_callable=_enum_values),
         nullable=False,
-        index=True,
-        default=IncidentSource.UNKNOWN.value,
+        default=IncidentSource.UNKNOWN,
+    )
+
+
+class IncidentId(Base):
+    """id инцидента -> created_at, глобальный по всем партициям
+
+    ведётся триггерами на incidents. выборка по id без created_at иначе
+    проверяет индекс каждой партиции, а так сразу идёт в нужную
+    """
+
+    __tablename__ = "incident_ids"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(nullable=False)
+
+
+# полос счётчика на (status, source), параллельные вставки не ждут одну строку
+COUNTER_STRIPES = 16
+
+
+class IncidentCounter(Base):
+    """счётчик инцидентов в разрезе (status, source)
+
+    поддерживается триггером в бд на insert/update/delete в incidents,
+    используется для count=estimate без полного скана таблицы.
+    каждый бэкенд пишет в свою полосу, значение - сумма по полосам
+    """
+
+    __tablename__ = "incident_counters"
+
+    status: Mapped[str] = mapped_column(String(255), primary_key=True)
+    source: Mapped[str] = mapped_column(String(255), primary_key=True)
+    stripe: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=0)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class IncidentEvent(Base):
+    """outbox событий по инцидентам
+
+    пишется в той же транзакции, что и изменение инцидента,
+    в кафку строки переносит OutboxRelay
+    """
+
+    __tablename__ = "incident_events"
+    __table_args__ = (
+        # более ранние события инцидента при захвате пачки релеем
+        Index("ix_incident_events_incident_id_id", "incident_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    incident_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    event_type: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSONB, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        default=datetime.utcnow, nullable=False
     )
@@ -1,11 +1,20 @@
+import enum
 import uuid
-
-from pydantic import BaseModel, Field, ConfigDict
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List
 from uuid import UUID
 
-from src.domain.models import IncidentStatus, IncidentSource
+from pydantic import BaseModel, ConfigDict, Field
+
+from src.domain.models import IncidentSource, IncidentStatus
+
+
+class CountMode(str, enum.Enum):
+    """режим подсчёта total для списка"""
+
+    EXACT = "exact"  # COUNT(*) с коротким кэшем в redis
+    ESTIMATE = "estimate"  # по таблице счётчиков, без скана incidents
+    NONE = "none"  # total не считается
 
 
 class BaseRequestDTO(BaseModel):
@@ -46,10 +55,43 @@ class IncidentCreate(BaseRequestDTO):
     )
 
 
+class IncidentBatchItemError(BaseResponseDTO):
+    """ошибка валидации элемента пачки"""
+
+    index: int = Field(..., description="Позиция элемента в запросе")
+    errors: List[Dict[str, Any]]
+
+
+class IncidentBatchResponse(BaseResponseDTO):
+    """ответ на пакетное создание инцидентов"""
+
+    ids: List[UUID | None] = Field(
+        ..., description="Id в порядке запроса, None для невалидных элементов"
+    )
+    errors: List[IncidentBatchItemError]
+
+
 class IncidentStatusUpdate(BaseRequestDTO):
     """запрос на обновление статуса инцидента"""
 
     status: IncidentStatus = Field(..., description="Новый статус инцидента")
+    expected_status: IncidentStatus | None = Field(
+        None, description="Обновить, только если текущий статус такой"
+    )
+
+
+class IncidentBulkStatusUpdate(IncidentStatusUpdate):
+    """запрос на обновление статуса пачке инцидентов"""
+
+    ids: List[UUID] = Field(..., min_length=1, max_length=10000)
+
+
+class IncidentBulkStatusResponse(BaseResponseDTO):
+    """ответ на пакетное обновление статуса"""
+
+    updated: List[UUID] = Field(
+        ..., description="Id обновлённых инцидентов (без отсутствующих и не прошедших expected_status)"
+    )
 
 
 class IncidentItemResponse(BaseResponseDTO):
@@ -68,4 +110,66 @@ class IncidentListResponse(BaseResponseDTO):
 
     # TODO:: в список обычно более короткую версию удобно передавать, нежели подробную
     incidents: List[IncidentItemResponse]
-    total: int
+    total: int | None = Field(
+        None, description="Всего записей по фильтру, None при count=none"
+    )
+    next_cursor: str | None = Field(
+        None, description="Курсор следующей страницы, None если страница последняя"
+    )
+
+
+class OutboxStatsResponse(BaseResponseDTO):
+    """состояние outbox событий"""
+
+    pending: int = Field(..., description="Событий ждёт отправки в кафку")
+    lag_seconds: float = Field(
+        ..., description="Возраст самого старого неотправленного события"
+    )
+    relay_published_total: int = Field(
+        ..., description="Опубликовано релеем этого воркера"
+    )
+    relay_throughput: float = Field(
+        ..., description="Событий в секунду у релея этого воркера"
+    )
+
+
+class CacheStatsResponse(BaseResponseDTO):
+    """счётчики кэша этого воркера по уровням"""
+
+    redis: Dict[str, int]
+    local: Dict[str, int] | None = None
+
+
+class DbPoolStatsResponse(BaseResponseDTO):
+    """состояние пула соединений этого воркера"""
+
+    size: int
+    checked_out: int
+    overflow: int
+    checked_in: int
+    wait_timeouts: int
+    wait_count: int
+    wait_sum_seconds: float
+    wait_buckets: Dict[str, int] = Field(
+        ..., description="Кумулятивная гистограмма ожидания соединения, ключ - граница в сек"
+    )
+
+
+class SlowQueryResponse(BaseResponseDTO):
+    """медленный SQL запрос"""
+
+    recorded_at: datetime
+    duration_ms: float
+    statement: str
+    parameters: str
+    plan: str | None = Field(
+        None, description="EXPLAIN (ANALYZE для SELECT), None пока не снят или не снимался"
+    )
+
+
+class SlowQueriesResponse(BaseResponseDTO):
+    """журнал медленных запросов этого воркера"""
+
+    threshold_ms: float
+    total: int = Field(..., description="Всего медленных запросов с запуска воркера")
+    queries: List[SlowQueryResponse] = Field(..., description="Последние, от новых к старым")
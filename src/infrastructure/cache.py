@@ -1,81 +1,578 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import orjson
 import redis.asyncio as redis
-import json
-from datetime import datetime, date
-from typing import Optional, Any
-from uuid import UUID
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
 from src.core.config import settings
+from src.infrastructure import metrics, profiling
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# канал, через который воркеры сообщают друг другу об удалённых ключах
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# ошибки, которые говорят о недоступности redis, а не о неверной команде
+_BREAKER_ERRORS = (RedisConnectionError, RedisTimeoutError, OSError, asyncio.TimeoutError)
+
+
+def _pool_exhausted(error: Exception) -> bool:
+    """BlockingConnectionPool не дождался свободного соединения за redis_pool_timeout
+
+    это перегрузка воркера, а не недоступность redis, breaker её не считает
+    """
+
+    return isinstance(error, RedisConnectionError) and isinstance(
+        error.__cause__, asyncio.TimeoutError
+    )
+
+
+class LocalCache:
+    """in-process LRU кэш с ограничением по размеру и TTL"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
 
+    def get(self, key: str) -> Any:
+        """значение или _MISSING"""
 
-class CacheJSONEncoder(json.JSONEncoder):
-    """кастомный JSON encoder для UUID и datetime"""
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return _MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
 
-    def default(self, obj: Any) -> Any:
-        if isinstance(obj, UUID):
-            return str(obj)
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        return super().default(obj)
+    def set(self, key: str, value: Any, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+# удалить лок, только если он всё ещё наш
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _LeaderCancelledError(Exception):
+    """ведущий вызов SingleFlight отменён, ждущие грузят сами"""
+
+
+class SingleFlight:
+    """склейка одновременных вызовов с одинаковым ключом в один внутри процесса"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        while future is not None:
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelledError:
+                # клиент ведущего отключился, первый из ждущих становится ведущим
+                future = self._calls.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # отмена ведущего не должна отменять чужие запросы
+            future.set_exception(_LeaderCancelledError())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # если ждущих не было, не сыпем "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
+
+
+class CircuitBreaker:
+    """размыкается после failure_threshold ошибок подряд
+
+    пока разомкнут, redis не трогаем совсем, замыкает его фоновая проверка
+    """
+
+    def __init__(self, failure_threshold: int):
+        self.failure_threshold = failure_threshold
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.opened_at is None
+
+    def success(self):
+        self.failures = 0
+
+    def failure(self) -> bool:
+        """учесть ошибку, True если breaker только что разомкнулся"""
+
+        self.failures += 1
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            self.open()
+            return True
+        return False
+
+    def open(self):
+        self.opened_at = time.monotonic()
+        self.trips += 1
+
+    def close(self):
+        self.opened_at = None
+        self.failures = 0
 
 
 class CacheClient:
+    """кэш в redis с опциональным локальным L1 перед ним
+
+    L1 инвалидируется между воркерами через redis pub/sub, TTL L1 держим
+    коротким, чтобы потерянное сообщение давало лишь кратковременную устаревшую запись
+
+    у операций короткий таймаут сокета, после нескольких ошибок подряд
+    breaker размыкается и запросы идут сразу в бд, не дожидаясь таймаутов.
+    удаления и инкременты поколений, пропущенные за это время, копятся и
+    применяются перед тем, как breaker снова замкнётся
+    """
+
     def __init__(self):
         self.client: Optional[redis.Redis] = None
+        self.local: Optional[LocalCache] = (
+            LocalCache(settings.cache_local_max_size, settings.cache_local_ttl)
+            if settings.cache_local_enabled
+            else None
+        )
+        self.breaker = CircuitBreaker(settings.redis_breaker_failures)
+        self._listener: Optional[asyncio.Task] = None
+        self._prober: Optional[asyncio.Task] = None
+        self._pending_deletes: Set[str] = set()
+        self._pending_incrs: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.skipped = 0
 
     async def initialize(self):
-        """подключение к redis"""
+        """подключение к redis, при неудаче - фоновые попытки до успеха"""
 
+        pool = redis.BlockingConnectionPool.from_url(
+            settings.redis_url,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout,
+            socket_timeout=settings.redis_socket_timeout,
+            socket_connect_timeout=settings.redis_connect_timeout,
+        )
+        self.client = redis.Redis(connection_pool=pool)
         try:
-            self.client = await redis.from_url(settings.redis_url)
             await self.client.ping()
-            print(f"Cache connected to Redis: {settings.redis_url}")
+            logger.info("Cache connected to Redis: %s", settings.redis_url)
         except Exception as e:
-            print(f"Cache connection failed: {e}")
-            self.client = None
+            logger.warning("Cache connection failed: %s", e)
+            self._trip()
+
+        if self.local is not None:
+            self._listener = asyncio.create_task(self._listen_invalidations())
 
     async def close(self):
         """закрытие соединения с redis"""
 
+        for task in (self._listener, self._prober):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._listener = None
+        self._prober = None
         if self.client:
-            await self.client.close()
+            # пул передан явно, сам клиент его не закрывает
+            await self.client.close(close_connection_pool=True)
+
+    @property
+    def active_client(self) -> Optional[redis.Redis]:
+        """клиент, если redis подключён и breaker замкнут, иначе None"""
+
+        return self.client if self.breaker.opened_at is None else None
+
+    def report_success(self):
+        self.breaker.success()
+
+    def report_error(self, error: Exception):
+        """ошибка операции с redis, сетевые ошибки и таймауты размыкают breaker"""
+
+        self.errors += 1
+        if _pool_exhausted(error) or not isinstance(error, _BREAKER_ERRORS):
+            return
+        if self.breaker.failure():
+            logger.error("Redis circuit opened after %s failures: %s", self.breaker.failures, error)
+            self._start_probe()
+
+    def _trip(self):
+        self.breaker.open()
+        self._start_probe()
+
+    def _start_probe(self):
+        metrics.CACHE_CIRCUIT_OPEN.set(1)
+        if self._prober is None or self._prober.done():
+            self._prober = asyncio.create_task(self._probe())
+
+    async def _probe(self):
+        """проверять redis, пока не ответит, затем догнать пропущенное и замкнуть breaker"""
+
+        while True:
+            await asyncio.sleep(settings.redis_probe_interval)
+            try:
+                await self.client.ping()
+                # за время replay breaker ещё разомкнут и копит новые удаления,
+                # между последней проверкой и close() нет await
+                while self._pending_deletes or self._pending_incrs:
+                    await self._replay_pending()
+            except Exception as e:
+                logger.debug("Redis probe failed: %s", e)
+                continue
+            break
+
+        self.breaker.close()
+        metrics.CACHE_CIRCUIT_OPEN.set(0)
+        # пока redis был недоступен, L1 не получал инвалидаций
+        if self.local is not None:
+            self.local.clear()
+        logger.info("Redis is available again, circuit closed")
+
+    def _remember_deletes(self, keys: List[str]):
+        if len(self._pending_deletes) + len(keys) > settings.redis_pending_invalidations_max:
+            logger.error(
+                "Too many cache deletes pending while Redis is unavailable, "
+                "stale entries will live until TTL"
+            )
+            return
+        self._pending_deletes.update(keys)
+
+    async def _replay_pending(self):
+        """удаления и инкременты, пропущенные при разомкнутом breaker"""
+
+        deletes, incrs = list(self._pending_deletes), list(self._pending_incrs)
+        if not deletes and not incrs:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            if deletes:
+                pipe.delete(*deletes)
+                if self.local is not None:
+                    for key in deletes:
+                        pipe.publish(INVALIDATION_CHANNEL, key)
+            for key in incrs:
+                pipe.incr(key)
+            await pipe.execute()
+        self._pending_deletes.difference_update(deletes)
+        self._pending_incrs.difference_update(incrs)
+        logger.info("Replayed %s cache deletes and %s generation bumps", len(deletes), len(incrs))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """счётчики попаданий по уровням кэша"""
+
+        stats = {
+            "redis": {
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "skipped": self.skipped,
+                "circuit_open": int(not self.breaker.closed),
+                "circuit_trips": self.breaker.trips,
+                "pending_deletes": len(self._pending_deletes),
+            }
+        }
+        if self.local is not None:
+            stats["local"] = {
+                "hits": self.local.hits,
+                "misses": self.local.misses,
+                "size": len(self.local),
+            }
+        return stats
+
+    def health(self) -> str:
+        """connected, degraded (breaker разомкнут) или disabled"""
+
+        if self.client is None:
+            return "disabled"
+        return "connected" if self.breaker.closed else "degraded"
+
+    def _skip(self, key: str, operation: str):
+        self.skipped += 1
+        metrics.observe_cache(key, operation, "skipped")
 
     async def get(self, key: str) -> Optional[Any]:
         """получить значение из кеша"""
 
-        if not self.client:
+        value = await self.get_raw(key)
+        return orjson.loads(value) if value else None
+
+    async def get_raw(self, key: str) -> Optional[bytes]:
+        """получить сериализованное значение как есть, без разбора json"""
+
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not _MISSING:
+                metrics.observe_cache(key, "get", "local_hit")
+                return value
+
+        client = self.active_client
+        if client is None:
+            if self.client is not None:
+                self._skip(key, "get")
             return None
         try:
-            value = await self.client.get(key)
-            return json.loads(value) if value else None
+            with profiling.phase("cache"):
+                value = await client.get(key)
         except Exception as e:
-            print(f"Cache get error: {e}")
+            self.report_error(e)
+            metrics.observe_cache(key, "get", "error")
+            logger.warning("Cache get error: %s", e)
+            return None
+        self.breaker.success()
+
+        if not value:
+            self.misses += 1
+            metrics.observe_cache(key, "get", "miss")
             return None
 
+        self.hits += 1
+        metrics.observe_cache(key, "get", "hit")
+        if self.local is not None:
+            self.local.set(key, value)
+        return value
+
     async def set(self, key: str, value: Any, ttl: int = 300):
-        """сохранить значение в кеш"""
+        """сохранить значение в кеш, UUID и datetime orjson сериализует сам"""
+
+        return await self.set_raw(key, orjson.dumps(value), ttl)
 
-        if not self.client:
-            print(f"Cache client not initialized")
+    async def set_raw(self, key: str, value: bytes, ttl: int = 300):
+        """сохранить уже сериализованное значение"""
+
+        client = self.active_client
+        if client is None:
+            if self.client is None:
+                logger.debug("Cache client not initialized")
+            else:
+                self._skip(key, "set")
             return False
         try:
-            await self.client.setex(
-                key, ttl, json.dumps(value, cls=CacheJSONEncoder)
-            )
-            return True
+            with profiling.phase("cache"):
+                await client.setex(key, ttl, value)
         except Exception as e:
-            print(f"Cache set error: {e}")
+            self.report_error(e)
+            metrics.observe_cache(key, "set", "error")
+            logger.warning("Cache set error: %s", e)
             return False
+        self.breaker.success()
+        metrics.observe_cache(key, "set", "ok")
+
+        if self.local is not None:
+            self.local.set(key, value, ttl)
+        return True
 
     async def delete(self, key: str):
-        """удалить ключ из кеша"""
+        """удалить ключ из кеша, L1 других воркеров чистится через pub/sub"""
+
+        return await self.delete_many([key])
 
-        if not self.client:
+    async def delete_many(self, keys: List[str]):
+        """удалить ключи одним пайплайном
+
+        если redis недоступен, ключи удалятся при восстановлении
+        """
+
+        if self.local is not None:
+            for key in keys:
+                self.local.delete(key)
+
+        if not self.client or not keys:
+            return False
+        client = self.active_client
+        if client is None:
+            self._skip(keys[0], "delete")
+            self._remember_deletes(keys)
             return False
         try:
-            await self.client.delete(key)
-            return True
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.delete(*keys)
+                if self.local is not None:
+                    for key in keys:
+                        pipe.publish(INVALIDATION_CHANNEL, key)
+                with profiling.phase("cache"):
+                    await pipe.execute()
         except Exception as e:
-            print(f"Cache delete error: {e}")
+            self.report_error(e)
+            metrics.observe_cache(keys[0], "delete", "error")
+            logger.warning("Cache delete error: %s", e)
+            self._remember_deletes(keys)
             return False
+        self.breaker.success()
+        metrics.observe_cache(keys[0], "delete", "ok")
+        return True
+
+    async def get_counters(self, keys: List[str]) -> Optional[List[int]]:
+        """значения счётчиков одним MGET, мимо L1; None если redis недоступен"""
+
+        client = self.active_client
+        if client is None:
+            if self.client is not None and keys:
+                self._skip(keys[0], "mget")
+            return None
+        if not keys:
+            return []
+        try:
+            with profiling.phase("cache"):
+                values = await client.mget(keys)
+        except Exception as e:
+            self.report_error(e)
+            metrics.observe_cache(keys[0], "mget", "error")
+            logger.warning("Cache mget error: %s", e)
+            return None
+        self.breaker.success()
+        metrics.observe_cache(keys[0], "mget", "ok")
+        return [int(value) if value else 0 for value in values]
+
+    async def incr_many(self, keys: List[str]):
+        """увеличить счётчики одним пайплайном
+
+        если redis недоступен, счётчики увеличатся при восстановлении
+        """
+
+        if not self.client or not keys:
+            return
+        client = self.active_client
+        if client is None:
+            self._skip(keys[0], "incr")
+            self._pending_incrs.update(keys)
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.incr(key)
+                with profiling.phase("cache"):
+                    await pipe.execute()
+        except Exception as e:
+            self.report_error(e)
+            metrics.observe_cache(keys[0], "incr", "error")
+            logger.warning("Cache incr error: %s", e)
+            self._pending_incrs.update(keys)
+            return
+        self.breaker.success()
+
+    async def acquire_lock(self, key: str) -> Optional[str]:
+        """короткий лок между воркерами, токен если взяли, None если занят
+
+        без redis лок считается взятым, чтобы не блокировать чтение
+        """
+
+        token = uuid.uuid4().hex
+        client = self.active_client
+        if client is None:
+            return token
+        try:
+            acquired = await client.set(
+                f"lock:{key}", token, nx=True, px=settings.cache_lock_ttl_ms
+            )
+        except Exception as e:
+            self.report_error(e)
+            logger.warning("Cache lock error: %s", e)
+            return token
+        self.breaker.success()
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str):
+        client = self.active_client
+        if client is None:
+            return
+        try:
+            await client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except Exception as e:
+            self.report_error(e)
+            logger.warning("Cache unlock error: %s", e)
+
+    async def wait_for(self, key: str) -> Optional[bytes]:
+        """подождать, пока держатель лока положит значение в кэш"""
+
+        deadline = time.monotonic() + settings.cache_lock_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.cache_lock_poll_interval)
+            if self.active_client is None:
+                return None
+            value = await self.get_raw(key)
+            if value is not None:
+                return value
+        return None
+
+    async def _listen_invalidations(self):
+        """слушать удаления ключей из других воркеров и чистить L1
+
+        подписка держит одно соединение пула. ждём сообщений с явным
+        таймаутом: блокирующее чтение упёрлось бы в таймаут сокета
+        """
+
+        while True:
+            if not self.breaker.closed:
+                await asyncio.sleep(settings.redis_probe_interval)
+                continue
+
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                while self.breaker.closed:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                    if message is not None and message["type"] == "message":
+                        self.local.delete(message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache invalidation listener error: %s", e)
+            finally:
+                await pubsub.close()
+
+            # пока не были подписаны, могли пропустить инвалидации
+            self.local.clear()
+            await asyncio.sleep(1)
 
 
 cache_client = CacheClient()
@@ -1,48 +1,66 @@
 import logging
-from typing import Callable
 
-from fastapi import HTTPException, Request, status
+from fastapi import HTTPException, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from pydantic import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 logger = logging.getLogger(__name__)
 
 
-class ErrorHandlingMiddleware(BaseHTTPMiddleware):
-    """Middleware для глобальной обработки исключений."""
+class ErrorHandlingMiddleware:
+    """Middleware для глобальной обработки исключений.
+
+    чистый ASGI: без отдельной задачи и обёртки ответа, как у BaseHTTPMiddleware
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
 
-    async def dispatch(self, request: Request, call_next: Callable):
         try:
-            response = await call_next(request)
-            return response
-        except HTTPException as exc:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            # заголовки уже ушли клиенту - подменить ответ нельзя
+            if response_started:
+                raise
+            response = self._error_response(exc)
+            await response(scope, receive, send)
+
+    @staticmethod
+    def _error_response(exc: Exception) -> JSONResponse:
+        if isinstance(exc, HTTPException):
             return JSONResponse(
                 status_code=exc.status_code,
                 content={"detail": exc.detail}
             )
-        except RequestValidationError as exc:
-            return JSONResponse(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                content={"detail": exc.errors()}
-            )
-        except ValidationError as exc:
+        if isinstance(exc, (RequestValidationError, ValidationError)):
             return JSONResponse(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 content={"detail": exc.errors()}
             )
-        except SQLAlchemyError as exc:
-            logger.error(f"Database error: {exc}", exc_info=True)
+        if isinstance(exc, SQLAlchemyError):
+            logger.error("Database error: %s", exc, exc_info=True)
             return JSONResponse(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 content={"detail": "Database error occurred"}
             )
-        except Exception as exc:
-            logger.error(f"Unexpected error: {exc}", exc_info=True)
-            return JSONResponse(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                content={"detail": "Internal server error"}
-            )
-
+        logger.error("Unexpected error: %s", exc, exc_info=True)
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"detail": "Internal server error"}
+        )
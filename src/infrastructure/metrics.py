@@ -0,0 +1,183 @@
+"""метрики в формате prometheus
+
+при нескольких воркерах uvicorn задайте PROMETHEUS_MULTIPROC_DIR (пустой
+каталог, до старта процессов): значения пишутся в mmap-файлы, и /metrics
+любого воркера собирает их со всех.
+
+запись - инкремент числа в памяти без аллокаций, дочерние метрики по
+меткам кэшируются, поэтому сбор можно держать включённым в проде
+"""
+
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP запросы", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки HTTP запроса",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Запросы в обработке", multiprocess_mode="livesum"
+)
+
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Время одного SQL запроса", buckets=LATENCY_BUCKETS
+)
+DB_REQUEST_QUERIES = Histogram(
+    "db_queries_per_request",
+    "Число SQL запросов на HTTP запрос",
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+DB_REQUEST_TIME = Histogram(
+    "db_time_per_request_seconds",
+    "Суммарное время SQL запросов на HTTP запрос",
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Ожидание соединения из пула", buckets=LATENCY_BUCKETS
+)
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Таймауты ожидания пула")
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Соединения, выданные из пула", multiprocess_mode="livesum"
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Операции с кэшем по семействам ключей",
+    ["family", "operation", "result"],
+)
+CACHE_CIRCUIT_OPEN = Gauge(
+    "cache_circuit_open",
+    "Воркеры с разомкнутым breaker redis (запросы идут мимо кэша)",
+    multiprocess_mode="livesum",
+)
+
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Отклонённые запросы")
+RATE_LIMIT_REDIS_ERRORS = Counter(
+    "rate_limit_redis_errors_total", "Ошибки redis в лимитере (счёт ушёл в локальный)"
+)
+
+KAFKA_PUBLISH_LATENCY = Histogram(
+    "kafka_publish_duration_seconds",
+    "Отправка пачки в брокер до подтверждения",
+    ["path"],
+    buckets=LATENCY_BUCKETS,
+)
+KAFKA_QUEUE_DEPTH = Gauge(
+    "kafka_producer_queue_depth", "Сообщений в очереди продюсера", multiprocess_mode="livesum"
+)
+KAFKA_DROPPED = Counter("kafka_dropped_total", "Отброшенные события")
+
+OUTBOX_PUBLISHED = Counter("outbox_published_total", "События, перенесённые из outbox")
+OUTBOX_ERRORS = Counter("outbox_errors_total", "Ошибки релея outbox")
+OUTBOX_LAG = Gauge(
+    "outbox_lag_seconds", "Возраст последнего перенесённого события", multiprocess_mode="livemax"
+)
+
+
+class _Children:
+    """кэш дочерних метрик по значениям меток, labels() не зовётся на каждый замер"""
+
+    def __init__(self, metric):
+        self._metric = metric
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def get(self, *labels: str):
+        child = self._children.get(labels)
+        if child is None:
+            child = self._children[labels] = self._metric.labels(*labels)
+        return child
+
+
+_http_requests = _Children(HTTP_REQUESTS)
+_http_latency = _Children(HTTP_LATENCY)
+_cache_requests = _Children(CACHE_REQUESTS)
+_kafka_publish = _Children(KAFKA_PUBLISH_LATENCY)
+
+# [число запросов, суммарное время] текущего HTTP запроса
+_request_db: ContextVar[Optional[List[float]]] = ContextVar("request_db", default=None)
+
+
+def key_family(key: str) -> str:
+    """семейство ключа кэша: incident:<id> -> incident, incidents:list:... -> incidents:list"""
+
+    head, _, rest = key.partition(":")
+    second, separator, _ = rest.partition(":")
+    return f"{head}:{second}" if separator else head
+
+
+def observe_cache(key: str, operation: str, result: str):
+    _cache_requests.get(key_family(key), operation, result).inc()
+
+
+def observe_kafka_publish(path: str, seconds: float):
+    _kafka_publish.get(path).observe(seconds)
+
+
+def observe_query(seconds: float):
+    DB_QUERY_LATENCY.observe(seconds)
+    stats = _request_db.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+
+
+def start_request():
+    """начать учёт SQL запросов для текущего HTTP запроса, вернуть токен"""
+
+    HTTP_IN_FLIGHT.inc()
+    return _request_db.set([0, 0.0]), time.perf_counter()
+
+
+def finish_request(handle, method: str, route: str, status_code: int):
+    token, started = handle
+    elapsed = time.perf_counter() - started
+    HTTP_IN_FLIGHT.dec()
+    queries, db_time = _request_db.get()
+    _request_db.reset(token)
+
+    _http_requests.get(method, route, str(status_code)).inc()
+    _http_latency.get(method, route).observe(elapsed)
+    DB_REQUEST_QUERIES.observe(queries)
+    DB_REQUEST_TIME.observe(db_time)
+
+
+def render() -> tuple[bytes, str]:
+    """текст для /metrics и его content-type"""
+
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """убрать live-гейджи завершающегося воркера из общих файлов"""
+
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
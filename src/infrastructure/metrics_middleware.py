@@ -0,0 +1,40 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.infrastructure import metrics
+
+
+class MetricsMiddleware:
+    """время, статус и SQL запросы на каждый HTTP запрос
+
+    метка route - шаблон пути роута (/incidents/{incident_id}), а не сам путь,
+    чтобы число рядов не росло с числом id
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        handle = metrics.start_request()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # роут кладёт себя в scope при матчинге
+            route = scope.get("route")
+            metrics.finish_request(
+                handle,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status_code,
+            )
@@ -0,0 +1,176 @@
+"""профилирование отдельных запросов по фазам и журнал медленных SQL
+
+фазы (db, cache, serialize, app, middleware) копятся только у запросов,
+которые выбрал ProfilingMiddleware, у остальных phase() - общий пустой
+контекст-менеджер и add() - одна проверка ContextVar
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_NULL_PHASE = nullcontext()
+
+# SELECT без EXPLAIN ANALYZE: блокирует строки или берёт advisory-лок
+_LOCKING = re.compile(r"\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b|ADVISORY")
+
+# фаза -> секунды для текущего профилируемого запроса
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("profile_phases", default=None)
+
+
+def start() -> Any:
+    """включить сбор фаз для текущего запроса, вернуть токен для finish"""
+
+    return _phases.set({})
+
+
+def finish(token) -> Dict[str, float]:
+    phases = _phases.get()
+    _phases.reset(token)
+    return phases or {}
+
+
+def active() -> bool:
+    return _phases.get() is not None
+
+
+def add(name: str, seconds: float):
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+@contextmanager
+def _timed(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - started)
+
+
+def phase(name: str):
+    """замерить блок как фазу, если запрос профилируется"""
+
+    return _timed(name) if _phases.get() is not None else _NULL_PHASE
+
+
+class SlowQueryLog:
+    """последние медленные SQL запросы с планами, ограниченное кольцо в памяти
+
+    план снимается отдельной фоновой задачей на другом соединении того же
+    движка уже после запроса. по умолчанию это EXPLAIN без выполнения.
+    EXPLAIN ANALYZE выполняет запрос второй раз, поэтому включается явно и
+    только для SELECT без блокировок, в read-only транзакции с откатом.
+    одновременно снимается не больше одного плана, остальные медленные
+    запросы пишутся без него
+    """
+
+    def __init__(self, size: int):
+        self.entries: deque = deque(maxlen=size)
+        self._explaining: Optional[asyncio.Task] = None
+        self.total = 0
+
+    def record(
+        self,
+        engine: AsyncEngine,
+        statement: str,
+        parameters: Any,
+        seconds: float,
+        executemany: bool,
+    ):
+        self.total += 1
+        entry = {
+            "recorded_at": datetime.utcnow(),
+            "duration_ms": round(seconds * 1000, 2),
+            "statement": statement,
+            "parameters": repr(parameters)[:500],
+            "plan": None,
+        }
+        self.entries.append(entry)
+        logger.warning("Slow query %s ms: %s", entry['duration_ms'], statement[:200])
+
+        if not settings.slow_query_explain or executemany or self._explaining:
+            return
+        if statement.lstrip()[:7].upper() == "EXPLAIN":
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._explaining = loop.create_task(self._explain(engine, entry, parameters))
+
+    async def _explain(self, engine: AsyncEngine, entry: Dict[str, Any], parameters: Any):
+        statement = entry["statement"]
+        try:
+            async with engine.connect() as connection:
+                plan = None
+                if settings.slow_query_explain_analyze and _analyzable(statement):
+                    plan = await self._run_explain(
+                        connection, statement, parameters, analyze=True
+                    )
+                if plan is None:
+                    plan = await self._run_explain(connection, statement, parameters)
+                entry["plan"] = plan
+        except Exception as e:
+            entry["plan"] = f"explain failed: {e}"
+        finally:
+            self._explaining = None
+
+    @staticmethod
+    async def _run_explain(
+        connection: AsyncConnection,
+        statement: str,
+        parameters: Any,
+        analyze: bool = False,
+    ) -> Optional[str]:
+        """план запроса, для ANALYZE None если read-only транзакция его не пустила"""
+
+        try:
+            if analyze:
+                # первая команда транзакции: запись и nextval() упадут
+                await connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+            result = await connection.exec_driver_sql(
+                f"EXPLAIN {'(ANALYZE, BUFFERS) ' if analyze else ''}{statement}",
+                tuple(parameters or ()),
+            )
+            return "\n".join(row[0] for row in result)
+        except DBAPIError:
+            if not analyze:
+                raise
+            logger.debug("Slow query is not read-only, falling back to EXPLAIN")
+            return None
+        finally:
+            await connection.rollback()
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """от новых к старым"""
+
+        return list(reversed(self.entries))
+
+
+def _analyzable(statement: str) -> bool:
+    """чистый SELECT без блокировок строк и advisory-локов
+
+    у WITH может быть изменяющий CTE, SELECT ... FOR UPDATE держал бы строки,
+    а сессионный advisory-лок пережил бы откат и остался на соединении пула
+    """
+
+    text = statement.lstrip().upper()
+    return text[:6] == "SELECT" and not _LOCKING.search(text)
+
+
+slow_query_log = SlowQueryLog(settings.slow_query_log_size)
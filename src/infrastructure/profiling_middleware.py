@@ -0,0 +1,91 @@
+import hmac
+import random
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.config import settings
+from src.infrastructure import profiling
+
+
+class ProfilingMiddleware:
+    """фазы запроса в заголовке Server-Timing для выбранных запросов
+
+    профилируется доля profiling_sample_rate запросов и запросы с заголовком
+    profiling_header и верным X-Access-Key. фаза app - от входа в
+    ProfilingAppTimer (под всеми middleware) до начала ответа, middleware -
+    остальное время до начала ответа
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.sample_rate = settings.profiling_sample_rate
+        self.header = settings.profiling_header.lower().encode()
+        self.access_key = settings.x_access_key.encode()
+
+    def _wanted(self, scope: Scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        requested = False
+        access_key = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                requested = True
+            elif name == b"x-access-key":
+                access_key = value
+        return (
+            requested
+            and access_key is not None
+            and hmac.compare_digest(access_key, self.access_key)
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        token = profiling.start()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                phases = profiling.finish(token)
+                total = time.perf_counter() - started
+                phases["middleware"] = max(0.0, total - phases.get("app", total))
+                phases["total"] = total
+                value = ", ".join(
+                    f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases.items()
+                )
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", value.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # ответ так и не начался (исключение) - просто сбрасываем сбор
+            if profiling.active():
+                profiling.finish(token)
+
+
+class ProfilingAppTimer:
+    """отметка входа в приложение под всеми middleware, ставится самым внутренним"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not profiling.active():
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+
+        async def send_with_mark(message: Message):
+            if message["type"] == "http.response.start":
+                profiling.add("app", time.perf_counter() - started)
+            await send(message)
+
+        await self.app(scope, receive, send_with_mark)
@@ -0,0 +1,108 @@
+import time
+from typing import Dict, Optional
+
+from src.infrastructure import metrics
+from src.infrastructure.cache import cache_client
+
+# GCRA: на клиента хранится одно число - theoretical arrival time (TAT) в мс.
+# возвращает 0 если запрос пропущен, иначе через сколько мс можно повторить
+_GCRA_SCRIPT = """
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local now = redis.call('TIME')
+now = now[1] * 1000 + now[2] / 1000
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+-- сравниваем опережение TAT, а не (tat + emission) - tolerance с now:
+-- у простаивающего клиента tat == now и 0 > 0 не даёт ложного отказа от округления
+local ahead = tat - now
+if ahead > tolerance - emission then
+    return math.ceil(ahead + emission - tolerance)
+end
+local new_tat = tat + emission
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now))
+return 0
+"""
+
+
+class RateLimiter:
+    """GCRA лимитер: общий для всех воркеров в redis, локальный если redis недоступен
+
+    лимит N запросов в минуту = один запрос раз в 60/N сек с допуском
+    пачки до N запросов. память - одно число на клиента, простаивающие
+    клиенты истекают по TTL в redis и вычищаются из локального словаря
+    """
+
+    def __init__(self, prefix: str = "ratelimit", sweep_interval: float = 60.0):
+        self.prefix = prefix
+        self.sweep_interval = sweep_interval
+        self._script = None
+        self._script_client = None
+        self._local: Dict[str, float] = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.rejected = 0
+        self.redis_errors = 0
+
+    async def hit(self, key: str, per_minute: int) -> float:
+        """учесть запрос, вернуть 0 если пропущен, иначе сколько секунд ждать"""
+
+        emission = 60.0 / per_minute
+        tolerance = emission * per_minute
+
+        retry_after = await self._hit_redis(key, emission, tolerance)
+        if retry_after is None:
+            retry_after = self._hit_local(key, emission, tolerance)
+
+        if retry_after:
+            self.rejected += 1
+            metrics.RATE_LIMIT_REJECTIONS.inc()
+        return retry_after
+
+    async def _hit_redis(
+        self,
+        key: str,
+        emission: float,
+        tolerance: float
+    ) -> Optional[float]:
+        # при разомкнутом breaker сразу локальный счёт, без ожидания таймаута
+        client = cache_client.active_client
+        if client is None:
+            return None
+        if self._script_client is not client:
+            self._script = client.register_script(_GCRA_SCRIPT)
+            self._script_client = client
+        try:
+            retry_after_ms = await self._script(
+                keys=[f"{self.prefix}:{key}"],
+                args=[emission * 1000, tolerance * 1000],
+            )
+        except Exception as e:
+            self.redis_errors += 1
+            metrics.RATE_LIMIT_REDIS_ERRORS.inc()
+            cache_client.report_error(e)
+            return None
+        cache_client.report_success()
+        return retry_after_ms / 1000
+
+    def _hit_local(self, key: str, emission: float, tolerance: float) -> float:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        tat = max(self._local.get(key, now), now)
+        ahead = tat - now
+        if ahead > tolerance - emission:
+            return ahead + emission - tolerance
+        self._local[key] = tat + emission
+        return 0.0
+
+    def _sweep(self, now: float):
+        """выкинуть клиентов, у которых TAT уже в прошлом - они в исходном состоянии"""
+
+        self._local = {key: tat for key, tat in self._local.items() if tat > now}
+        self._next_sweep = now + self.sweep_interval
+
+
+rate_limiter = RateLimiter()
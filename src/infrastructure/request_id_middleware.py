@@ -0,0 +1,42 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.log_config import correlation_id, new_correlation_id
+
+REQUEST_ID_HEADER = b"x-request-id"
+# чужой id длиннее не принимаем, чтобы не раздувать логи
+MAX_REQUEST_ID_LENGTH = 128
+
+
+class RequestIdMiddleware:
+    """id запроса из X-Request-ID (или новый) в логах и в ответе"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                if 0 < len(value) <= MAX_REQUEST_ID_LENGTH and value.isascii():
+                    request_id = value.decode()
+                break
+        if request_id is None:
+            request_id = new_correlation_id()
+
+        async def send_with_id(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (REQUEST_ID_HEADER, request_id.encode()),
+                ]
+            await send(message)
+
+        token = correlation_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            correlation_id.reset(token)
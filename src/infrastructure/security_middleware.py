@@ -1,52 +1,103 @@
-import time
-from collections import defaultdict, deque
-from typing import Deque, Dict
+import hashlib
+import hmac
+import math
 
-from fastapi import HTTPException, Request, status
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from src.core.config import settings
+from src.infrastructure.rate_limiter import RateLimiter, rate_limiter
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware."""
 
-    def __init__(self, app, requests_per_minute: int = 60):
-        super().__init__(app)
+class RateLimitMiddleware:
+    """Rate limiting middleware.
+
+    клиент с верным X-Access-Key получает свой лимит, остальные (в том
+    числе с неверным ключом) считаются по IP - иначе новый ключ на каждый
+    запрос давал бы новый счётчик
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        requests_per_minute: int = 60,
+        key_requests_per_minute: int | None = None,
+        limiter: RateLimiter = rate_limiter,
+    ):
+        self.app = app
         self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, Deque[float]] = defaultdict(deque)
-
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        now = time.time()
-
-        # Чистим запросы старше минуты
-        minute_ago = now - 60
-        while self.requests[client_ip] and self.requests[client_ip][0] < minute_ago:
-            self.requests[client_ip].popleft()
-
-        # Проверяем лимит
-        if len(self.requests[client_ip]) >= self.requests_per_minute:
-            raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Rate limit exceeded"
+        self.key_requests_per_minute = key_requests_per_minute or requests_per_minute
+        self.limiter = limiter
+        self.access_key = settings.x_access_key.encode()
+        # сам ключ в redis не кладём
+        self.access_key_bucket = (
+            f"key:{hashlib.sha256(self.access_key).hexdigest()[:16]}"
+        )
+
+    def _client_key(self, scope: Scope) -> tuple[str, int]:
+        for name, value in scope["headers"]:
+            if name == b"x-access-key":
+                if hmac.compare_digest(value, self.access_key):
+                    return self.access_key_bucket, self.key_requests_per_minute
+                break
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        return f"ip:{client_ip}", self.requests_per_minute
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        key, limit = self._client_key(scope)
+        retry_after = await self.limiter.hit(key, limit)
+
+        if retry_after:
+            response = JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "Rate limit exceeded"},
+                headers={"Retry-After": str(math.ceil(retry_after))},
             )
+            await response(scope, receive, send)
+            return
 
-        # Добавляем текущий запрос
-        self.requests[client_ip].append(now)
+        await self.app(scope, receive, send)
 
-        response = await call_next(request)
-        return response
 
+# кодируем один раз при импорте, а не на каждый ответ
+SECURITY_HEADERS = [
+    (name.lower().encode("latin-1"), value.encode("latin-1"))
+    for name, value in (
+        ("X-Content-Type-Options", "nosniff"),
+        ("X-Frame-Options", "DENY"),
+        ("X-XSS-Protection", "1; mode=block"),
+        ("Strict-Transport-Security", "max-age=31536000; includeSubDomains"),
+        ("Referrer-Policy", "strict-origin-when-cross-origin"),
+    )
+]
+_SECURITY_HEADER_NAMES = {name for name, _ in SECURITY_HEADERS}
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+
+class SecurityHeadersMiddleware:
     """Добавляет заголовки безопасности."""
 
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                # наши значения перекрывают выставленные приложением
+                message["headers"] = [
+                    header
+                    for header in message.get("headers", [])
+                    if header[0].lower() not in _SECURITY_HEADER_NAMES
+                ] + SECURITY_HEADERS
+            await send(message)
 
-        return response
+        await self.app(scope, receive, send_wrapper)
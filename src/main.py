@@ -1,65 +1,99 @@
+import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from src.api import incidents, utils
+from src.core.config import settings
+from src.core.database import replica_router
+from src.core.log_config import setup_logging
+from src.infrastructure import metrics
 from src.infrastructure.cache import cache_client
 from src.infrastructure.error_middleware import ErrorHandlingMiddleware
+from src.infrastructure.metrics_middleware import MetricsMiddleware
+from src.infrastructure.profiling_middleware import (
+    ProfilingAppTimer,
+    ProfilingMiddleware,
+)
+from src.infrastructure.request_id_middleware import RequestIdMiddleware
 from src.infrastructure.security_middleware import (
     RateLimitMiddleware,
     SecurityHeadersMiddleware,
 )
-from src.services.kafka_service import kafka_producer, kafka_consumer
+from src.services.incident_partitions import incident_partitions
+from src.services.kafka_service import kafka_producer
+from src.services.outbox_relay import outbox_relay
 from src.services.telegram_service import telegram_service
 
+logger = logging.getLogger(__name__)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Starting Incidents API...")
+    # не при импорте: импорт src.main (тесты, скрипты) не должен перенастраивать логи
+    setup_logging()
+    logger.info("Starting Incidents API...")
 
     try:
         await cache_client.initialize()
-        print("Cache connected successfully")
+        logger.info("Cache connected successfully")
     except Exception as e:
-        print(f"Cache connection failed: {e}")
+        logger.warning("Cache connection failed: %s", e)
 
-    # Инициализация Kafka продюсера (заглушка)
+    # Инициализация Kafka продюсера
     try:
         await kafka_producer.initialize()
-        print("Kafka producer initialized")
+        logger.info("Kafka producer initialized")
     except Exception as e:
-        print(f"Kafka producer initialization failed: {e}")
+        logger.warning("Kafka producer initialization failed: %s", e)
+
+    if settings.outbox_relay_in_app and outbox_relay.start():
+        logger.info("Outbox relay started")
 
-    # Инициализация Telegram сервиса (заглушка)
+    if settings.incidents_partitions_in_app:
+        incident_partitions.start()
+        logger.info("Incidents partitions maintenance started")
+
+    # Инициализация Telegram сервиса
     try:
         await telegram_service.initialize()
-        print("Telegram service initialized")
+        logger.info("Telegram service initialized")
     except Exception as e:
-        print(f"Telegram service initialization failed: {e}")
+        logger.warning("Telegram service initialization failed: %s", e)
+
+    replica_router.start()
 
-    print("Database ready (use Alembic for migrations)")
-    print("Incidents API started successfully")
+    logger.info("Database ready (use Alembic for migrations)")
+    logger.info("Incidents API started successfully")
 
     yield
 
     # Shutdown
-    print("Shutting down Incidents API...")
+    logger.info("Shutting down Incidents API...")
     try:
+        await outbox_relay.stop()
+        await incident_partitions.stop()
+        await replica_router.close()
         await cache_client.close()
         await kafka_producer.close()
         await telegram_service.close()
     except Exception:
-        pass
+        logger.exception("Shutdown error")
+    metrics.mark_process_dead()
 
 
 app = FastAPI(
     title="Incidents API",
     description="API для учёта инцидентов",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
+# самый внутренний: отсюда для профилирования начинается фаза app
+app.add_middleware(ProfilingAppTimer)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -70,7 +104,17 @@ app.add_middleware(
 
 app.add_middleware(ErrorHandlingMiddleware)
 app.add_middleware(SecurityHeadersMiddleware)
-app.add_middleware(RateLimitMiddleware, requests_per_minute=100)
+app.add_middleware(
+    RateLimitMiddleware,
+    requests_per_minute=settings.rate_limit_per_minute,
+    key_requests_per_minute=settings.rate_limit_key_per_minute,
+)
+app.add_middleware(ProfilingMiddleware)
+if settings.metrics_enabled:
+    # снаружи всех, чтобы в замер попали и остальные middleware, и 429
+    app.add_middleware(MetricsMiddleware)
+# id запроса нужен логам всех middleware ниже
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(incidents.router, prefix="/incidents", tags=["Incidents"])
 app.include_router(utils.router, prefix="/utils", tags=["Utils"])
@@ -86,12 +130,20 @@ async def root():
     }
 
 
+if settings.metrics_enabled:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        content, content_type = metrics.render()
+        return Response(content=content, media_type=content_type)
+
+
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy",
         "database": "connected",
-        "cache": "connected",
-        "kafka": "stub",
-        "telegram": "stub"
+        "cache": cache_client.health(),
+        "kafka": "connected" if kafka_producer.connected else "disabled",
+        "telegram": "enabled" if telegram_service.enabled else "disabled",
     }
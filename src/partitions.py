@@ -0,0 +1,19 @@
+import asyncio
+
+from src.core.log_config import setup_logging
+from src.infrastructure.cache import cache_client
+from src.services.incident_partitions import incident_partitions
+
+
+async def main():
+    """один проход обслуживания партиций incidents (для cron при incidents_partitions_in_app=false)"""
+
+    setup_logging()
+    await cache_client.initialize()
+    try:
+        await incident_partitions.run_once()
+    finally:
+        await cache_client.close()
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,25 @@
+import asyncio
+import logging
+
+from src.core.log_config import setup_logging
+from src.services.kafka_service import kafka_producer
+from src.services.outbox_relay import outbox_relay
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """перенос событий из outbox в кафку отдельным процессом"""
+
+    setup_logging()
+    await kafka_producer.initialize()
+    if not kafka_producer.connected:
+        logger.error("KAFKA_BOOTSTRAP_SERVERS is not set, nothing to relay to")
+        raise SystemExit(1)
+    try:
+        await outbox_relay.run()
+    finally:
+        await kafka_producer.close()
+
+if __name__ == '__main__':
+    asyncio.run(main())
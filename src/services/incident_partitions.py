@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import re
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal
+from src.domain.models import ACTIVE_STATUSES, Incident, IncidentSource, IncidentStatus
+from src.infrastructure.cache import cache_client
+from src.services.incident_service import IncidentService
+
+logger = logging.getLogger(__name__)
+
+TABLE = Incident.__tablename__
+PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+# ключ advisory lock, чтобы проход делал только один воркер
+MAINTENANCE_LOCK_KEY = 72_024_101
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+class IncidentPartitionManager:
+    """помесячные партиции incidents: создание будущих и архивация старых
+
+    партиции заводятся на incidents_partitions_ahead месяцев вперёд, без
+    них вставка упадёт (default-партиции нет). старше
+    incidents_retention_months отцепляются (DETACH ... CONCURRENTLY, без
+    ACCESS EXCLUSIVE на incidents) и переезжают в схему incidents_archive -
+    из выборок api они пропадают, данные остаются в бд
+    """
+
+    def __init__(self, session_factory: sessionmaker = AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._task: asyncio.Task | None = None
+
+        self.created_total = 0
+        self.archived_total = 0
+        self.errors_total = 0
+
+    async def _partitions(self, session: AsyncSession) -> dict[str, datetime]:
+        """текущие помесячные партиции: имя -> первый день месяца"""
+
+        result = await session.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:table AS regclass)"
+            ),
+            {"table": TABLE},
+        )
+        partitions = {}
+        for name in result.scalars():
+            match = PARTITION_NAME.match(name)
+            if match:
+                partitions[name] = datetime(int(match[1]), int(match[2]), 1)
+        return partitions
+
+    async def _detach_pending(self, session: AsyncSession) -> set[str]:
+        """партиции с прерванным DETACH CONCURRENTLY, их доделывает FINALIZE"""
+
+        result = await session.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:table AS regclass) AND i.inhdetachpending"
+            ),
+            {"table": TABLE},
+        )
+        return set(result.scalars())
+
+    @staticmethod
+    async def _autocommit(session: AsyncSession) -> AsyncConnection:
+        """соединение сессии вне транзакции"""
+
+        return await session.connection(
+            execution_options={"isolation_level": "AUTOCOMMIT"}
+        )
+
+    async def _lock_timeout(self, session: AsyncSession):
+        # DDL ждёт ACCESS EXCLUSIVE на incidents, за ним встают все запросы к таблице
+        await session.execute(
+            text(f"SET LOCAL lock_timeout = '{settings.incidents_partitions_lock_timeout}'")
+        )
+
+    async def ensure_partitions(self, now: Optional[datetime] = None) -> List[str]:
+        """создать недостающие партиции с текущего месяца на N месяцев вперёд"""
+
+        current = month_start(now or datetime.utcnow())
+        created = []
+        async with self._session_factory() as session:
+            existing = await self._partitions(session)
+            await session.commit()
+
+            for offset in range(settings.incidents_partitions_ahead + 1):
+                month = add_months(current, offset)
+                name = partition_name(month)
+                if name in existing:
+                    continue
+                async with session.begin():
+                    await self._lock_timeout(session)
+                    await session.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+                        f"FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                        f"TO ('{add_months(month, 1):%Y-%m-%d}')"
+                    ))
+                created.append(name)
+                logger.info("Incidents partition created: %s", name)
+
+        self.created_total += len(created)
+        return created
+
+    async def archive_partitions(self, now: Optional[datetime] = None) -> List[str]:
+        """отцепить партиции старше срока хранения и перенести в архивную схему
+
+        партиция с активными инцидентами (open/in_progress) не трогается.
+        DETACH ... CONCURRENTLY не работает в транзакции, поэтому активные
+        строки проверяются ещё раз после него: если статус успели поменять,
+        партиция возвращается на место. счётчики incident_counters и
+        incident_ids чистятся в одной транзакции с переносом в архив
+        """
+
+        if settings.incidents_retention_months <= 0:
+            return []
+
+        cutoff = add_months(
+            month_start(now or datetime.utcnow()), -settings.incidents_retention_months
+        )
+        archive = settings.incidents_archive_schema
+        archived = []
+        async with self._session_factory() as session:
+            partitions = await self._partitions(session)
+            pending = await self._detach_pending(session)
+            await session.commit()
+
+        for name, month in sorted(partitions.items(), key=lambda item: item[1]):
+            if add_months(month, 1) > cutoff:
+                continue
+            if name not in pending:
+                async with self._session_factory() as session:
+                    if await self._has_active(session, name):
+                        logger.warning(
+                            "Partition %s has active incidents, not archived", name
+                        )
+                        continue
+            if await self._detach(name, month, finalize=name in pending):
+                archived.append(name)
+                logger.info("Incidents partition archived: %s -> %s", name, archive)
+
+        if archived:
+            # из списков пропали строки любых статусов и источников
+            generation_keys = IncidentService.generation_keys
+            keys = generation_keys(None, None)
+            keys += [generation_keys(s, None)[0] for s in IncidentStatus]
+            keys += [generation_keys(None, s)[0] for s in IncidentSource]
+            await cache_client.incr_many(keys)
+
+        self.archived_total += len(archived)
+        return archived
+
+    @staticmethod
+    async def _has_active(session: AsyncSession, name: str) -> bool:
+        active = ", ".join(f"'{status.value}'" for status in ACTIVE_STATUSES)
+        return await session.scalar(
+            text(f"SELECT EXISTS (SELECT 1 FROM {name} WHERE status IN ({active}))")
+        )
+
+    async def _detach(self, name: str, month: datetime, finalize: bool) -> bool:
+        """отцепить партицию и перенести в архив, False - в ней оказались активные"""
+
+        # CONCURRENTLY берёт на incidents только SHARE UPDATE EXCLUSIVE и ждёт
+        # завершения запросов, видевших партицию - после него строки не меняются
+        mode = "FINALIZE" if finalize else "CONCURRENTLY"
+        async with self._session_factory() as session:
+            connection = await self._autocommit(session)
+            await connection.execute(
+                text(f"ALTER TABLE {TABLE} DETACH PARTITION {name} {mode}")
+            )
+
+        async with self._session_factory() as session:
+            async with session.begin():
+                await self._lock_timeout(session)
+                if await self._has_active(session, name):
+                    logger.warning(
+                        "Partition %s got active incidents during detach, reattached",
+                        name,
+                    )
+                    await session.execute(text(
+                        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+                        f"FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                        f"TO ('{add_months(month, 1):%Y-%m-%d}')"
+                    ))
+                    return False
+
+                # вычитаем в полосу 0, сумма по полосам останется верной
+                await session.execute(text(
+                    "INSERT INTO incident_counters AS c (status, source, stripe, count) "
+                    "SELECT status::text, source::text, 0, -count(*) "
+                    f"FROM {name} GROUP BY 1, 2 ORDER BY 1, 2 "
+                    "ON CONFLICT (status, source, stripe) "
+                    "DO UPDATE SET count = c.count + EXCLUDED.count"
+                ))
+                await session.execute(
+                    text(f"DELETE FROM incident_ids i USING {name} p WHERE i.id = p.id")
+                )
+                archive = settings.incidents_archive_schema
+                await session.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive}"))
+        return True
+
+    async def run_once(self) -> bool:
+        """один проход обслуживания, False - его уже делает другой процесс
+
+        блокировка уровня сессии на соединении вне транзакции: оно не висит
+        idle in transaction, пока идёт проход
+        """
+
+        async with self._session_factory() as session:
+            connection = await self._autocommit(session)
+            locked = await connection.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+            )
+            if not locked:
+                return False
+            try:
+                await self.ensure_partitions()
+                await self.archive_partitions()
+            finally:
+                await connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+                )
+        return True
+
+    async def run(self):
+        """обслуживать партиции, пока не отменят"""
+
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors_total += 1
+                logger.error("Incidents partitions maintenance error: %s", e)
+
+            await asyncio.sleep(settings.incidents_partitions_interval)
+
+    def start(self):
+        """запустить обслуживание фоновой задачей"""
+
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+incident_partitions = IncidentPartitionManager()
@@ -1,10 +1,67 @@
-from typing import Optional, List
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 from uuid import UUID
 
-from sqlalchemy import select, func
+from sqlalchemy import (
+    and_,
+    func,
+    insert,
+    literal,
+    literal_column,
+    or_,
+    select,
+    tuple_,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.domain.models import Incident, IncidentStatus, IncidentSource
+from src.core.config import settings
+from src.domain.models import (
+    SEARCH_CONFIG,
+    Incident,
+    IncidentCounter,
+    IncidentId,
+    IncidentSource,
+    IncidentStatus,
+)
+
+
+def _search_vector():
+    """то же выражение, что в ix_incidents_description_fts
+
+    конфигурация и пустая строка - литералы, а не параметры, иначе на
+    generic-плане prepared statement индекс не подойдёт
+    """
+
+    return func.to_tsvector(
+        literal_column(f"'{SEARCH_CONFIG}'"),
+        func.coalesce(Incident.description, literal_column("''")),
+    )
+
+
+def _search_query(q: str):
+    return func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), q)
+
+
+def _status_literal(status: IncidentStatus):
+    """статус литералом: частичные индексы WHERE status = 'open' подходят
+    только к константе, параметр $1 на generic-плане их не использует
+    """
+
+    return literal_column(f"'{IncidentStatus(status).value}'")
+
+
+def _by_ids(table, incident_ids: List[UUID]):
+    """условие по id через incident_ids: created_at берётся оттуда, и на
+    каждый id postgres читает одну партицию, а не индексы всех
+    """
+
+    return and_(
+        IncidentId.id.in_(incident_ids),
+        table.c.id == IncidentId.id,
+        table.c.created_at == IncidentId.created_at,
+    )
 
 
 class IncidentRepository:
@@ -21,11 +78,61 @@ class IncidentRepository:
         await self.db.flush()
         return incident
 
+    async def bulk_create(
+        self,
+        items: List[tuple[str | None, IncidentSource | None, IncidentStatus | None]]
+    ) -> List[Dict[str, Any]]:
+        """создать пачку инцидентов одним запросом, элементы - (описание, источник, статус)
+
+        id и даты генерируем сами, поэтому строки можно сразу отдать дальше
+        (в ответ и в события) без повторного чтения из бд
+        """
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "description": description,
+                "status": IncidentStatus(status or IncidentStatus.OPEN).value,
+                "source": IncidentSource(source or IncidentSource.UNKNOWN).value,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for description, source, status in items
+        ]
+        if not rows:
+            return rows
+
+        if len(rows) >= settings.incidents_batch_copy_threshold:
+            await self._copy_rows(rows)
+            return rows
+
+        # multi-row INSERT ... RETURNING id, порядок совпадает с порядком rows
+        result = await self.db.execute(
+            insert(Incident).returning(Incident.id, sort_by_parameter_order=True),
+            rows,
+        )
+        for row, incident_id in zip(rows, result.scalars()):
+            row["id"] = incident_id
+        return rows
+
+    async def _copy_rows(self, rows: List[Dict[str, Any]]):
+        """залить строки через COPY asyncpg в рамках текущей транзакции"""
+
+        columns = list(rows[0])
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            Incident.__tablename__,
+            records=[tuple(row[column] for column in columns) for row in rows],
+            columns=columns,
+        )
+
     async def get_by_id(self, incident_id: UUID) -> Optional[Incident]:
         """получить инцидент по id"""
 
         result = await self.db.scalar(
-            select(Incident).where(Incident.id == incident_id)
+            select(Incident).where(_by_ids(Incident.__table__, [incident_id]))
         )
         return result
 
@@ -33,14 +140,34 @@ class IncidentRepository:
         self,
         query,
         status: IncidentStatus | None = None,
-        source: IncidentSource | None = None
+        source: IncidentSource | None = None,
+        q: str | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
     ):
-        """Применить фильтры к запросу."""
+        """Применить фильтры к запросу.
+
+        created_from/created_to - полуинтервал [from, to) по created_at,
+        по нему postgres отсекает лишние партиции
+        """
 
+        if created_from:
+            query = query.where(Incident.created_at >= created_from)
+        if created_to:
+            query = query.where(Incident.created_at < created_to)
         if status:
-            query = query.where(Incident.status == status.value)
+            query = query.where(Incident.status == _status_literal(status))
         if source:
             query = query.where(Incident.source == source.value)
+        if q:
+            # слова через GIN по tsvector, подстрока через триграммный индекс
+            escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.where(
+                or_(
+                    _search_vector().op("@@")(_search_query(q)),
+                    Incident.description.ilike(f"%{escaped}%", escape="\\"),
+                )
+            )
         return query
 
     async def get_all(
@@ -48,35 +175,126 @@ class IncidentRepository:
         status: IncidentStatus | None = None,
         source: IncidentSource | None = None,
         limit: int = 100,
-        offset: int = 0
-    ) -> tuple[List[Incident], int]:
-        """список инцидентов с фильтрами"""
+        offset: int = 0,
+        after: tuple[datetime, UUID] | None = None,
+        q: str | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> List[Incident]:
+        """список инцидентов с фильтрами
+
+        если передан after (created_at, id) - keyset-пагинация вместо OFFSET,
+        offset в этом случае игнорируется.
+        с q результаты сортируются по релевантности, затем по дате
+        """
+
+        query = self.list_query(
+            status, source, limit, offset, after, q, created_from, created_to
+        )
+        incidents_result = await self.db.scalars(query)
+        return list(incidents_result.all())
+
+    def list_query(
+        self,
+        status: IncidentStatus | None = None,
+        source: IncidentSource | None = None,
+        limit: int = 100,
+        offset: int = 0,
+        after: tuple[datetime, UUID] | None = None,
+        q: str | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ):
+        """запрос get_all без выполнения (нужен и для проверки планов)"""
 
         query = select(Incident)
-        query = self._apply_filters(query, status, source)
-        query = query.order_by(Incident.created_at.desc())
-        query = query.limit(limit).offset(offset)
+        query = self._apply_filters(
+            query, status, source, q, created_from, created_to
+        )
+        if after:
+            created_at, incident_id = after
+            query = query.where(
+                # по сравнению кортежей партиции не отсекаются, дублируем условие
+                Incident.created_at <= literal(created_at, Incident.created_at.type),
+                tuple_(Incident.created_at, Incident.id)
+                < tuple_(
+                    literal(created_at, Incident.created_at.type),
+                    literal(incident_id, Incident.id.type),
+                )
+            )
+        if q:
+            query = query.order_by(
+                func.ts_rank_cd(_search_vector(), _search_query(q)).desc()
+            )
+        query = query.order_by(Incident.created_at.desc(), Incident.id.desc())
+        query = query.limit(limit)
+        if not after:
+            query = query.offset(offset)
+        return query
+
+    async def count(
+        self,
+        status: IncidentStatus | None = None,
+        source: IncidentSource | None = None,
+        q: str | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> int:
+        """точное количество инцидентов по фильтрам"""
 
         count_query = select(func.count(Incident.id))
-        count_query = self._apply_filters(count_query, status, source)
+        count_query = self._apply_filters(
+            count_query, status, source, q, created_from, created_to
+        )
+        return await self.db.scalar(count_query) or 0
 
-        incidents_result = await self.db.scalars(query)
-        total = await self.db.scalar(count_query) or 0
+    async def estimate_count(
+        self,
+        status: IncidentStatus | None = None,
+        source: IncidentSource | None = None
+    ) -> int:
+        """количество инцидентов по таблице счётчиков (максимум 20 строк)"""
 
-        return list(incidents_result.all()), total
+        query = select(func.coalesce(func.sum(IncidentCounter.count), 0))
+        if status:
+            query = query.where(IncidentCounter.status == status.value)
+        if source:
+            query = query.where(IncidentCounter.source == source.value)
+        return int(await self.db.scalar(query) or 0)
 
     async def update_status(
         self,
         incident_id: UUID,
-        new_status: IncidentStatus
-    ) -> Optional[Incident]:
-        """обновить статус"""
+        new_status: IncidentStatus,
+        expected_status: IncidentStatus | None = None
+    ) -> Optional[Dict[str, Any]]:
+        """обновить статус одним UPDATE ... RETURNING
 
-        incident = await self.get_by_id(incident_id)
-        if not incident:
-            return None
+        expected_status - обновить, только если текущий статус такой (оптимистичная
+        блокировка). None, если инцидента нет или статус не совпал
+        """
 
-        incident.status = new_status
-        await self.db.flush()
-        return incident
+        rows = await self.bulk_update_status([incident_id], new_status, expected_status)
+        return rows[0] if rows else None
+
+    async def bulk_update_status(
+        self,
+        incident_ids: List[UUID],
+        new_status: IncidentStatus,
+        expected_status: IncidentStatus | None = None
+    ) -> List[Dict[str, Any]]:
+        """обновить статус пачке инцидентов, вернуть обновлённые строки"""
+
+        table = Incident.__table__
+        query = (
+            update(table)
+            .where(_by_ids(table, incident_ids))
+            .values(status=IncidentStatus(new_status).value)
+            .returning(*table.c)
+        )
+        if expected_status:
+            query = query.where(table.c.status == IncidentStatus(expected_status).value)
+
+        result = await self.db.execute(query)
+        return [dict(row._mapping) for row in result]
 
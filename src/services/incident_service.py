@@ -1,21 +1,52 @@
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
 from uuid import UUID
 
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.config import settings
-from src.domain.models import Incident, IncidentStatus, IncidentSource
-from src.domain.schemas import IncidentItemResponse, IncidentListResponse, ResponseIdDTO
-from src.infrastructure.cache import cache_client
+from src.core.database import on_commit, used_replica
+from src.domain.models import Incident, IncidentSource, IncidentStatus
+from src.domain.schemas import (
+    CountMode,
+    IncidentBatchItemError,
+    IncidentBatchResponse,
+    IncidentCreate,
+    IncidentItemResponse,
+    IncidentListResponse,
+    ResponseIdDTO,
+)
+from src.infrastructure import profiling
+from src.infrastructure.cache import SingleFlight, cache_client
 from src.services.incident_repository import IncidentRepository
+from src.services.outbox_repository import OutboxRepository
+from src.services.pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """created_at в бд хранится в UTC без таймзоны"""
+
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class IncidentStatusConflictError(Exception):
+    """текущий статус инцидента не совпал с ожидаемым"""
+
+
+# одновременные промахи кэша по одному инциденту в процессе идут в бд одним запросом
+_incident_loads = SingleFlight()
 
 
 class IncidentService:
     """сервис для работы с инцидентами"""
 
     def __init__(self, db: AsyncSession):
+        self.db = db
         self.repository = IncidentRepository(db)
-        # self.kafka_producer = KafkaProducerService()
+        self.outbox = OutboxRepository(db)
 
     async def create_incident(
         self,
@@ -29,90 +60,399 @@ class IncidentService:
             source=source
         )
 
-        await self._send_to_kafka(incident)
+        await self._send_to_kafka("incident.created", incident)
+        self._invalidate_list_cache(
+            statuses=[IncidentStatus.OPEN], sources=[incident.source]
+        )
 
         return ResponseIdDTO(id=incident.id)
 
+    async def create_incidents_batch(
+        self,
+        items: List[Any]
+    ) -> IncidentBatchResponse:
+        """пакетное создание инцидентов
+
+        каждый элемент валидируется как IncidentCreate, невалидные (в том
+        числе не объекты) не валят всю пачку, а возвращаются в errors
+        """
+
+        ids: List[UUID | None] = [None] * len(items)
+        errors: List[IncidentBatchItemError] = []
+        valid: List[tuple[int, IncidentCreate]] = []
+
+        for index, raw in enumerate(items):
+            try:
+                valid.append((index, IncidentCreate.model_validate(raw)))
+            except ValidationError as e:
+                errors.append(
+                    IncidentBatchItemError(
+                        index=index,
+                        errors=e.errors(include_url=False, include_context=False),
+                    )
+                )
+
+        rows = await self.repository.bulk_create(
+            [(item.description, item.source, item.status) for _, item in valid]
+        )
+
+        for (index, _), row in zip(valid, rows):
+            ids[index] = row["id"]
+
+        await self._send_to_kafka("incident.created", *rows)
+        if rows:
+            self._invalidate_list_cache(
+                statuses={row["status"] for row in rows},
+                sources={row["source"] for row in rows},
+            )
+
+        return IncidentBatchResponse(ids=ids, errors=errors)
+
     async def get_incident(self, incident_id: UUID) -> IncidentItemResponse | None:
         """Получить инцидент по ID."""
 
+        raw = await self.get_incident_json(incident_id)
+        return IncidentItemResponse.model_validate_json(raw) if raw else None
+
+    async def get_incident_json(self, incident_id: UUID) -> bytes | None:
+        """инцидент сразу готовым json ответа
+
+        в кэше лежат те же байты, при попадании они отдаются как есть,
+        без разбора, валидации и повторной сериализации
+        """
+
+        if not settings.cache_enabled:
+            incident = await self.repository.get_by_id(incident_id)
+            if not incident:
+                return None
+            return self._serialize_incident(incident)
+
         # проверяем кеш
         cache_key = f"incident:{incident_id}"
-        if settings.cache_enabled:
-            cached = await cache_client.get(cache_key)
+        cached = await cache_client.get_raw(cache_key)
+        if cached:
+            return cached
+
+        return await _incident_loads.do(
+            cache_key, lambda: self._load_incident(incident_id, cache_key)
+        )
+
+    @staticmethod
+    def _serialize_incident(incident: Incident) -> bytes:
+        with profiling.phase("serialize"):
+            return IncidentItemResponse.model_validate(incident).model_dump_json().encode()
+
+    async def _load_incident(self, incident_id: UUID, cache_key: str) -> bytes | None:
+        """загрузить инцидент из бд в кэш, между воркерами - под коротким локом"""
+
+        token = await cache_client.acquire_lock(cache_key)
+        if token is None:
+            # другой воркер уже грузит, ждём его результат в кэше
+            cached = await cache_client.wait_for(cache_key)
             if cached:
-                return IncidentItemResponse.model_validate(cached)
+                return cached
 
-        # Получаем из бд
-        incident = await self.repository.get_by_id(incident_id)
-        if not incident:
-            return None
+        try:
+            # Получаем из бд
+            incident = await self.repository.get_by_id(incident_id)
+            if not incident:
+                return None
 
-        response = IncidentItemResponse.model_validate(incident)
+            raw = self._serialize_incident(incident)
 
-        # Сохраняем в кэш
-        if settings.cache_enabled:
-            await cache_client.set(
-                cache_key,
-                response.model_dump(mode='json'),
-                ttl=settings.cache_incidents_ttl
+            # Сохраняем в кэш
+            await cache_client.set_raw(
+                cache_key, raw, ttl=self._cache_ttl(settings.cache_incidents_ttl)
             )
+        finally:
+            if token is not None:
+                await cache_client.release_lock(cache_key, token)
 
-        return response
+        return raw
 
     async def get_incidents(
         self,
         status: Optional[IncidentStatus] = None,
         source: Optional[IncidentSource] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        count: CountMode = CountMode.EXACT,
+        q: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
     ) -> IncidentListResponse:
         """список инцидентов"""
 
-        # кэш списка скипаем из-за пагинации
-
-        # Получаем из бд
-        incidents, total = await self.repository.get_all(
+        raw = await self.get_incidents_json(
             status=status,
             source=source,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor,
+            count=count,
+            q=q,
+            created_from=created_from,
+            created_to=created_to,
+        )
+        return IncidentListResponse.model_validate_json(raw)
+
+    async def get_incidents_json(
+        self,
+        status: Optional[IncidentStatus] = None,
+        source: Optional[IncidentSource] = None,
+        limit: int = 100,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        count: CountMode = CountMode.EXACT,
+        q: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> bytes:
+        """список инцидентов готовым json ответа
+
+        cursor - непрозрачный курсор из next_cursor предыдущей страницы,
+        при его наличии offset не используется
+        count - режим подсчёта total (exact/estimate/none)
+        q - полнотекстовый поиск по описанию, выдача по релевантности;
+        курсор с ним не работает (порядок не по created_at), только offset
+        created_from/created_to - диапазон [from, to) по created_at, с ним
+        запрос читает только партиции этого диапазона
+        """
+
+        if q and cursor:
+            raise InvalidCursorError("Cursor is not supported together with q")
+        after = decode_cursor(cursor) if cursor else None
+        created_from = _naive_utc(created_from)
+        created_to = _naive_utc(created_to)
+
+        # страницы кэшируем под ключом с поколениями фильтра, запись их просто поднимает
+        generation = await self._list_generation(status, source)
+        cache_key = None
+        if generation is not None:
+            cache_key = (
+                f"incidents:list:{generation}:{status.value if status else '*'}"
+                f":{source.value if source else '*'}:{limit}:{offset}"
+                f":{cursor or ''}:{count.value}"
+                f":{created_from.isoformat() if created_from else ''}"
+                f":{created_to.isoformat() if created_to else ''}:{q or ''}"
+            )
+            cached = await cache_client.get_raw(cache_key)
+            if cached:
+                return cached
+
+        # Получаем из бд, берём на одну запись больше, чтобы понять есть ли следующая страница
+        incidents = await self.repository.get_all(
+            status=status,
+            source=source,
+            limit=limit + 1,
+            offset=offset,
+            after=after,
+            q=q,
+            created_from=created_from,
+            created_to=created_to,
         )
 
-        response = IncidentListResponse(
-            incidents=[IncidentItemResponse.model_validate(inc) for inc in incidents],
-            total=total
+        next_cursor = None
+        if len(incidents) > limit:
+            incidents = incidents[:limit]
+            if not q:
+                last = incidents[-1]
+                next_cursor = encode_cursor(last.created_at, last.id)
+
+        total = await self._count_incidents(
+            status, source, count, generation, q, created_from, created_to
         )
 
-        return response
+        with profiling.phase("serialize"):
+            raw = IncidentListResponse(
+                incidents=[IncidentItemResponse.model_validate(inc) for inc in incidents],
+                total=total,
+                next_cursor=next_cursor,
+            ).model_dump_json().encode()
+
+        if cache_key:
+            await cache_client.set_raw(
+                cache_key, raw, ttl=self._cache_ttl(settings.cache_list_ttl)
+            )
+
+        return raw
 
     async def update_incident_status(
         self,
         incident_id: UUID,
-        new_status: IncidentStatus
+        new_status: IncidentStatus,
+        expected_status: Optional[IncidentStatus] = None
     ) -> bool:
-        """Обновить статус инцидента."""
+        """Обновить статус инцидента.
+
+        при несовпадении expected_status поднимает IncidentStatusConflictError
+        """
 
-        incident = await self.repository.update_status(incident_id, new_status)
+        incident = await self.repository.update_status(
+            incident_id, new_status, expected_status
+        )
         if not incident:
+            # лишний запрос только на редком пути, чтобы отличить 404 от конфликта
+            if expected_status and await self.repository.get_by_id(incident_id):
+                raise IncidentStatusConflictError()
             return False
 
-        await self._invalidate_incident_cache(incident_id)
-
-        await self._send_to_kafka(incident)
+        await self._after_status_change([incident])
 
         return True
 
+    async def update_incidents_status(
+        self,
+        incident_ids: List[UUID],
+        new_status: IncidentStatus,
+        expected_status: Optional[IncidentStatus] = None
+    ) -> List[UUID]:
+        """Обновить статус пачке инцидентов, вернуть id обновлённых."""
+
+        rows = await self.repository.bulk_update_status(
+            incident_ids, new_status, expected_status
+        )
+        if rows:
+            await self._after_status_change(rows)
+
+        return [row["id"] for row in rows]
+
+    async def _after_status_change(self, rows: List[Dict[str, Any]]):
+        """инвалидация кэша и события по строкам, которые вернул UPDATE"""
+
+        incident_ids = [row["id"] for row in rows]
+        on_commit(self.db, lambda: self._invalidate_incident_cache(*incident_ids))
+        # прежний статус уже перезаписан, поэтому поднимаем поколения всех статусов
+        self._invalidate_list_cache(
+            statuses=list(IncidentStatus), sources={row["source"] for row in rows}
+        )
+
+        await self._send_to_kafka("incident.status_changed", *rows)
+
+    async def _count_incidents(
+        self,
+        status: Optional[IncidentStatus],
+        source: Optional[IncidentSource],
+        mode: CountMode,
+        generation: Optional[str] = None,
+        q: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> int | None:
+        """total для списка в зависимости от режима
+
+        счётчики не знают про поиск и даты, поэтому с ними estimate считается точно
+        """
+
+        if mode == CountMode.NONE:
+            return None
+        if mode == CountMode.ESTIMATE and not (q or created_from or created_to):
+            return await self.repository.estimate_count(status, source)
+
+        filters = dict(q=q, created_from=created_from, created_to=created_to)
+        if generation is None:
+            return await self.repository.count(status, source, **filters)
+
+        cache_key = (
+            f"incidents:count:{generation}:{status.value if status else '*'}"
+            f":{source.value if source else '*'}"
+            f":{created_from.isoformat() if created_from else ''}"
+            f":{created_to.isoformat() if created_to else ''}:{q or ''}"
+        )
+        cached = await cache_client.get(cache_key)
+        if cached is not None:
+            return cached
+
+        total = await self.repository.count(status, source, **filters)
+        await cache_client.set(
+            cache_key, total, ttl=self._cache_ttl(settings.cache_count_ttl)
+        )
+
+        return total
 
-    async def _invalidate_incident_cache(self, incident_id: UUID):
-        """инвалидировать кэш конкретного инцидента"""
+    def _cache_ttl(self, ttl: int) -> int:
+        """TTL для записи в кэш
+
+        данные с реплики могли быть прочитаны до применения свежей записи,
+        поэтому держим их не дольше допустимого отставания реплики
+        """
+
+        if used_replica(self.db):
+            return max(1, min(ttl, int(settings.db_replica_max_lag)))
+        return ttl
+
+    @staticmethod
+    def generation_keys(
+        status: Optional[IncidentStatus],
+        source: Optional[IncidentSource],
+    ) -> List[str]:
+        """ключи поколений, от которых зависит выборка с такими фильтрами"""
+
+        keys = []
+        if status:
+            keys.append(f"incidents:gen:status:{IncidentStatus(status).value}")
+        if source:
+            keys.append(f"incidents:gen:source:{IncidentSource(source).value}")
+        return keys or ["incidents:gen:all"]
+
+    async def _list_generation(
+        self,
+        status: Optional[IncidentStatus],
+        source: Optional[IncidentSource],
+    ) -> Optional[str]:
+        """текущее поколение выборки, None если кэш выключен или недоступен"""
+
+        if not settings.cache_enabled:
+            return None
+        counters = await cache_client.get_counters(
+            self.generation_keys(status, source)
+        )
+        if counters is None:
+            return None
+        return ".".join(map(str, counters))
+
+    def _invalidate_list_cache(
+        self,
+        statuses: Iterable[IncidentStatus | str],
+        sources: Iterable[IncidentSource | str],
+    ):
+        """после коммита поднять поколения выборок, которые затронула запись"""
 
         if not settings.cache_enabled:
             return
 
-        cache_key = f"incident:{incident_id}"
-        await cache_client.delete(cache_key)
+        keys = ["incidents:gen:all"]
+        keys += [self.generation_keys(status, None)[0] for status in statuses]
+        keys += [self.generation_keys(None, source)[0] for source in sources]
+        on_commit(self.db, lambda: cache_client.incr_many(keys))
+
+    async def _invalidate_incident_cache(self, *incident_ids: UUID):
+        """инвалидировать кэш конкретных инцидентов"""
+
+        if not settings.cache_enabled:
+            return
 
-    async def _send_to_kafka(self, incident: Incident):
-        pass
+        await cache_client.delete_many(
+            [f"incident:{incident_id}" for incident_id in incident_ids]
+        )
+
+    async def _send_to_kafka(
+        self,
+        event_type: str,
+        *incidents: Incident | Dict[str, Any]
+    ):
+        """события об инцидентах в кафку через outbox
+
+        пишутся в текущей транзакции, до брокера их доносит OutboxRelay,
+        поэтому откат транзакции не порождает событий, а коммит их не теряет
+        """
+
+        await self.outbox.add_events(
+            event_type,
+            [
+                IncidentItemResponse.model_validate(incident).model_dump(mode="json")
+                for incident in incidents
+            ],
+        )
 
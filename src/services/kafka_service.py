@@ -1,37 +1,495 @@
-from typing import Dict, Any, Optional
+import asyncio
+import functools
+import json
+import logging
+import time
+import zlib
+from typing import Any, Dict, List, NamedTuple, Optional, Protocol, Tuple
 
+from src.core.config import settings
+from src.infrastructure import metrics
 
-class KafkaProducerService:
-    """публикация сообщений в Kafka топик"""
+logger = logging.getLogger(__name__)
 
-    def __init__(self):
+# (key, value) сообщения в том виде, в котором оно уходит в брокер
+KafkaMessage = Tuple[Optional[bytes], bytes]
+
+
+class KafkaRecord(NamedTuple):
+    """прочитанное из топика сообщение"""
+
+    topic: str
+    partition: int
+    offset: int
+    key: Optional[bytes]
+    value: bytes
+
+
+class KafkaBroker(Protocol):
+    """то, что нужно продюсеру от брокера"""
+
+    async def start(self): ...
+
+    async def stop(self): ...
+
+    async def send_batch(self, topic: str, messages: List[KafkaMessage]): ...
+
+
+class KafkaConsumerClient(Protocol):
+    """то, что нужно консьюмеру от брокера"""
+
+    async def start(self): ...
+
+    async def stop(self): ...
+
+    async def getmany(self, max_records: int, timeout: float) -> List[KafkaRecord]: ...
+
+    async def commit(self, offsets: Dict[Tuple[str, int], int]): ...
+
+
+class InMemoryKafkaBroker:
+    """подмена Kafka для тестов, в приложении сама не подставляется
+
+    сообщения копятся в памяти без ограничений, поэтому без настоящего
+    брокера продюсер не публикует ничего, а не пишет сюда
+    """
+
+    def __init__(self, partitions: int = 1):
+        self.partitions = partitions
+        self.topics: Dict[str, List[List[KafkaMessage]]] = {}
+        self.batches_sent = 0
+
+    async def start(self):
         pass
 
-    async def initialize(self):
+    async def stop(self):
         pass
 
-    async def close(self):
+    def partition_for(self, key: Optional[bytes]) -> int:
+        """партиция по ключу, как у Kafka - одинаковый ключ в одну партицию"""
+
+        if key is None:
+            return 0
+        return zlib.crc32(key) % self.partitions
+
+    async def send_batch(self, topic: str, messages: List[KafkaMessage]):
+        partitions = self.topics.setdefault(
+            topic, [[] for _ in range(self.partitions)]
+        )
+        for key, value in messages:
+            partitions[self.partition_for(key)].append((key, value))
+        self.batches_sent += 1
+
+
+class InMemoryKafkaConsumer:
+    """консьюмер поверх InMemoryKafkaBroker, одна группа на экземпляр"""
+
+    def __init__(self, broker: InMemoryKafkaBroker, topic: str):
+        self._broker = broker
+        self._topic = topic
+        self._positions: Dict[int, int] = {}
+        self.committed: Dict[Tuple[str, int], int] = {}
+
+    async def start(self):
         pass
 
-    async def publish_incident(self, message_data: Dict[str, Any]):
+    async def stop(self):
         pass
 
+    async def getmany(self, max_records: int, timeout: float) -> List[KafkaRecord]:
+        records: List[KafkaRecord] = []
+        for partition, messages in enumerate(self._broker.topics.get(self._topic, [])):
+            position = self._positions.get(
+                partition, self.committed.get((self._topic, partition), 0)
+            )
+            for offset in range(position, len(messages)):
+                if len(records) >= max_records:
+                    break
+                key, value = messages[offset]
+                records.append(KafkaRecord(self._topic, partition, offset, key, value))
+                position = offset + 1
+            self._positions[partition] = position
 
-class KafkaConsumerService:
-    """чтение и обработка сообщений из Kafka топика"""
+        if not records:
+            await asyncio.sleep(timeout)
+        return records
+
+    async def commit(self, offsets: Dict[Tuple[str, int], int]):
+        self.committed.update(offsets)
+
+
+class AIOKafkaBroker:
+    """настоящий брокер через aiokafka"""
 
     def __init__(self):
-        self._telegram_service: Optional[Any] = None
+        from aiokafka import AIOKafkaProducer
+
+        self._producer = AIOKafkaProducer(
+            bootstrap_servers=settings.kafka_bootstrap_servers,
+            compression_type=settings.kafka_compression_type,
+            linger_ms=settings.kafka_linger_ms,
+        )
+
+    async def start(self):
+        await self._producer.start()
+
+    async def stop(self):
+        await self._producer.stop()
+
+    async def send_batch(self, topic: str, messages: List[KafkaMessage]):
+        # send() только кладёт в аккумулятор aiokafka, ждём подтверждения пачкой
+        futures = [
+            await self._producer.send(topic, value=value, key=key)
+            for key, value in messages
+        ]
+        await asyncio.gather(*futures)
+
+
+class AIOKafkaConsumerClient:
+    """настоящий консьюмер через aiokafka, оффсеты коммитим сами"""
+
+    def __init__(self):
+        from aiokafka import AIOKafkaConsumer
+
+        self._consumer = AIOKafkaConsumer(
+            settings.kafka_incidents_topic,
+            bootstrap_servers=settings.kafka_bootstrap_servers,
+            group_id=settings.kafka_consumer_group,
+            enable_auto_commit=False,
+            auto_offset_reset="earliest",
+        )
+
+    async def start(self):
+        await self._consumer.start()
+
+    async def stop(self):
+        await self._consumer.stop()
+
+    async def getmany(self, max_records: int, timeout: float) -> List[KafkaRecord]:
+        batches = await self._consumer.getmany(
+            timeout_ms=int(timeout * 1000), max_records=max_records
+        )
+        return [
+            KafkaRecord(r.topic, r.partition, r.offset, r.key, r.value)
+            for records in batches.values()
+            for r in records
+        ]
+
+    async def commit(self, offsets: Dict[Tuple[str, int], int]):
+        from aiokafka import TopicPartition
+
+        await self._consumer.commit(
+            {TopicPartition(topic, partition): offset
+             for (topic, partition), offset in offsets.items()}
+        )
+
+
+class KafkaProducerService:
+    """публикация сообщений в Kafka топик
+
+    publish_incident только кладёт сообщение в ограниченную очередь,
+    отправка идёт фоновой задачей пачками по размеру или linger-таймауту
+    """
+
+    def __init__(self, broker: Optional[KafkaBroker] = None):
+        self._broker = broker
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self.dropped = 0
 
     async def initialize(self):
-        from src.services.telegram_service import telegram_service
+        if self._broker is None:
+            if not settings.kafka_bootstrap_servers:
+                logger.warning("Kafka is not configured, events are not published")
+                return
+            self._broker = AIOKafkaBroker()
+        await self._broker.start()
+        self._queue = asyncio.Queue(maxsize=settings.kafka_queue_max_size)
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+            # дописываем то, что осталось в очереди
+            while not self._queue.empty():
+                await self._send(self._take_batch([]))
+        if self._broker:
+            await self._broker.stop()
+
+    @property
+    def connected(self) -> bool:
+        """есть брокер, в который можно публиковать"""
+
+        return self._broker is not None
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def publish_incident(self, message_data: Dict[str, Any]) -> bool:
+        """поставить событие инцидента в очередь на отправку
+
+        при заполненной очереди ждём не дольше kafka_enqueue_timeout, затем
+        событие отбрасывается
+        """
+
+        if self._queue is None:
+            logger.warning("Kafka producer is not initialized, event dropped")
+            self.dropped += 1
+            metrics.KAFKA_DROPPED.inc()
+            return False
+
+        message = self._encode(message_data)
+        try:
+            self._queue.put_nowait(message)
+            metrics.KAFKA_QUEUE_DEPTH.set(self._queue.qsize())
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        try:
+            await asyncio.wait_for(
+                self._queue.put(message), settings.kafka_enqueue_timeout
+            )
+            metrics.KAFKA_QUEUE_DEPTH.set(self._queue.qsize())
+            return True
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            metrics.KAFKA_DROPPED.inc()
+            logger.error("Kafka queue is full, incident event dropped")
+            return False
+
+    async def publish_batch(self, messages_data: List[Dict[str, Any]]):
+        """отправить пачку сразу, минуя очередь, и дождаться подтверждения брокера
+
+        ошибка брокера пробрасывается наружу - так outbox relay не удалит
+        неотправленные события
+        """
+
+        if self._broker is None:
+            raise RuntimeError("Kafka producer is not connected")
+        batch = [self._encode(message_data) for message_data in messages_data]
+        started = time.perf_counter()
+        await self._broker.send_batch(settings.kafka_incidents_topic, batch)
+        metrics.observe_kafka_publish("outbox", time.perf_counter() - started)
+
+    @staticmethod
+    def _encode(message_data: Dict[str, Any]) -> KafkaMessage:
+        """ключ - id инцидента, чтобы события одного инцидента шли в одну партицию
+
+        у событий outbox id инцидента в incident_id, у остальных сообщений - в id
+        """
+
+        incident_id = message_data.get("incident_id") or message_data.get("id")
+        return (
+            str(incident_id).encode() if incident_id else None,
+            json.dumps(message_data, default=str).encode(),
+        )
+
+    def _take_batch(self, batch: List[KafkaMessage]) -> List[KafkaMessage]:
+        """добрать из очереди без ожидания до kafka_batch_size"""
+
+        while len(batch) < settings.kafka_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        metrics.KAFKA_QUEUE_DEPTH.set(self._queue.qsize())
+        return batch
+
+    async def _flush_loop(self):
+        linger = settings.kafka_linger_ms / 1000
+        while True:
+            batch = self._take_batch([await self._queue.get()])
+            if len(batch) < settings.kafka_batch_size and linger:
+                await asyncio.sleep(linger)
+                batch = self._take_batch(batch)
+            await self._send(batch)
+
+    async def _send(self, batch: List[KafkaMessage]):
+        """отправить пачку с несколькими повторами, пока очередь копится - это backpressure"""
+
+        for attempt in range(settings.kafka_send_retries + 1):
+            started = time.perf_counter()
+            try:
+                await self._broker.send_batch(settings.kafka_incidents_topic, batch)
+                metrics.observe_kafka_publish("queue", time.perf_counter() - started)
+                return
+            except Exception as e:
+                logger.warning("Kafka send failed (attempt %s): %s", attempt + 1, e)
+                await asyncio.sleep(0.1 * 2 ** attempt)
+
+        self.dropped += len(batch)
+        metrics.KAFKA_DROPPED.inc(len(batch))
+        logger.error("Kafka batch of %s events dropped", len(batch))
+
+
+class KafkaConsumerService:
+    """чтение и обработка сообщений из Kafka топика
+
+    сообщения раскладываются по kafka_consumer_workers воркерам по хэшу ключа
+    (id инцидента), так события одного инцидента обрабатываются по порядку,
+    а разные инциденты - параллельно. число сообщений в работе ограничено
+    kafka_consumer_max_in_flight. оффсет партиции коммитится пачкой и только
+    до первого ещё не обработанного сообщения. сообщение считается
+    обработанным, когда уведомление ушло в Telegram, а не когда встало в
+    очередь отправки - так после падения оно придёт снова (at-least-once)
+    """
+
+    def __init__(
+        self,
+        client: Optional[KafkaConsumerClient] = None,
+        telegram_service: Optional[Any] = None,
+    ):
+        self._client = client
         self._telegram_service = telegram_service
+        # уведомления, ушедшие в очередь Telegram, но ещё не доставленные
+        self._deliveries: set = set()
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        # (topic, partition) -> оффсеты в работе и следующий за последним выданным
+        self._pending: Dict[Tuple[str, int], set] = {}
+        self._next_offsets: Dict[Tuple[str, int], int] = {}
+        self._committed: Dict[Tuple[str, int], int] = {}
+        self.processed = 0
+        self.failed = 0
+
+    async def initialize(self):
+        if self._telegram_service is None:
+            from src.services.telegram_service import telegram_service
+            self._telegram_service = telegram_service
+
+        if self._client is None:
+            if not settings.kafka_bootstrap_servers:
+                raise RuntimeError("Kafka is not configured")
+            self._client = AIOKafkaConsumerClient()
+        await self._client.start()
+
+        self._in_flight = asyncio.Semaphore(settings.kafka_consumer_max_in_flight)
+        self._queues = [asyncio.Queue() for _ in range(settings.kafka_consumer_workers)]
+        self._workers = [asyncio.create_task(self._worker(q)) for q in self._queues]
 
     async def close(self):
-        pass
+        # ждём, пока воркеры доделают выданное, и коммитим напоследок
+        for queue in self._queues:
+            await queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # недоставленное за это время не коммитится и придёт снова после рестарта
+        if self._deliveries:
+            await asyncio.wait(self._deliveries, timeout=settings.telegram_timeout)
+
+        if self._client:
+            await self._commit()
+            await self._client.stop()
 
     async def consume_incidents(self):
-        pass
+        """основной цикл чтения, крутится пока не отменят"""
+
+        last_commit = time.monotonic()
+        while True:
+            records = await self._client.getmany(
+                max_records=settings.kafka_consumer_batch_size,
+                timeout=settings.kafka_consumer_poll_timeout,
+            )
+            for record in records:
+                await self._dispatch(record)
+
+            if time.monotonic() - last_commit >= settings.kafka_consumer_commit_interval:
+                await self._commit()
+                last_commit = time.monotonic()
+
+    async def _dispatch(self, record: KafkaRecord):
+        """отдать сообщение воркеру по ключу, ждём если в работе слишком много"""
+
+        await self._in_flight.acquire()
+
+        tp = (record.topic, record.partition)
+        self._pending.setdefault(tp, set()).add(record.offset)
+        self._next_offsets[tp] = record.offset + 1
+
+        key = record.key if record.key is not None else str(record.partition).encode()
+        self._queues[zlib.crc32(key) % len(self._queues)].put_nowait(record)
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            record: KafkaRecord = await queue.get()
+            try:
+                delivery = await self._handle(record)
+            except Exception as e:
+                self._failed(record, e)
+                self._done(record)
+            else:
+                if delivery is None:
+                    self.processed += 1
+                    self._done(record)
+                else:
+                    # воркер не ждёт Telegram: пока чат копит дайджест, берём следующие
+                    self._deliveries.add(delivery)
+                    delivery.add_done_callback(
+                        functools.partial(self._delivered, record)
+                    )
+            finally:
+                queue.task_done()
+
+    async def _handle(self, record: KafkaRecord) -> Optional[asyncio.Future]:
+        data = json.loads(record.value)
+        # события outbox приходят конвертом с event_type, инцидент - в incident
+        incident_data = data.get("incident", data)
+        return await self._telegram_service.send_incident_notification(incident_data)
+
+    def _delivered(self, record: KafkaRecord, delivery: asyncio.Future):
+        self._deliveries.discard(delivery)
+        if delivery.cancelled():
+            # остановка до отправки: оффсет остаётся незакоммиченным
+            self._in_flight.release()
+            return
+        error = delivery.exception()
+        if error is None:
+            self.processed += 1
+        else:
+            self._failed(record, error)
+        self._done(record)
+
+    def _failed(self, record: KafkaRecord, error: BaseException):
+        # at-least-once не значит "навсегда": битое сообщение не держит партицию
+        self.failed += 1
+        logger.error(
+            "Failed to process %s[%s]@%s: %s",
+            record.topic,
+            record.partition,
+            record.offset,
+            error,
+        )
+
+    def _done(self, record: KafkaRecord):
+        """сообщение обработано, его оффсет можно коммитить"""
+
+        self._pending[(record.topic, record.partition)].discard(record.offset)
+        self._in_flight.release()
+
+    async def _commit(self):
+        """закоммитить оффсеты, до которых всё обработано"""
+
+        offsets = {}
+        for tp, next_offset in self._next_offsets.items():
+            pending = self._pending.get(tp)
+            offset = min(pending) if pending else next_offset
+            if self._committed.get(tp) != offset:
+                offsets[tp] = offset
+
+        if not offsets:
+            return
+        try:
+            await self._client.commit(offsets)
+            self._committed.update(offsets)
+        except Exception as e:
+            logger.error("Kafka offsets commit failed: %s", e)
 
 
 kafka_producer = KafkaProducerService()
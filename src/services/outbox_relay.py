@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal
+from src.domain.models import IncidentEvent
+from src.infrastructure import metrics
+from src.services.kafka_service import KafkaProducerService, kafka_producer
+from src.services.outbox_repository import OutboxRepository
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """перенос событий из outbox-таблицы в кафку
+
+    пачка забирается через FOR UPDATE SKIP LOCKED, поэтому несколько релеев
+    (воркеры api, отдельные процессы) работают параллельно без дублей.
+    события одного инцидента забирает только один релей за раз, так они
+    уходят в кафку по порядку. строки удаляются в той же транзакции только
+    после подтверждения брокера, без брокера релей не запускается
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = AsyncSessionLocal,
+        producer: KafkaProducerService = kafka_producer,
+    ):
+        self._session_factory = session_factory
+        self._producer = producer
+        self._task: asyncio.Task | None = None
+
+        # метрики релея
+        self.published_total = 0
+        self.batches_total = 0
+        self.errors_total = 0
+        self.last_lag_seconds = 0.0
+        self._started_at = time.monotonic()
+
+    @property
+    def throughput(self) -> float:
+        """среднее число опубликованных событий в секунду с момента старта"""
+
+        elapsed = time.monotonic() - self._started_at
+        return self.published_total / elapsed if elapsed > 0 else 0.0
+
+    async def run_once(self) -> int:
+        """опубликовать одну пачку, вернуть её размер"""
+
+        if not self._producer.connected:
+            raise RuntimeError("Kafka producer is not connected")
+
+        async with self._session_factory() as session:
+            session: AsyncSession
+            async with session.begin():
+                repository = OutboxRepository(session)
+                events = await repository.claim_batch(settings.outbox_batch_size)
+                if not events:
+                    return 0
+
+                await self._producer.publish_batch([self._message(e) for e in events])
+                await repository.delete_events([e.id for e in events])
+
+        self.published_total += len(events)
+        self.batches_total += 1
+        self.last_lag_seconds = (
+            datetime.utcnow() - events[0].created_at
+        ).total_seconds()
+        metrics.OUTBOX_PUBLISHED.inc(len(events))
+        metrics.OUTBOX_LAG.set(self.last_lag_seconds)
+        return len(events)
+
+    @staticmethod
+    def _message(event: IncidentEvent) -> Dict[str, Any]:
+        """событие с типом, ключ сообщения в кафке - incident_id"""
+
+        return {
+            "event_id": event.id,
+            "event_type": event.event_type,
+            "incident_id": event.incident_id,
+            "created_at": event.created_at,
+            "incident": event.payload,
+        }
+
+    async def run(self):
+        """крутить релей, пока не отменят"""
+
+        while True:
+            try:
+                published = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors_total += 1
+                metrics.OUTBOX_ERRORS.inc()
+                logger.error("Outbox relay error: %s", e)
+                published = 0
+
+            # полная пачка - скорее всего есть ещё, забираем сразу
+            if published < settings.outbox_batch_size:
+                await asyncio.sleep(settings.outbox_poll_interval)
+
+    def start(self) -> bool:
+        """запустить релей фоновой задачей
+
+        без брокера не запускается: события остаются в outbox до появления кафки
+        """
+
+        if not self._producer.connected:
+            logger.warning("Kafka is not configured, outbox relay is not started")
+            return False
+        self._task = asyncio.create_task(self.run())
+        return True
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+outbox_relay = OutboxRelay()
@@ -0,0 +1,104 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from src.domain.models import IncidentEvent
+
+
+class OutboxRepository:
+    """Репозиторий outbox-таблицы событий инцидентов."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def add_events(self, event_type: str, payloads: List[Dict[str, Any]]):
+        """записать события в текущей транзакции (multi-row INSERT)"""
+
+        if not payloads:
+            return
+
+        now = datetime.utcnow()
+        await self.db.execute(
+            insert(IncidentEvent),
+            [
+                {
+                    "incident_id": payload["id"],
+                    "event_type": event_type,
+                    "payload": payload,
+                    "created_at": now,
+                }
+                for payload in payloads
+            ],
+        )
+
+    async def claim_batch(self, limit: int) -> List[IncidentEvent]:
+        """забрать пачку событий, строки занятые другими релеями пропускаются
+
+        первые limit свободных строк блокируются через FOR UPDATE SKIP LOCKED,
+        поэтому параллельные релеи получают разные пачки. событие отдаётся,
+        только если все более ранние события его инцидента в той же пачке:
+        иначе более раннее держит другой релей и порядок в кафке нарушился бы
+        """
+
+        candidates = (
+            select(IncidentEvent.id, IncidentEvent.incident_id)
+            .order_by(IncidentEvent.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .cte("candidates")
+            .prefix_with("MATERIALIZED")
+        )
+        # предыдущее событие того же инцидента в пачке, 0 - это первое
+        ranked = select(
+            candidates.c.id,
+            candidates.c.incident_id,
+            func.lag(candidates.c.id, 1, 0)
+            .over(partition_by=candidates.c.incident_id, order_by=candidates.c.id)
+            .label("previous_id"),
+        ).subquery("ranked")
+        # между ним и текущим есть событие не из пачки - его держит другой релей.
+        # проверка - короткий диапазон по индексу (incident_id, id), а не весь outbox
+        earlier = aliased(IncidentEvent)
+        gap = (
+            select(earlier.id)
+            .where(
+                earlier.incident_id == ranked.c.incident_id,
+                earlier.id > ranked.c.previous_id,
+                earlier.id < ranked.c.id,
+            )
+            .exists()
+        )
+        # после первого пропуска ждут и все более поздние события инцидента
+        blocked = select(
+            ranked.c.id,
+            func.bool_or(gap)
+            .over(partition_by=ranked.c.incident_id, order_by=ranked.c.id)
+            .label("blocked"),
+        ).subquery("blocked")
+        result = await self.db.scalars(
+            select(IncidentEvent)
+            .join(blocked, IncidentEvent.id == blocked.c.id)
+            .where(~blocked.c.blocked)
+            .order_by(IncidentEvent.id)
+        )
+        return list(result.all())
+
+    async def delete_events(self, event_ids: List[int]):
+        """удалить опубликованные события"""
+
+        await self.db.execute(
+            delete(IncidentEvent).where(IncidentEvent.id.in_(event_ids))
+        )
+
+    async def get_stats(self) -> tuple[int, datetime | None]:
+        """сколько событий ждёт отправки и когда создано самое старое"""
+
+        pending, oldest = (
+            await self.db.execute(
+                select(func.count(IncidentEvent.id), func.min(IncidentEvent.created_at))
+            )
+        ).one()
+        return pending, oldest
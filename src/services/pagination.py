@@ -0,0 +1,28 @@
+import base64
+import binascii
+from datetime import datetime
+from uuid import UUID
+
+
+class InvalidCursorError(ValueError):
+    """невалидный курсор пагинации"""
+
+
+def encode_cursor(created_at: datetime, incident_id: UUID) -> str:
+    """упаковать позицию (created_at, id) в непрозрачный курсор"""
+
+    raw = f"{created_at.isoformat()}|{incident_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """распаковать курсор обратно в (created_at, id)"""
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, incident_id = (
+            base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        )
+        return datetime.fromisoformat(created_at), UUID(incident_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
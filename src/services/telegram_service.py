@@ -1,25 +1,310 @@
-from typing import Dict, Any
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
 
+import httpx
+
+from src.core.config import settings
 from src.services.kafka_service import kafka_producer
 
+logger = logging.getLogger(__name__)
+
+# ошибки, после которых имеет смысл повторить отправку
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TelegramDeliveryError(Exception):
+    """уведомление не доставлено: Telegram отклонил его или кончились повторы"""
+
+
+class TokenBucket:
+    """token bucket на rate токенов в секунду с запасом capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """взять токен, вернуть сколько секунд надо подождать перед использованием"""
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        """вернуть токен, взятый без отправки"""
+
+        self.tokens = min(self.capacity, self.tokens + 1)
 
-class TelegramService:
-    """получение сообщений из Telegram и отправка уведомлений"""
+
+class _Delivery:
+    """доставка одного уведомления во все чаты, future завершается последним чатом"""
+
+    def __init__(self, chats: int):
+        self.remaining = chats
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def sent(self):
+        self.remaining -= 1
+        if not self.remaining and not self.future.done():
+            self.future.set_result(None)
+
+    def failed(self, error: Exception):
+        if not self.future.done():
+            self.future.set_exception(error)
+
+
+class _ChatState:
+    """очередь уведомлений одного чата"""
 
     def __init__(self):
+        self.bucket = TokenBucket(
+            settings.telegram_chat_rate, settings.telegram_chat_burst
+        )
+        self.pending: List[Tuple[Dict[str, Any], _Delivery]] = []
+        # (когда можно повторить, порядковый номер, попытка, текст, доставки)
+        self.retries: List[Tuple[float, int, int, str, List[_Delivery]]] = []
+        self.seq = itertools.count()
+        # после 429 Telegram не принимает ничего в этот чат до этого момента
+        self.paused_until = 0.0
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class TelegramService:
+    """получение сообщений из Telegram и отправка уведомлений
+
+    у каждого чата свой token bucket. пока чат ждёт токен, новые инциденты
+    копятся и уходят одним дайджестом, так шторм алертов не упирается в лимиты
+    Telegram. неудачные отправки повторяются с экспоненциальной задержкой,
+    а 429 с retry_after ставит на паузу весь чат.
+    send_incident_notification возвращает future, который завершается, когда
+    уведомление ушло во все чаты - по нему консьюмер коммитит оффсет
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
         self._kafka_producer = kafka_producer
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._chats: Dict[str, _ChatState] = {}
+        self.sent = 0
+        self.dropped = 0
 
     async def initialize(self):
-        pass
+        # один клиент с keep-alive пулом на весь процесс
+        self._client = httpx.AsyncClient(
+            base_url=f"{settings.telegram_api_url}/bot{settings.telegram_bot_token}",
+            timeout=settings.telegram_timeout,
+            transport=self._transport,
+            limits=httpx.Limits(
+                max_connections=settings.telegram_max_connections,
+                max_keepalive_connections=settings.telegram_max_connections,
+            ),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """клиент создан, и есть токен и чаты для уведомлений"""
+
+        return bool(
+            settings.telegram_bot_token
+            and settings.telegram_chat_ids
+            and self._client is not None
+        )
 
     async def close(self):
-        pass
+        for state in self._chats.values():
+            if state.task:
+                state.task.cancel()
+            # не доставленное так и остаётся не доставленным
+            for _, delivery in state.pending:
+                delivery.future.cancel()
+            for *_, deliveries in state.retries:
+                for delivery in deliveries:
+                    delivery.future.cancel()
+        await asyncio.gather(
+            *(s.task for s in self._chats.values() if s.task),
+            return_exceptions=True,
+        )
+        self._chats = {}
+        if self._client:
+            await self._client.aclose()
+            self._client = None
 
     async def handle_telegram_message(self, message_data: Dict[str, Any]):
         await self._kafka_producer.publish_incident(message_data)
 
-    async def send_incident_notification(self, incident_data: Dict[str, Any]):
-        pass
+    async def send_incident_notification(
+        self, incident_data: Dict[str, Any]
+    ) -> Optional[asyncio.Future]:
+        """поставить уведомление в очередь чатов, отправка идёт в фоне
+
+        возвращает future доставки (с TelegramDeliveryError при неудаче) или
+        None, если уведомления выключены
+        """
+
+        if not self.enabled:
+            return None
+
+        delivery = _Delivery(len(settings.telegram_chat_ids))
+        for chat_id in settings.telegram_chat_ids:
+            state = self._chats.get(chat_id)
+            if state is None:
+                state = self._chats[chat_id] = _ChatState()
+                state.task = asyncio.create_task(self._chat_loop(chat_id, state))
+            state.pending.append((incident_data, delivery))
+            state.wakeup.set()
+        return delivery.future
+
+    async def _chat_loop(self, chat_id: str, state: _ChatState):
+        while True:
+            await self._wait_for_work(state)
+
+            # retry_after относится ко всему чату, а не к одному сообщению
+            pause = state.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            # ждём токен; за это время pending успевает набрать дайджест
+            delay = state.bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+
+            if state.retries and state.retries[0][0] <= time.monotonic():
+                _, _, attempt, text, deliveries = heapq.heappop(state.retries)
+            elif state.pending:
+                text = self._render([incident for incident, _ in state.pending])
+                deliveries = [delivery for _, delivery in state.pending]
+                attempt = 0
+                state.pending = []
+            else:
+                state.bucket.refund()
+                continue
+
+            try:
+                await self._send(chat_id, state, text, attempt, deliveries)
+            except Exception:
+                # задача чата живёт, пока живёт сервис: иначе доставки не завершатся
+                logger.exception("Unexpected Telegram send error for chat %s", chat_id)
+                self._retry(chat_id, state, text, attempt, deliveries)
+
+    async def _wait_for_work(self, state: _ChatState):
+        """ждать новых уведомлений или наступления ближайшего повтора"""
+
+        while not state.pending:
+            timeout = None
+            if state.retries:
+                timeout = state.retries[0][0] - time.monotonic()
+                if timeout <= 0:
+                    return
+            state.wakeup.clear()
+            try:
+                await asyncio.wait_for(state.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+
+    async def _send(
+        self,
+        chat_id: str,
+        state: _ChatState,
+        text: str,
+        attempt: int,
+        deliveries: List[_Delivery],
+    ):
+        retry_after = None
+        try:
+            response = await self._client.post(
+                "/sendMessage", json={"chat_id": chat_id, "text": text}
+            )
+            if response.status_code == 200:
+                self.sent += 1
+                for delivery in deliveries:
+                    delivery.sent()
+                return
+            if response.status_code not in RETRYABLE_STATUSES:
+                self.dropped += 1
+                logger.error(
+                    "Telegram rejected message for chat %s: %s %s",
+                    chat_id,
+                    response.status_code,
+                    response.text,
+                )
+                self._fail(deliveries, f"rejected with {response.status_code}")
+                return
+            if response.status_code == 429:
+                retry_after = self._retry_after(response)
+        except httpx.HTTPError as e:
+            logger.warning("Telegram send error for chat %s: %s", chat_id, e)
+
+        self._retry(chat_id, state, text, attempt, deliveries, retry_after)
+
+    def _retry(
+        self,
+        chat_id: str,
+        state: _ChatState,
+        text: str,
+        attempt: int,
+        deliveries: List[_Delivery],
+        retry_after: Optional[float] = None,
+    ):
+        """повторить с паузой retry_after или backoff, после лимита попыток - отказ"""
+
+        if attempt >= settings.telegram_max_retries:
+            self.dropped += 1
+            logger.error("Telegram message for chat %s dropped after retries", chat_id)
+            self._fail(deliveries, "dropped after retries")
+            return
+
+        if retry_after:
+            state.paused_until = time.monotonic() + retry_after
+        delay = retry_after or settings.telegram_retry_base_delay * 2 ** attempt
+        heapq.heappush(
+            state.retries,
+            (time.monotonic() + delay, next(state.seq), attempt + 1, text, deliveries),
+        )
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        """retry_after из ответа 429, None если тело не json или поля нет"""
+
+        try:
+            value = response.json().get("parameters", {}).get("retry_after")
+            return float(value) if value else None
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    @staticmethod
+    def _fail(deliveries: List[_Delivery], reason: str):
+        for delivery in deliveries:
+            delivery.failed(TelegramDeliveryError(reason))
+
+    @staticmethod
+    def _render(incidents: List[Dict[str, Any]]) -> str:
+        """одно уведомление или дайджест по источникам"""
+
+        if len(incidents) == 1:
+            incident = incidents[0]
+            text = (
+                f"Инцидент {incident.get('id')}\n"
+                f"Статус: {incident.get('status')}\n"
+                f"Источник: {incident.get('source')}"
+            )
+            if incident.get("description"):
+                text += f"\n\n{incident['description'][:1000]}"
+            return text
+
+        by_source = Counter(incident.get("source") for incident in incidents)
+        lines = [f"{len(incidents)} событий по инцидентам:"]
+        lines += [f"{source}: {count}" for source, count in by_source.most_common()]
+        return "\n".join(lines)
 
 
 telegram_service = TelegramService()
@@ -0,0 +1,69 @@
+"""общие фикстуры тестов на живой базе
+
+нужна база с применёнными миграциями в TEST_DATABASE_URL, без неё такие
+тесты пропускаются
+"""
+
+import os
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.core.config import Settings, settings
+from src.core.database import get_db, get_read_db
+from src.main import app
+
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+async def engine():
+    if not DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_async_engine(Settings.to_asyncpg_uri(DATABASE_URL))
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+@pytest.fixture
+async def db(engine):
+    """сессия внутри транзакции, которая откатывается после теста"""
+
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        session = AsyncSession(
+            bind=connection,
+            expire_on_commit=False,
+            join_transaction_mode="create_savepoint",
+        )
+        try:
+            yield session
+        finally:
+            await session.close()
+            await transaction.rollback()
+
+
+@pytest.fixture
+async def client(db):
+    """клиент api поверх сессии db, без lifespan: redis и kafka не подключаются"""
+
+    async def override():
+        return db
+
+    app.dependency_overrides[get_db] = override
+    app.dependency_overrides[get_read_db] = override
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://test",
+            headers={"X-Access-Key": settings.x_access_key},
+        ) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional
+
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def delete(self, *keys):
+        self.commands.append((self.redis.delete, keys))
+
+    def incr(self, key):
+        self.commands.append((self.redis.incr, (key,)))
+
+    def publish(self, channel, message):
+        self.commands.append((self.redis.publish, (channel, message)))
+
+    async def execute(self):
+        return [await command(*args) for command, args in self.commands]
+
+
+class FakeRedis:
+    """подмена redis.asyncio.Redis для команд, которыми пользуется CacheClient
+
+    TTL не соблюдается: тестам важно, что поколения, а не срок жизни,
+    убирают устаревшие страницы
+    """
+
+    def __init__(self):
+        self.data: Dict[str, bytes] = {}
+        self.gets = 0
+
+    async def ping(self):
+        return True
+
+    async def get(self, key: str) -> Optional[bytes]:
+        self.gets += 1
+        return self.data.get(key)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key: str, value, nx: bool = False, px: int | None = None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    async def setex(self, key: str, ttl: int, value):
+        return await self.set(key, value)
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key: str) -> int:
+        value = int(self.data.get(key, b"0")) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    async def publish(self, channel: str, message) -> int:
+        return 0
+
+    async def eval(self, script: str, numkeys: int, *args):
+        # только _RELEASE_LOCK_SCRIPT: удалить лок, если он наш
+        key, token = args
+        if self.data.get(key) == token.encode():
+            return await self.delete(key)
+        return 0
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    async def close(self, close_connection_pool: bool = False):
+        pass
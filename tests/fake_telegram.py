@@ -0,0 +1,51 @@
+import time
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+
+
+class FakeBotApi:
+    """подмена Bot API: запоминает sendMessage и отвечает по сценарию
+
+    ответы из replies выдаются по очереди, когда они кончаются - 200
+    """
+
+    def __init__(self, token: str):
+        self.messages: List[Dict[str, Any]] = []
+        self.replies: List[Response] = []
+        self.app = FastAPI()
+        self.app.post(f"/bot{token}/sendMessage")(self.send_message)
+
+    async def send_message(self, request: Request) -> Response:
+        body = await request.json()
+        self.messages.append({**body, "at": time.monotonic()})
+        if self.replies:
+            return self.replies.pop(0)
+        return JSONResponse({"ok": True, "result": {"message_id": len(self.messages)}})
+
+    def reply_too_many_requests(self, retry_after: float):
+        self.replies.append(
+            JSONResponse(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests",
+                    "parameters": {"retry_after": retry_after},
+                },
+                status_code=429,
+            )
+        )
+
+    def reply_error(self, status_code: int):
+        self.replies.append(
+            JSONResponse(
+                {"ok": False, "error_code": status_code, "description": "error"},
+                status_code=status_code,
+            )
+        )
+
+    def reply_text(self, status_code: int, text: str):
+        """ответ не в json, как у прокси перед Bot API"""
+
+        self.replies.append(PlainTextResponse(text, status_code=status_code))
@@ -0,0 +1,209 @@
+import asyncio
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.core.config import settings
+from src.infrastructure.cache import CacheClient, CircuitBreaker, SingleFlight
+
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def delete(self, *keys):
+        self.commands.append(("delete", keys))
+
+    def incr(self, key):
+        self.commands.append(("incr", key))
+
+    async def execute(self):
+        await self.redis.on_execute()
+        self.redis.executed += self.commands
+
+
+class FakeRedis:
+    def __init__(self):
+        self.executed = []
+
+    async def ping(self):
+        return True
+
+    def pipeline(self, transaction: bool = True):
+        return FakePipeline(self)
+
+    async def close(self, close_connection_pool: bool = False):
+        pass
+
+    async def on_execute(self):
+        pass
+
+
+def pool_timeout() -> RedisConnectionError:
+    # так BlockingConnectionPool сообщает, что не дождался соединения
+    try:
+        try:
+            raise asyncio.TimeoutError()
+        except asyncio.TimeoutError as e:
+            raise RedisConnectionError("No connection available.") from e
+    except RedisConnectionError as e:
+        return e
+
+
+async def test_single_flight_runs_once():
+    flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(flight.do("key", load) for _ in range(5)))
+
+    assert results == [1] * 5
+    assert calls == 1
+
+
+async def test_single_flight_shares_error():
+    flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+
+    results = await asyncio.gather(
+        *(flight.do("key", load) for _ in range(3)), return_exceptions=True
+    )
+
+    assert [type(result) for result in results] == [RuntimeError] * 3
+
+
+async def test_single_flight_forgets_finished_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    assert await flight.do("key", load) == 1
+    assert await flight.do("key", load) == 2
+
+
+async def test_single_flight_keys_are_independent():
+    flight = SingleFlight()
+
+    async def load(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(
+        flight.do("a", lambda: load("a")), flight.do("b", lambda: load("b"))
+    )
+
+    assert results == ["a", "b"]
+
+
+async def test_single_flight_survives_leader_cancel():
+    flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    leader = asyncio.create_task(flight.do("key", load))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(flight.do("key", load)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    results = await asyncio.gather(*waiters)
+
+    assert leader.cancelled()
+    # первый ждущий загрузил заново, остальные дождались его
+    assert results == [2, 2, 2]
+    assert calls == 2
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3)
+
+    assert [breaker.failure() for _ in range(4)] == [False, False, True, False]
+    assert not breaker.closed
+    assert breaker.trips == 1
+
+
+def test_breaker_success_resets_failures():
+    breaker = CircuitBreaker(failure_threshold=2)
+
+    breaker.failure()
+    breaker.success()
+
+    assert breaker.failure() is False
+    assert breaker.closed
+
+
+def test_breaker_close():
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.failure()
+
+    breaker.close()
+
+    assert breaker.closed
+    assert breaker.failures == 0
+    assert breaker.failure() is True
+    assert breaker.trips == 2
+
+
+async def test_pool_timeout_does_not_open_breaker():
+    cache = CacheClient()
+    cache.client = FakeRedis()
+
+    for _ in range(settings.redis_breaker_failures + 1):
+        cache.report_error(pool_timeout())
+
+    assert cache.breaker.closed
+    assert cache.breaker.failures == 0
+    assert cache.errors == settings.redis_breaker_failures + 1
+
+
+async def test_connection_errors_open_breaker():
+    cache = CacheClient()
+    cache.client = FakeRedis()
+
+    for _ in range(settings.redis_breaker_failures):
+        cache.report_error(RedisConnectionError("Connection refused"))
+
+    assert not cache.breaker.closed
+    await cache.close()
+
+
+async def test_probe_replays_deletes_added_during_replay(monkeypatch):
+    monkeypatch.setattr(settings, "redis_probe_interval", 0)
+    cache = CacheClient()
+    redis = cache.client = FakeRedis()
+    cache.breaker.open()
+    await cache.delete_many(["incident:1"])
+
+    async def delete_during_replay():
+        if not redis.executed:
+            await cache.delete_many(["incident:2"])
+
+    redis.on_execute = delete_during_replay
+    await cache._probe()
+
+    assert cache.breaker.closed
+    assert redis.executed == [("delete", ("incident:1",)), ("delete", ("incident:2",))]
+    assert cache.stats()["redis"]["pending_deletes"] == 0
@@ -0,0 +1,48 @@
+"""планы выборок списка на живом postgres
+
+нужна база с применёнными миграциями в TEST_DATABASE_URL, данные заливаются
+в транзакции и откатываются. без переменной тесты пропускаются
+"""
+
+import asyncio
+import os
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.explain_plans import CASES, check_plans, seed
+from src.core.config import Settings
+
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+ROWS = 50000
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+async def collect_plans() -> dict[str, dict[str, dict]]:
+    engine = create_async_engine(Settings.to_asyncpg_uri(DATABASE_URL))
+    try:
+        async with engine.connect() as connection:
+            transaction = await connection.begin()
+            try:
+                repository = await seed(connection, ROWS)
+                return {
+                    "custom": await check_plans(connection, repository),
+                    "generic": await check_plans(connection, repository, generic=True),
+                }
+            finally:
+                await transaction.rollback()
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def plans():
+    return asyncio.run(collect_plans())
+
+
+@pytest.mark.parametrize("mode", ["custom", "generic"])
+@pytest.mark.parametrize("case", [case[0] for case in CASES])
+def test_list_query_uses_expected_index(plans, mode, case):
+    plan = plans[mode][case]
+    assert plan["ok"], plan
@@ -0,0 +1,39 @@
+import httpx
+import pytest
+
+from src.core.config import settings
+from src.main import app
+from src.services.kafka_service import InMemoryKafkaBroker, kafka_producer
+from src.services.telegram_service import telegram_service
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+async def test_health_reports_disabled_services(client, monkeypatch):
+    monkeypatch.setattr(kafka_producer, "_broker", None)
+    monkeypatch.setattr(telegram_service, "_client", None)
+
+    response = await client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json()["kafka"] == "disabled"
+    assert response.json()["telegram"] == "disabled"
+
+
+async def test_health_reports_connected_services(client, monkeypatch):
+    monkeypatch.setattr(kafka_producer, "_broker", InMemoryKafkaBroker())
+    monkeypatch.setattr(telegram_service, "_client", object())
+    monkeypatch.setattr(settings, "telegram_bot_token", "test-token")
+    monkeypatch.setattr(settings, "telegram_chat_ids", ["100"])
+
+    response = await client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json()["kafka"] == "connected"
+    assert response.json()["telegram"] == "enabled"
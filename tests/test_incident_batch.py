@@ -0,0 +1,78 @@
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from src.core.config import settings
+from src.domain.models import Incident, IncidentEvent, IncidentId
+from src.services.incident_repository import IncidentRepository
+
+
+async def create_batch(client, items: list) -> dict:
+    response = await client.post("/incidents/batch", json=items)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+async def stored(db, ids: list[str]) -> dict[str, Incident]:
+    incidents = await db.scalars(
+        select(Incident).where(Incident.id.in_([uuid.UUID(i) for i in ids]))
+    )
+    return {str(incident.id): incident for incident in incidents}
+
+
+async def test_invalid_items_are_reported_by_index(client, db):
+    result = await create_batch(
+        client,
+        [
+            {"description": "ok", "source": "partner"},
+            {"description": "", "source": "partner"},
+            "not an object",
+            {"description": "bad source", "source": "nowhere"},
+            {"description": "also ok", "status": "in_progress"},
+        ],
+    )
+
+    ids = result["ids"]
+    assert [i is not None for i in ids] == [True, False, False, False, True]
+    assert [error["index"] for error in result["errors"]] == [1, 2, 3]
+
+    incidents = await stored(db, [ids[0], ids[4]])
+    assert incidents[ids[0]].source == "partner"
+    assert incidents[ids[0]].status == "open"
+    assert incidents[ids[4]].source == "unknown"
+    assert incidents[ids[4]].status == "in_progress"
+
+
+@pytest.mark.parametrize("copy", [False, True], ids=["insert", "copy"])
+async def test_batch_is_stored_in_request_order(client, db, monkeypatch, copy):
+    # порог COPY ниже размера пачки - пачка идёт через COPY, иначе multi-row INSERT
+    monkeypatch.setattr(settings, "incidents_batch_copy_threshold", 5 if copy else 100)
+    copies = []
+    copy_rows = IncidentRepository._copy_rows
+
+    async def spy(self, rows):
+        copies.append(len(rows))
+        await copy_rows(self, rows)
+
+    monkeypatch.setattr(IncidentRepository, "_copy_rows", spy)
+    items = [{"description": f"incident {i}", "source": "partner"} for i in range(20)]
+
+    ids = (await create_batch(client, items))["ids"]
+
+    assert copies == ([20] if copy else [])
+    incidents = await stored(db, ids)
+    descriptions = [incidents[i].description for i in ids]
+    assert descriptions == [item["description"] for item in items]
+    # и для COPY: id для поиска по партициям (триггер) и события в outbox
+    keys = [uuid.UUID(i) for i in ids]
+    lookups = select(func.count()).where(IncidentId.id.in_(keys))
+    events = select(func.count()).where(IncidentEvent.incident_id.in_(keys))
+    assert await db.scalar(lookups) == 20
+    assert await db.scalar(events) == 20
+
+
+async def test_empty_batch_is_rejected(client):
+    response = await client.post("/incidents/batch", json=[])
+
+    assert response.status_code == 422
@@ -0,0 +1,247 @@
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from src.core.config import settings
+from src.domain.models import IncidentSource, IncidentStatus
+from src.services.incident_partitions import (
+    IncidentPartitionManager,
+    add_months,
+    month_start,
+    partition_name,
+)
+from src.services.incident_repository import IncidentRepository
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return iter(self.rows)
+
+
+class FakeDatabase:
+    """каталог партиций и журнал SQL вместо postgres"""
+
+    def __init__(self, partitions, pending=(), active=()):
+        self.partitions = set(partitions)
+        self.pending = set(pending)
+        # партиция -> ответы проверки активных строк по очереди, дальше последний
+        self.active = {name: [True] for name in active}
+        self.statements: list[str] = []
+
+    def execute(self, statement) -> FakeResult:
+        sql = str(statement)
+        self.statements.append(sql)
+        if "inhdetachpending" in sql:
+            return FakeResult(sorted(self.pending))
+        if "pg_inherits" in sql:
+            return FakeResult(sorted(self.partitions))
+        return FakeResult([])
+
+    def has_active(self, statement) -> bool:
+        sql = str(statement)
+        self.statements.append(sql)
+        name = sql.split(" FROM ")[1].split()[0]
+        answers = self.active.get(name, [False])
+        return answers.pop(0) if len(answers) > 1 else answers[0]
+
+    def ddl(self) -> list[str]:
+        return [s for s in self.statements if s.startswith(("CREATE", "ALTER"))]
+
+
+class FakeSession:
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, parameters=None):
+        return self.db.execute(statement)
+
+    async def scalar(self, statement, parameters=None):
+        return self.db.has_active(statement)
+
+    async def commit(self):
+        pass
+
+    @asynccontextmanager
+    async def begin(self):
+        yield
+
+    async def connection(self, execution_options=None):
+        return self
+
+
+def manager(db: FakeDatabase) -> IncidentPartitionManager:
+    return IncidentPartitionManager(session_factory=lambda: FakeSession(db))
+
+
+NOW = datetime(2026, 10, 18, 15, 30)
+
+
+@pytest.mark.parametrize(
+    "month, months, expected",
+    [
+        (datetime(2026, 10, 1), 0, datetime(2026, 10, 1)),
+        (datetime(2026, 11, 1), 2, datetime(2027, 1, 1)),
+        (datetime(2026, 1, 1), -1, datetime(2025, 12, 1)),
+        (datetime(2026, 10, 1), -24, datetime(2024, 10, 1)),
+        (datetime(2026, 12, 1), 1, datetime(2027, 1, 1)),
+    ],
+)
+def test_add_months(month, months, expected):
+    assert add_months(month, months) == expected
+
+
+def test_month_start_and_name():
+    month = month_start(NOW)
+
+    assert month == datetime(2026, 10, 1)
+    assert partition_name(month) == "incidents_p202610"
+
+
+async def test_ensure_creates_missing_partitions(monkeypatch):
+    monkeypatch.setattr(settings, "incidents_partitions_ahead", 3)
+    db = FakeDatabase({"incidents_p202610", "incidents_p202611"})
+
+    created = await manager(db).ensure_partitions(now=NOW)
+
+    assert created == ["incidents_p202612", "incidents_p202701"]
+    assert db.ddl() == [
+        "CREATE TABLE IF NOT EXISTS incidents_p202612 PARTITION OF incidents "
+        "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')",
+        "CREATE TABLE IF NOT EXISTS incidents_p202701 PARTITION OF incidents "
+        "FOR VALUES FROM ('2027-01-01') TO ('2027-02-01')",
+    ]
+    # каждый CREATE идёт со своим lock_timeout
+    lock_timeouts = [s for s in db.statements if "lock_timeout" in s]
+    assert len(lock_timeouts) == 2
+
+
+@pytest.fixture
+def retention(monkeypatch):
+    monkeypatch.setattr(settings, "incidents_retention_months", 24)
+    monkeypatch.setattr(settings, "incidents_archive_schema", "incidents_archive")
+
+
+async def test_archive_respects_retention_cutoff(retention):
+    # граница - 2024-10-01: сентябрь 2024 целиком старше, октябрь ещё нет
+    db = FakeDatabase({"incidents_p202408", "incidents_p202409", "incidents_p202410"})
+
+    archived = await manager(db).archive_partitions(now=NOW)
+
+    assert archived == ["incidents_p202408", "incidents_p202409"]
+    assert db.ddl() == [
+        "ALTER TABLE incidents DETACH PARTITION incidents_p202408 CONCURRENTLY",
+        "ALTER TABLE incidents_p202408 SET SCHEMA incidents_archive",
+        "ALTER TABLE incidents DETACH PARTITION incidents_p202409 CONCURRENTLY",
+        "ALTER TABLE incidents_p202409 SET SCHEMA incidents_archive",
+    ]
+    assert (
+        "DELETE FROM incident_ids i USING incidents_p202408 p WHERE i.id = p.id"
+        in db.statements
+    )
+
+
+async def test_partition_with_active_incidents_is_kept(retention):
+    db = FakeDatabase({"incidents_p202409"}, active={"incidents_p202409"})
+
+    assert await manager(db).archive_partitions(now=NOW) == []
+    assert db.ddl() == []
+
+
+async def test_reattach_when_active_rows_appear_during_detach(retention):
+    db = FakeDatabase({"incidents_p202409"})
+    db.active["incidents_p202409"] = [False, True]
+
+    assert await manager(db).archive_partitions(now=NOW) == []
+    assert db.ddl() == [
+        "ALTER TABLE incidents DETACH PARTITION incidents_p202409 CONCURRENTLY",
+        "ALTER TABLE incidents ATTACH PARTITION incidents_p202409 "
+        "FOR VALUES FROM ('2024-09-01') TO ('2024-10-01')",
+    ]
+
+
+async def test_interrupted_detach_is_finalized(retention):
+    db = FakeDatabase({"incidents_p202409"}, pending={"incidents_p202409"})
+
+    assert await manager(db).archive_partitions(now=NOW) == ["incidents_p202409"]
+    assert db.ddl()[0] == (
+        "ALTER TABLE incidents DETACH PARTITION incidents_p202409 FINALIZE"
+    )
+
+
+async def test_retention_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "incidents_retention_months", 0)
+    db = FakeDatabase({"incidents_p200001"})
+
+    assert await manager(db).archive_partitions(now=NOW) == []
+    assert db.statements == []
+
+
+OLD = "incidents_p200001"
+
+
+@pytest.fixture
+async def old_partition(engine, retention):
+    """партиция января 2000 с закрытым инцидентом, после теста удаляется"""
+
+    incident_id = uuid.uuid4()
+    async with engine.begin() as connection:
+        await connection.execute(text(
+            f"CREATE TABLE {OLD} PARTITION OF incidents "
+            "FOR VALUES FROM ('2000-01-01') TO ('2000-02-01')"
+        ))
+        await connection.execute(
+            text(
+                "INSERT INTO incidents (id, description, status, source, "
+                "created_at, updated_at) VALUES (:id, 'old', 'closed', 'partner', "
+                "'2000-01-15', '2000-01-15')"
+            ),
+            {"id": incident_id},
+        )
+    yield incident_id
+    async with engine.begin() as connection:
+        # если архивации не было, триггеры вернут счётчики и incident_ids
+        await connection.execute(
+            text("DELETE FROM incidents WHERE id = :id"), {"id": incident_id}
+        )
+        await connection.execute(text(f"DROP TABLE IF EXISTS {OLD}"))
+        await connection.execute(text(f"DROP TABLE IF EXISTS incidents_archive.{OLD}"))
+
+
+async def closed_partner_count(session) -> int:
+    return await IncidentRepository(session).estimate_count(
+        IncidentStatus.CLOSED, IncidentSource.PARTNER
+    )
+
+
+async def test_archive_on_database(old_partition, session_factory):
+    async with session_factory() as session:
+        # поиск по id идёт через incident_ids
+        assert await IncidentRepository(session).get_by_id(old_partition)
+        counted = await closed_partner_count(session)
+
+    # граница 2000-02-01: моложе партиции в тестовой базе не трогаются
+    archived = await IncidentPartitionManager(session_factory).archive_partitions(
+        now=datetime(2002, 2, 1)
+    )
+
+    assert archived == [OLD]
+    async with session_factory() as session:
+        assert await IncidentRepository(session).get_by_id(old_partition) is None
+        assert await closed_partner_count(session) == counted - 1
+        schema = await session.scalar(
+            text("SELECT schemaname FROM pg_tables WHERE tablename = :name"),
+            {"name": OLD},
+        )
+        assert schema == "incidents_archive"
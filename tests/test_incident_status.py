@@ -0,0 +1,88 @@
+import uuid
+
+import pytest
+
+from src.domain.models import IncidentSource, IncidentStatus
+from src.services.incident_repository import IncidentRepository
+
+
+@pytest.fixture
+async def incidents(db) -> list[uuid.UUID]:
+    rows = await IncidentRepository(db).bulk_create(
+        [(f"incident {i}", IncidentSource.MONITORING, None) for i in range(3)]
+    )
+    return [row["id"] for row in rows]
+
+
+async def status_of(client, incident_id: uuid.UUID) -> str:
+    response = await client.get(f"/incidents/{incident_id}")
+    return response.json()["status"]
+
+
+async def test_bulk_update_returns_updated_ids(client, incidents):
+    missing = uuid.uuid4()
+
+    response = await client.patch(
+        "/incidents/status",
+        json={"ids": [str(i) for i in [*incidents, missing]], "status": "closed"},
+    )
+
+    assert response.status_code == 200
+    assert set(response.json()["updated"]) == {str(i) for i in incidents}
+    for incident_id in incidents:
+        assert await status_of(client, incident_id) == "closed"
+
+
+async def test_bulk_update_skips_unexpected_status(client, db, incidents):
+    first, *rest = incidents
+    await IncidentRepository(db).update_status(first, IncidentStatus.IN_PROGRESS)
+
+    response = await client.patch(
+        "/incidents/status",
+        json={
+            "ids": [str(i) for i in incidents],
+            "status": "resolved",
+            "expected_status": "open",
+        },
+    )
+
+    assert set(response.json()["updated"]) == {str(i) for i in rest}
+    assert await status_of(client, first) == "in_progress"
+
+
+async def test_bulk_update_unknown_ids(client):
+    response = await client.patch(
+        "/incidents/status", json={"ids": [str(uuid.uuid4())], "status": "closed"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["updated"] == []
+
+
+async def test_update_with_expected_status(client, incidents):
+    response = await client.patch(
+        f"/incidents/{incidents[0]}/status",
+        json={"status": "in_progress", "expected_status": "open"},
+    )
+
+    assert response.status_code == 200
+    assert await status_of(client, incidents[0]) == "in_progress"
+
+
+async def test_update_conflict(client, incidents):
+    response = await client.patch(
+        f"/incidents/{incidents[0]}/status",
+        json={"status": "closed", "expected_status": "resolved"},
+    )
+
+    assert response.status_code == 409
+    assert await status_of(client, incidents[0]) == "open"
+
+
+async def test_update_missing_incident(client):
+    response = await client.patch(
+        f"/incidents/{uuid.uuid4()}/status",
+        json={"status": "closed", "expected_status": "open"},
+    )
+
+    assert response.status_code == 404
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from src.core.config import settings
+from src.services.kafka_service import (
+    InMemoryKafkaBroker,
+    InMemoryKafkaConsumer,
+    KafkaConsumerService,
+    KafkaProducerService,
+)
+
+
+class FakeTelegram:
+    """запоминает уведомления, доставку завершает тест"""
+
+    def __init__(self):
+        self.notified = []
+        self.deliveries = []
+
+    async def send_incident_notification(self, incident_data):
+        self.notified.append(incident_data)
+        delivery = asyncio.get_running_loop().create_future()
+        self.deliveries.append(delivery)
+        return delivery
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def fast_consumer(monkeypatch):
+    monkeypatch.setattr(settings, "kafka_consumer_poll_timeout", 0.01)
+    monkeypatch.setattr(settings, "kafka_consumer_commit_interval", 0.0)
+    monkeypatch.setattr(settings, "kafka_consumer_workers", 4)
+
+
+def outbox_message(incident_id, event_type, status):
+    return {
+        "event_type": event_type,
+        "incident_id": incident_id,
+        "incident": {"id": incident_id, "status": status},
+    }
+
+
+def test_broker_keeps_one_key_in_one_partition():
+    broker = InMemoryKafkaBroker(partitions=4)
+    key = b"incident"
+
+    assert len({broker.partition_for(key) for _ in range(10)}) == 1
+    assert broker.partition_for(None) == 0
+
+
+async def test_publish_batch_keys_by_incident_id():
+    broker = InMemoryKafkaBroker(partitions=3)
+    producer = KafkaProducerService(broker)
+    await producer.initialize()
+    incident_id = str(uuid.uuid4())
+
+    await producer.publish_batch(
+        [
+            outbox_message(incident_id, "created", "open"),
+            outbox_message(incident_id, "status_changed", "closed"),
+        ]
+    )
+    await producer.close()
+
+    partition = broker.topics[settings.kafka_incidents_topic][
+        broker.partition_for(incident_id.encode())
+    ]
+    assert [key for key, _ in partition] == [incident_id.encode()] * 2
+    assert [json.loads(value)["event_type"] for _, value in partition] == [
+        "created",
+        "status_changed",
+    ]
+
+
+async def test_producer_without_broker_refuses_batch(monkeypatch):
+    monkeypatch.setattr(settings, "kafka_bootstrap_servers", "")
+    producer = KafkaProducerService()
+    await producer.initialize()
+
+    assert not producer.connected
+    with pytest.raises(RuntimeError):
+        await producer.publish_batch([{"id": "1"}])
+    assert not await producer.publish_incident({"id": "1"})
+
+
+async def test_consumer_without_broker_does_not_start(monkeypatch):
+    monkeypatch.setattr(settings, "kafka_bootstrap_servers", "")
+    consumer = KafkaConsumerService(telegram_service=FakeTelegram())
+
+    with pytest.raises(RuntimeError):
+        await consumer.initialize()
+
+
+async def test_consumer_commits_only_after_delivery(fast_consumer):
+    broker = InMemoryKafkaBroker()
+    producer = KafkaProducerService(broker)
+    await producer.initialize()
+    await producer.publish_batch(
+        [outbox_message(str(i), "created", "open") for i in range(3)]
+    )
+    await producer.close()
+
+    client = InMemoryKafkaConsumer(broker, settings.kafka_incidents_topic)
+    telegram = FakeTelegram()
+    consumer = KafkaConsumerService(client, telegram)
+    await consumer.initialize()
+    task = asyncio.create_task(consumer.consume_incidents())
+    try:
+        await wait_for(lambda: len(telegram.deliveries) == 3)
+        await asyncio.sleep(0.05)
+        # уведомления в очереди Telegram, но не отправлены - коммитить нечего
+        topic_partition = (settings.kafka_incidents_topic, 0)
+        assert client.committed.get(topic_partition, 0) == 0
+
+        by_id = {n["id"]: d for n, d in zip(telegram.notified, telegram.deliveries)}
+        by_id["0"].set_result(None)
+        by_id["2"].set_result(None)
+        await wait_for(lambda: client.committed.get(topic_partition) == 1)
+        await asyncio.sleep(0.05)
+        # сообщение 2 доставлено, но 1 ещё нет - оффсет не перескакивает
+        assert client.committed[topic_partition] == 1
+
+        by_id["1"].set_exception(RuntimeError("telegram is down"))
+        await wait_for(lambda: client.committed.get(topic_partition) == 3)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await consumer.close()
+
+    assert consumer.processed == 2
+    assert consumer.failed == 1
+
+
+async def test_consumer_keeps_order_within_incident(fast_consumer):
+    broker = InMemoryKafkaBroker()
+    producer = KafkaProducerService(broker)
+    await producer.initialize()
+    statuses = ["open", "in_progress", "resolved", "closed"]
+    messages = []
+    for status in statuses:
+        for incident_id in ("a", "b", "c"):
+            messages.append(outbox_message(incident_id, "status_changed", status))
+    await producer.publish_batch(messages)
+    await producer.close()
+
+    client = InMemoryKafkaConsumer(broker, settings.kafka_incidents_topic)
+    telegram = FakeTelegram()
+    consumer = KafkaConsumerService(client, telegram)
+    await consumer.initialize()
+    task = asyncio.create_task(consumer.consume_incidents())
+    try:
+        await wait_for(lambda: len(telegram.notified) == len(messages))
+        for delivery in telegram.deliveries:
+            delivery.set_result(None)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await consumer.close()
+
+    for incident_id in ("a", "b", "c"):
+        seen = [n["status"] for n in telegram.notified if n["id"] == incident_id]
+        assert seen == statuses
+    assert client.committed[(settings.kafka_incidents_topic, 0)] == len(messages)
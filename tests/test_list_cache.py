@@ -0,0 +1,79 @@
+import pytest
+
+from src.core.database import _AFTER_COMMIT
+from src.domain.models import IncidentSource, IncidentStatus
+from src.domain.schemas import CountMode
+from src.infrastructure.cache import cache_client
+from src.services.incident_repository import IncidentRepository
+from src.services.incident_service import IncidentService
+from tests.fake_redis import FakeRedis
+
+
+@pytest.fixture
+def redis(monkeypatch) -> FakeRedis:
+    redis = FakeRedis()
+    monkeypatch.setattr(cache_client, "client", redis)
+    return redis
+
+
+async def commit(db):
+    """то, что get_db делает после коммита: поднять поколения списков"""
+
+    await db.flush()
+    for callback in db.info.pop(_AFTER_COMMIT, []):
+        await callback()
+
+
+async def list_ids(service: IncidentService, **filters) -> tuple[set, int]:
+    page = await service.get_incidents(
+        source=IncidentSource.PARTNER, limit=1000, count=CountMode.EXACT, **filters
+    )
+    return {incident.id for incident in page.incidents}, page.total
+
+
+async def test_cached_page_is_served_until_write(db, redis):
+    service = IncidentService(db)
+    ids, total = await list_ids(service)
+
+    # запись мимо сервиса поколений не поднимает - страница из кэша
+    await IncidentRepository(db).create("bypass", IncidentSource.PARTNER)
+    assert await list_ids(service) == (ids, total)
+
+    created = await service.create_incident("new", IncidentSource.PARTNER)
+    await commit(db)
+    new_ids, new_total = await list_ids(service)
+
+    assert created.id in new_ids
+    assert new_total == total + 2
+
+
+async def test_status_change_invalidates_status_pages(db, redis):
+    service = IncidentService(db)
+    created = await service.create_incident("to close", IncidentSource.PARTNER)
+    await commit(db)
+    open_ids, open_total = await list_ids(service, status=IncidentStatus.OPEN)
+    assert created.id in open_ids
+
+    await service.update_incident_status(created.id, IncidentStatus.CLOSED)
+    await commit(db)
+    open_ids, new_open_total = await list_ids(service, status=IncidentStatus.OPEN)
+    closed_ids, _ = await list_ids(service, status=IncidentStatus.CLOSED)
+
+    assert created.id not in open_ids
+    assert new_open_total == open_total - 1
+    assert created.id in closed_ids
+
+
+async def test_other_source_pages_stay_cached(db, redis):
+    service = IncidentService(db)
+    await service.get_incidents(source=IncidentSource.OPERATOR)
+    keys = set(redis.data)
+
+    await service.create_incident("new", IncidentSource.PARTNER)
+    await commit(db)
+    await service.get_incidents(source=IncidentSource.OPERATOR)
+
+    # поколение operator не менялось, новых страниц не появилось
+    assert {key for key in redis.data if key.startswith("incidents:list")} == {
+        key for key in keys if key.startswith("incidents:list")
+    }
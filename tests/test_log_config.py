@@ -0,0 +1,76 @@
+import logging
+
+import pytest
+
+from src.core import log_config
+from src.core.log_config import DedupFilter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(log_config, "time", clock)
+    return clock
+
+
+def record(msg: str, *args, level: int = logging.WARNING, name: str = "src.cache"):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_burst_then_suppress(clock):
+    dedup = DedupFilter(window=10, burst=2)
+
+    passed = [dedup.filter(record("Cache get error: %s", i)) for i in range(5)]
+
+    assert passed == [True, True, False, False, False]
+
+
+def test_suppressed_count_after_window(clock):
+    dedup = DedupFilter(window=10, burst=1)
+    for i in range(4):
+        dedup.filter(record("Cache get error: %s", i))
+
+    clock.now += 10
+    next_record = record("Cache get error: %s", "again")
+
+    assert dedup.filter(next_record)
+    assert next_record.suppressed == 3
+
+
+def test_different_messages_are_independent(clock):
+    dedup = DedupFilter(window=10, burst=1)
+
+    assert dedup.filter(record("Cache get error: %s", 1))
+    assert dedup.filter(record("Cache set error: %s", 1))
+    assert dedup.filter(record("Cache get error: %s", 1, name="src.other"))
+    assert not dedup.filter(record("Cache get error: %s", 2))
+
+
+def test_zero_window_disables(clock):
+    dedup = DedupFilter(window=0, burst=1)
+
+    assert all(dedup.filter(record("Cache get error")) for _ in range(10))
+
+
+def test_info_is_not_deduplicated(clock):
+    dedup = DedupFilter(window=10, burst=1)
+    access = '%s - "%s %s HTTP/%s" %d'
+
+    for level in (logging.INFO, logging.DEBUG):
+        for _ in range(10):
+            entry = record(access, "10.0.0.1", "GET", "/", "1.1", 200, level=level)
+            assert dedup.filter(entry)
+
+
+def test_import_does_not_setup_logging():
+    import src.main  # noqa: F401
+
+    assert log_config._listener is None
@@ -0,0 +1,54 @@
+import uuid
+
+import httpx
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+from src.main import app
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+async def request_counts(client) -> dict[tuple[str, str, str], float]:
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    return {
+        (s.labels["method"], s.labels["route"], s.labels["status"]): s.value
+        for family in text_string_to_metric_families(response.text)
+        if family.name == "http_requests"
+        for s in family.samples
+        if s.name == "http_requests_total"
+    }
+
+
+async def test_requests_are_labelled_with_route_template(client):
+    before = await request_counts(client)
+    incident_ids = [uuid.uuid4(), uuid.uuid4()]
+
+    # неверный ключ: 401 без обращения к бд
+    for incident_id in incident_ids:
+        response = await client.get(
+            f"/incidents/{incident_id}", headers={"X-Access-Key": "wrong"}
+        )
+        assert response.status_code == 401
+    after = await request_counts(client)
+
+    key = ("GET", "/incidents/{incident_id}", "401")
+    assert after[key] - before.get(key, 0) == 2
+    assert not any(str(i) in route for _, route, _ in after for i in incident_ids)
+
+
+async def test_unknown_paths_share_one_label(client):
+    before = await request_counts(client)
+
+    await client.get(f"/no-such-path/{uuid.uuid4()}")
+    after = await request_counts(client)
+
+    key = ("GET", "unmatched", "404")
+    assert after[key] - before.get(key, 0) == 1
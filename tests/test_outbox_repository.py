@@ -0,0 +1,97 @@
+import uuid
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from src.domain.models import IncidentEvent
+from src.services.outbox_repository import OutboxRepository
+
+
+@pytest.fixture
+async def outbox(session_factory):
+    """события коммитятся, чтобы их видели параллельные транзакции"""
+
+    async with session_factory() as session:
+        if await session.scalar(select(func.count(IncidentEvent.id))):
+            pytest.skip("incident_events is not empty")
+    incident_ids = []
+
+    async def add(incident_id: uuid.UUID, count: int = 1):
+        incident_ids.append(incident_id)
+        async with session_factory() as session, session.begin():
+            await OutboxRepository(session).add_events(
+                "incident.created", [{"id": str(incident_id)}] * count
+            )
+
+    yield add
+    async with session_factory() as session, session.begin():
+        await session.execute(
+            delete(IncidentEvent).where(IncidentEvent.incident_id.in_(incident_ids))
+        )
+
+
+async def claim(session, limit: int) -> list[IncidentEvent]:
+    return await OutboxRepository(session).claim_batch(limit)
+
+
+async def test_concurrent_claims_are_disjoint(outbox, session_factory):
+    for _ in range(10):
+        await outbox(uuid.uuid4())
+
+    async with session_factory() as first, first.begin():
+        first_batch = await claim(first, 4)
+        async with session_factory() as second, second.begin():
+            second_batch = await claim(second, 4)
+
+    first_ids = {event.id for event in first_batch}
+    second_ids = {event.id for event in second_batch}
+    assert len(first_ids) == 4
+    assert len(second_ids) == 4
+    assert not first_ids & second_ids
+
+
+async def test_later_events_wait_for_claimed_incident(outbox, session_factory):
+    busy, other = uuid.uuid4(), uuid.uuid4()
+    await outbox(busy, count=3)
+    await outbox(other, count=2)
+
+    async with session_factory() as first, first.begin():
+        first_batch = await claim(first, 1)
+        async with session_factory() as second, second.begin():
+            second_batch = await claim(second, 10)
+
+    assert [event.incident_id for event in first_batch] == [busy]
+    # более поздние события busy ушли бы в кафку раньше первого
+    assert [event.incident_id for event in second_batch] == [other, other]
+
+
+async def test_claim_keeps_incident_order(outbox, db):
+    incident_id = uuid.uuid4()
+    await outbox(incident_id, count=3)
+
+    batch = await claim(db, 10)
+
+    assert [event.incident_id for event in batch] == [incident_id] * 3
+    assert [event.id for event in batch] == sorted(event.id for event in batch)
+
+
+async def test_events_after_locked_one_wait(outbox, session_factory):
+    incident_id = uuid.uuid4()
+    await outbox(incident_id, count=4)
+
+    async with session_factory() as locker, locker.begin():
+        ids = (
+            await locker.scalars(
+                select(IncidentEvent.id)
+                .where(IncidentEvent.incident_id == incident_id)
+                .order_by(IncidentEvent.id)
+            )
+        ).all()
+        # второе событие держит другая транзакция
+        await locker.execute(
+            select(IncidentEvent.id).where(IncidentEvent.id == ids[1]).with_for_update()
+        )
+        async with session_factory() as relay, relay.begin():
+            batch = await claim(relay, 10)
+
+    assert [event.id for event in batch] == ids[:1]
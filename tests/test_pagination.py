@@ -0,0 +1,32 @@
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from src.services.pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+
+def test_roundtrip():
+    created_at = datetime(2026, 10, 18, 12, 30, 5, 123456)
+    incident_id = uuid4()
+
+    cursor = encode_cursor(created_at, incident_id)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, incident_id)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "not a cursor!",
+        "abc",
+        encode_cursor(datetime(2026, 1, 1), uuid4()).swapcase(),
+        # без разделителя
+        "MjAyNi0wMS0wMVQwMDowMDowMA",
+    ],
+)
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
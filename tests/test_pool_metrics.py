@@ -0,0 +1,62 @@
+import time
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.util import greenlet_spawn
+
+from src.core.database import InstrumentedPool, pool_metrics
+
+
+class FakeConnection:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def slow_connect():
+    time.sleep(0.2)
+    return FakeConnection()
+
+
+def failing_connect():
+    raise OSError("connection refused")
+
+
+async def checkout(pool: InstrumentedPool):
+    return await greenlet_spawn(pool.connect)
+
+
+async def test_connect_time_is_not_pool_wait():
+    pool = InstrumentedPool(slow_connect, pool_size=1, max_overflow=0)
+    wait_sum = pool_metrics.wait_sum
+
+    connection = await checkout(pool)
+    await greenlet_spawn(connection.close)
+
+    assert pool_metrics.wait_sum - wait_sum < 0.1
+
+
+async def test_exhausted_pool_counts_timeout():
+    pool = InstrumentedPool(FakeConnection, pool_size=1, max_overflow=0, timeout=0.05)
+    timeouts = pool_metrics.timeouts
+    wait_sum = pool_metrics.wait_sum
+
+    connection = await checkout(pool)
+    with pytest.raises(exc.TimeoutError):
+        await checkout(pool)
+    await greenlet_spawn(connection.close)
+
+    assert pool_metrics.timeouts == timeouts + 1
+    assert pool_metrics.wait_sum - wait_sum >= 0.05
+
+
+async def test_connect_error_is_not_timeout():
+    pool = InstrumentedPool(failing_connect, pool_size=1, max_overflow=0)
+    timeouts = pool_metrics.timeouts
+
+    with pytest.raises(OSError):
+        await checkout(pool)
+
+    assert pool_metrics.timeouts == timeouts
@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from src.core.config import settings
+from src.infrastructure.profiling import SlowQueryLog
+
+
+class FakeConnection:
+    """пишет команды, EXPLAIN ANALYZE в read-only транзакции падает, если read_only=False"""
+
+    def __init__(self, read_only: bool = True):
+        self.read_only = read_only
+        self.statements = []
+        self.rollbacks = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def exec_driver_sql(self, statement, parameters=None):
+        self.statements.append(statement)
+        if "ANALYZE" in statement and not self.read_only:
+            raise DBAPIError(statement, parameters, Exception("read-only transaction"))
+        return [("Result",)]
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeEngine:
+    def __init__(self, connection: FakeConnection):
+        self.connection = connection
+
+    def connect(self):
+        return self.connection
+
+
+async def explain(statement: str, connection: FakeConnection) -> dict:
+    entry = {"statement": statement, "plan": None}
+    await SlowQueryLog(10)._explain(FakeEngine(connection), entry, ())
+    return entry
+
+
+@pytest.fixture
+def analyze(monkeypatch):
+    monkeypatch.setattr(settings, "slow_query_explain_analyze", True)
+
+
+async def test_plain_explain_by_default():
+    connection = FakeConnection()
+
+    entry = await explain("SELECT * FROM incidents", connection)
+
+    assert connection.statements == ["EXPLAIN SELECT * FROM incidents"]
+    assert entry["plan"] == "Result"
+
+
+async def test_analyze_in_read_only_transaction(analyze):
+    connection = FakeConnection()
+
+    await explain("SELECT * FROM incidents", connection)
+
+    assert connection.statements == [
+        "SET TRANSACTION READ ONLY",
+        "EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM incidents",
+    ]
+    assert connection.rollbacks == 1
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "SELECT id FROM incident_events ORDER BY id LIMIT 10 FOR UPDATE SKIP LOCKED",
+        "select 1 for no key update",
+        "SELECT pg_try_advisory_lock(1)",
+        "WITH d AS (DELETE FROM incidents RETURNING id) SELECT * FROM d",
+        "UPDATE incidents SET status = 'closed'",
+    ],
+)
+async def test_no_analyze_for_locking_or_writes(analyze, statement):
+    connection = FakeConnection()
+
+    await explain(statement, connection)
+
+    assert connection.statements == [f"EXPLAIN {statement}"]
+
+
+async def test_falls_back_when_not_read_only(analyze):
+    connection = FakeConnection(read_only=False)
+
+    entry = await explain("SELECT nextval('seq')", connection)
+
+    assert connection.statements[-1] == "EXPLAIN SELECT nextval('seq')"
+    assert entry["plan"] == "Result"
+    assert connection.rollbacks == 2
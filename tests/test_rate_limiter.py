@@ -0,0 +1,62 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.infrastructure import rate_limiter
+from src.infrastructure.cache import cache_client
+from src.infrastructure.rate_limiter import RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def no_redis():
+    # без подключения к redis лимитер считает локально
+    assert cache_client.active_client is None
+
+
+async def test_burst_then_reject():
+    limiter = RateLimiter()
+
+    assert [await limiter.hit("ip:1", 3) for _ in range(3)] == [0.0] * 3
+    retry_after = await limiter.hit("ip:1", 3)
+
+    assert 19 < retry_after <= 20
+    assert limiter.rejected == 1
+
+
+async def test_idle_client_is_not_rejected_by_rounding(monkeypatch):
+    # (0.1 + 60) - 60 != 0.1 во float
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=lambda: 0.1))
+    limiter = RateLimiter()
+
+    assert await limiter.hit("ip:1", 1) == 0.0
+    assert await limiter.hit("ip:1", 1) == 60.0
+
+
+async def test_clients_are_independent():
+    limiter = RateLimiter()
+
+    assert await limiter.hit("ip:1", 1) == 0.0
+    assert await limiter.hit("ip:1", 1) > 0
+    assert await limiter.hit("ip:2", 1) == 0.0
+
+
+async def test_rejected_hit_does_not_consume():
+    limiter = RateLimiter()
+    await limiter.hit("ip:1", 1)
+
+    first = await limiter.hit("ip:1", 1)
+    second = await limiter.hit("ip:1", 1)
+
+    # отказ не сдвигает TAT, иначе клиент, который долбит, не дождётся никогда
+    assert second <= first
+
+
+async def test_sweep_drops_idle_clients():
+    limiter = RateLimiter(sweep_interval=0)
+    await limiter.hit("ip:1", 60000)
+    time.sleep(0.01)
+
+    await limiter.hit("ip:2", 60000)
+
+    assert list(limiter._local) == ["ip:2"]
@@ -0,0 +1,120 @@
+import pytest
+from sqlalchemy import select, update
+
+from src.core import database
+from src.core.config import settings
+from src.core.database import ReplicaRouter, RoutingSession, used_replica
+from src.domain.models import Incident
+
+REPLICAS = ["postgresql://user@replica-1/incedent", "postgresql://user@replica-2/incedent"]
+
+
+def host(engine) -> str:
+    return engine.sync_engine.url.host
+
+
+@pytest.fixture
+async def router():
+    router = ReplicaRouter(REPLICAS)
+    yield router
+    await router.close()
+
+
+async def test_no_replica_before_first_lag_check(router):
+    assert router.choose() is None
+
+
+async def test_round_robin(router, monkeypatch):
+    monkeypatch.setattr(settings, "db_replica_balancing", "round_robin")
+    router.lags = [0.0, 0.0]
+
+    hosts = [host(router.choose()) for _ in range(4)]
+
+    assert hosts == ["replica-1", "replica-2", "replica-1", "replica-2"]
+
+
+async def test_least_connections(router, monkeypatch):
+    monkeypatch.setattr(settings, "db_replica_balancing", "least_connections")
+    router.lags = [0.0, 0.0]
+    busy, idle = router.engines
+    monkeypatch.setattr(busy.sync_engine.pool, "checkedout", lambda: 5)
+    monkeypatch.setattr(idle.sync_engine.pool, "checkedout", lambda: 1)
+
+    assert host(router.choose()) == "replica-2"
+
+
+async def test_lagging_and_failed_replicas_are_skipped(router, monkeypatch):
+    monkeypatch.setattr(settings, "db_replica_max_lag", 5.0)
+    router.lags = [30.0, 1.0]
+    assert {host(router.choose()) for _ in range(4)} == {"replica-2"}
+
+    router.lags = [30.0, None]
+    assert router.choose() is None
+
+
+async def test_replica_is_autocommit(router):
+    router.lags = [0.0, 0.0]
+
+    replica = router.choose()
+
+    assert replica.get_execution_options()["isolation_level"] == "AUTOCOMMIT"
+
+
+@pytest.fixture
+def healthy_router(router, monkeypatch):
+    router.lags = [0.0, 0.0]
+    monkeypatch.setattr(database, "replica_router", router)
+    return router
+
+
+def read_session() -> RoutingSession:
+    session = RoutingSession(bind=database.engine.sync_engine)
+    session.info[database._READ_ONLY] = True
+    return session
+
+
+def is_replica(bind) -> bool:
+    return bind.url.host.startswith("replica")
+
+
+def test_reads_go_to_replica(healthy_router):
+    session = read_session()
+
+    bind = session.get_bind(clause=select(Incident))
+
+    assert is_replica(bind)
+    # за сессией закрепляется одна реплика
+    assert session.get_bind(clause=select(Incident)) is bind
+    assert used_replica(session)
+
+
+def test_writes_stay_on_primary(healthy_router):
+    session = read_session()
+
+    bind = session.get_bind(clause=update(Incident).values(status="closed"))
+
+    assert bind is database.engine.sync_engine
+
+
+def test_for_update_stays_on_primary(healthy_router):
+    session = read_session()
+
+    bind = session.get_bind(clause=select(Incident).with_for_update())
+
+    assert bind is database.engine.sync_engine
+
+
+def test_reads_after_write_stay_on_primary(healthy_router):
+    session = read_session()
+    session.get_bind(clause=update(Incident).values(status="closed"))
+
+    bind = session.get_bind(clause=select(Incident))
+
+    assert bind is database.engine.sync_engine
+    assert not used_replica(session)
+
+
+def test_sessions_without_read_flag_use_primary(healthy_router):
+    session = RoutingSession(bind=database.engine.sync_engine)
+
+    assert session.get_bind(clause=select(Incident)) is database.engine.sync_engine
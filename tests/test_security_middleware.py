@@ -0,0 +1,63 @@
+import pytest
+
+from src.core.config import settings
+from src.infrastructure.security_middleware import RateLimitMiddleware
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.hits = []
+
+    async def hit(self, key: str, limit: int) -> float:
+        self.hits.append((key, limit))
+        return 0.0
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def call(middleware, headers, client=("10.0.0.1", 1234)):
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "headers": headers, "client": client}
+    await middleware(scope, receive, send)
+
+
+@pytest.fixture
+def limiter():
+    return RecordingLimiter()
+
+
+@pytest.fixture
+def middleware(limiter):
+    return RateLimitMiddleware(
+        app, requests_per_minute=10, key_requests_per_minute=100, limiter=limiter
+    )
+
+
+async def test_valid_key_gets_key_bucket(middleware, limiter):
+    await call(middleware, [(b"x-access-key", settings.x_access_key.encode())])
+
+    key, limit = limiter.hits[0]
+    assert key.startswith("key:")
+    assert settings.x_access_key not in key
+    assert limit == 100
+
+
+async def test_random_keys_share_ip_bucket(middleware, limiter):
+    for i in range(3):
+        await call(middleware, [(b"x-access-key", f"random-{i}".encode())])
+
+    assert limiter.hits == [("ip:10.0.0.1", 10)] * 3
+
+
+async def test_no_key_uses_ip_bucket(middleware, limiter):
+    await call(middleware, [])
+
+    assert limiter.hits == [("ip:10.0.0.1", 10)]
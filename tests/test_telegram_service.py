@@ -0,0 +1,139 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.core.config import settings
+from src.services.telegram_service import (
+    TelegramDeliveryError,
+    TelegramService,
+    TokenBucket,
+)
+from tests.fake_telegram import FakeBotApi
+
+TOKEN = "test-token"
+
+
+@pytest.fixture
+def bot_api(monkeypatch) -> FakeBotApi:
+    monkeypatch.setattr(settings, "telegram_bot_token", TOKEN)
+    monkeypatch.setattr(settings, "telegram_api_url", "http://telegram.test")
+    monkeypatch.setattr(settings, "telegram_chat_ids", ["100"])
+    monkeypatch.setattr(settings, "telegram_chat_rate", 20.0)
+    monkeypatch.setattr(settings, "telegram_chat_burst", 1)
+    monkeypatch.setattr(settings, "telegram_retry_base_delay", 0.01)
+    return FakeBotApi(TOKEN)
+
+
+@pytest.fixture
+async def telegram(bot_api):
+    service = TelegramService(transport=httpx.ASGITransport(app=bot_api.app))
+    await service.initialize()
+    yield service
+    await service.close()
+
+
+def incident(number: int) -> dict:
+    return {"id": number, "status": "open", "source": "operator"}
+
+
+def test_token_bucket_refund():
+    bucket = TokenBucket(rate=1.0, capacity=1)
+
+    assert bucket.reserve() == 0.0
+    bucket.refund()
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() > 0
+
+
+async def test_notification_is_sent(telegram, bot_api):
+    delivery = await telegram.send_incident_notification(incident(1))
+    await asyncio.wait_for(delivery, 2)
+
+    assert [m["chat_id"] for m in bot_api.messages] == ["100"]
+    assert bot_api.messages[0]["text"].startswith("Инцидент 1")
+
+
+async def test_storm_goes_out_as_digest(telegram, bot_api):
+    deliveries = [
+        await telegram.send_incident_notification(incident(i)) for i in range(10)
+    ]
+    await asyncio.wait_for(asyncio.gather(*deliveries), 2)
+
+    assert len(bot_api.messages) < 10
+    assert bot_api.messages[-1]["text"].startswith("10 событий")
+
+
+async def test_retry_after_pauses_whole_chat(telegram, bot_api):
+    bot_api.reply_too_many_requests(retry_after=0.3)
+
+    first = await telegram.send_incident_notification(incident(1))
+    await asyncio.sleep(0.05)
+    second = await telegram.send_incident_notification(incident(2))
+    await asyncio.wait_for(asyncio.gather(first, second), 3)
+
+    rejected, *after = bot_api.messages
+    assert len(after) == 2
+    # ни повтор, ни новое сообщение не ушли раньше retry_after
+    assert all(m["at"] - rejected["at"] >= 0.3 for m in after)
+    assert after[0]["text"].startswith("Инцидент 1")
+
+
+async def test_rejected_message_fails_delivery(telegram, bot_api):
+    bot_api.reply_error(400)
+
+    delivery = await telegram.send_incident_notification(incident(1))
+    with pytest.raises(TelegramDeliveryError):
+        await asyncio.wait_for(delivery, 2)
+    assert telegram.dropped == 1
+
+
+async def test_server_errors_are_retried(telegram, bot_api):
+    bot_api.reply_error(502)
+    bot_api.reply_error(503)
+
+    delivery = await telegram.send_incident_notification(incident(1))
+    await asyncio.wait_for(delivery, 2)
+
+    assert len(bot_api.messages) == 3
+    assert telegram.sent == 1
+
+
+async def test_non_json_too_many_requests_is_retried(telegram, bot_api):
+    bot_api.reply_text(429, "Too Many Requests")
+
+    delivery = await telegram.send_incident_notification(incident(1))
+    await asyncio.wait_for(delivery, 2)
+
+    assert len(bot_api.messages) == 2
+    assert telegram.sent == 1
+
+
+async def test_unexpected_error_keeps_chat_alive(telegram, bot_api, monkeypatch):
+    post = telegram._client.post
+    calls = 0
+
+    async def failing_post(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("boom")
+        return await post(*args, **kwargs)
+
+    monkeypatch.setattr(telegram._client, "post", failing_post)
+
+    first = await telegram.send_incident_notification(incident(1))
+    await asyncio.wait_for(first, 2)
+    second = await telegram.send_incident_notification(incident(2))
+    await asyncio.wait_for(second, 2)
+
+    assert len(bot_api.messages) == 2
+
+
+async def test_disabled_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_bot_token", "")
+    service = TelegramService()
+    await service.initialize()
+
+    assert await service.send_incident_notification(incident(1)) is None
+    await service.close()